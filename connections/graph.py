@@ -0,0 +1,159 @@
+# connections/graph.py
+"""
+The connection graph service: "who is user X connected to?"
+
+Each user's set of accepted neighbors is cached (Django's cache framework:
+LocMem locally, Redis in production) so hot paths -- the feed, messaging
+permission checks, profile pages -- get an O(1) set membership check
+instead of a database round-trip.
+
+The cache is invalidated from the Connection post_save/post_delete signals in
+connections/models.py, so anything that saves or deletes a Connection through
+the ORM keeps it correct. Queryset .update()/.delete() bypass signals; call
+invalidate() yourself after using them.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Connection
+
+CACHE_TIMEOUT = getattr(settings, "CONNECTION_GRAPH_CACHE_TIMEOUT", 60 * 60 * 24)
+SEPARATION_CACHE_TIMEOUT = getattr(settings, "CONNECTION_SEPARATION_CACHE_TIMEOUT", 60 * 10)
+# Wall-clock limit (seconds) for the 3rd-degree search on a cache miss
+SEPARATION_TIME_BUDGET = getattr(settings, "CONNECTION_SEPARATION_TIME_BUDGET", 0.05)
+SEPARATION_BATCH_SIZE = 200
+
+
+def _key(user_id):
+    return f"connections:neighbors:{user_id}"
+
+
+def _load(user_id):
+    # Two probes, one per partial index on accepted (user_low, user_high) pairs
+    accepted = Connection.objects.filter(status=Connection.STATUS_ACCEPTED).order_by()
+    as_low = accepted.filter(user_low_id=user_id).values_list("user_high_id")
+    as_high = accepted.filter(user_high_id=user_id).values_list("user_low_id")
+    return frozenset(other_id for (other_id,) in as_low.union(as_high, all=True))
+
+
+def _load_many(user_ids):
+    user_ids = set(user_ids)
+    found = {user_id: set() for user_id in user_ids}
+    accepted = Connection.objects.filter(status=Connection.STATUS_ACCEPTED).order_by()
+    as_low = accepted.filter(user_low_id__in=user_ids)
+    as_high = accepted.filter(user_high_id__in=user_ids)
+    pairs = as_low.values_list("user_low_id", "user_high_id").union(
+        as_high.values_list("user_low_id", "user_high_id"), all=True
+    )
+    for low, high in pairs:
+        if low in found:
+            found[low].add(high)
+        if high in found:
+            found[high].add(low)
+    return {user_id: frozenset(ids) for user_id, ids in found.items()}
+
+
+def neighbor_ids(user_id):
+    """frozenset of IDs of everyone with an accepted connection to user_id."""
+    ids = cache.get(_key(user_id))
+    if ids is None:
+        ids = _load(user_id)
+        cache.set(_key(user_id), ids, CACHE_TIMEOUT)
+    return ids
+
+
+def neighbor_ids_many(user_ids):
+    """
+    {user_id: frozenset} for several users: one cache round-trip, plus one
+    query for all the misses together.
+    """
+    keys = {_key(user_id): user_id for user_id in user_ids}
+    result = {keys[key]: ids for key, ids in cache.get_many(list(keys)).items()}
+    missing = [user_id for user_id in keys.values() if user_id not in result]
+    if missing:
+        loaded = _load_many(missing)
+        cache.set_many(
+            {_key(user_id): ids for user_id, ids in loaded.items()}, CACHE_TIMEOUT
+        )
+        result.update(loaded)
+    return result
+
+
+def are_connected(user_a_id, user_b_id):
+    return user_b_id in neighbor_ids(user_a_id)
+
+
+def degree(user_id):
+    """Number of accepted connections."""
+    return len(neighbor_ids(user_id))
+
+
+def invalidate(*user_ids):
+    """Forget the cached neighbor sets of these users."""
+    cache.delete_many([_key(user_id) for user_id in user_ids])
+
+
+def _separation_key(user_a_id, user_b_id):
+    low, high = Connection.canonical_pair(user_a_id, user_b_id)
+    return f"connections:separation:{low}:{high}"
+
+
+def invalidate_separation(user_a_id, user_b_id):
+    cache.delete(_separation_key(user_a_id, user_b_id))
+
+
+def separation(user_a_id, user_b_id):
+    """
+    How close two users are in the graph, as
+    {"degree": 1, 2, 3 or None, "mutual_count": int}.
+
+    degree None means more than three hops apart, or not found within
+    SEPARATION_TIME_BUDGET. Cached per pair, so a repeat profile view costs a
+    single cache hit; the pair's entry is dropped when a connection between
+    the two changes, otherwise it expires after SEPARATION_CACHE_TIMEOUT.
+    """
+    key = _separation_key(user_a_id, user_b_id)
+    result = cache.get(key)
+    if result is None:
+        result = _compute_separation(user_a_id, user_b_id)
+        cache.set(key, result, SEPARATION_CACHE_TIMEOUT)
+    return result
+
+
+def _compute_separation(user_a_id, user_b_id):
+    near_a = neighbor_ids(user_a_id)
+    near_b = neighbor_ids(user_b_id)
+    mutual_count = len(near_a & near_b)
+    if user_b_id in near_a:
+        degree = 1
+    elif mutual_count:
+        degree = 2
+    elif _neighbors_adjacent(near_a, near_b):
+        degree = 3
+    else:
+        degree = None
+    return {"degree": degree, "mutual_count": mutual_count}
+
+
+def _neighbors_adjacent(near_a, near_b):
+    """
+    Bidirectional BFS meeting step for distance 3: is some neighbor of A
+    directly connected to some neighbor of B? Only the smaller side is
+    expanded, in batches, and the search gives up (False) once
+    SEPARATION_TIME_BUDGET is spent.
+    """
+    frontier, other = sorted((near_a, near_b), key=len)
+    if not other:
+        return False
+    deadline = time.monotonic() + SEPARATION_TIME_BUDGET
+    frontier = list(frontier)
+    for start in range(0, len(frontier), SEPARATION_BATCH_SIZE):
+        if time.monotonic() > deadline:
+            return False
+        batch = frontier[start : start + SEPARATION_BATCH_SIZE]
+        for ids in neighbor_ids_many(batch).values():
+            if not ids.isdisjoint(other):
+                return True
+    return False
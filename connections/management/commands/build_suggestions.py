@@ -0,0 +1,27 @@
+# connections/management/commands/build_suggestions.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from connections.suggestions import SUGGESTIONS_PER_USER, rebuild_suggestions
+
+
+class Command(BaseCommand):
+    help = "Recompute 'people you may know' suggestions for every user."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=SUGGESTIONS_PER_USER,
+            help="Suggestions to keep per user",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        written = rebuild_suggestions(limit=options["limit"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {written} suggestion(s) in {time.monotonic() - started:.1f}s."
+            )
+        )
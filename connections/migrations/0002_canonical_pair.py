@@ -0,0 +1,61 @@
+# Generated by Django 5.1.15 on 2026-10-18 10:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_canonical_pairs(apps, schema_editor):
+    """
+    Fill user_low/user_high. The old constraint was per direction, so a pair
+    may have two rows (A->B and B->A); keep the most useful one (accepted,
+    then pending, then rejected; newest first) and drop the rest.
+    """
+    Connection = apps.get_model("connections", "Connection")
+    rank = {"accepted": 0, "pending": 1, "rejected": 2}
+    best = {}
+    duplicates = []
+    for conn in Connection.objects.order_by("-created_at", "-id").iterator():
+        pair = tuple(sorted((conn.requester_id, conn.receiver_id)))
+        kept = best.get(pair)
+        if kept is None:
+            best[pair] = conn
+        elif rank[conn.status] < rank[kept.status]:
+            duplicates.append(kept.id)
+            best[pair] = conn
+        else:
+            duplicates.append(conn.id)
+
+    Connection.objects.filter(id__in=duplicates).delete()
+    for (user_low, user_high), conn in best.items():
+        conn.user_low_id = user_low
+        conn.user_high_id = user_high
+    Connection.objects.bulk_update(
+        best.values(), ["user_low", "user_high"], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('connections', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='connection',
+            name='unique_connection_request',
+        ),
+        migrations.AddField(
+            model_name='connection',
+            name='user_high',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='connection',
+            name='user_low',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(fill_canonical_pairs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.15 on 2026-10-18 10:40
+# Separate from 0002 so that PostgreSQL does not see the ALTER TABLEs in the
+# same transaction as 0002's row updates ("pending trigger events").
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('connections', '0002_canonical_pair'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='connection',
+            name='user_high',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='connection',
+            name='user_low',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='connection',
+            index=models.Index(condition=models.Q(('status', 'accepted')), fields=['user_low', 'user_high'], name='conn_accepted_low_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='connection',
+            index=models.Index(condition=models.Q(('status', 'accepted')), fields=['user_high', 'user_low'], name='conn_accepted_high_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='connection',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['receiver', '-created_at'], name='conn_pending_receiver_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='connection',
+            constraint=models.UniqueConstraint(fields=('user_low', 'user_high'), name='unique_connection_pair'),
+        ),
+    ]
@@ -2,9 +2,20 @@
 
 from django.db import models
 from django.contrib.auth.models import User
+from django.db.models import Q
 from django.utils import timezone  # Import timezone
 
 
+class ConnectionQuerySet(models.QuerySet):
+    def between(self, user_a, user_b):
+        """
+        The connection (in either direction) between two users or user IDs.
+        A single probe on the unique (user_low, user_high) index.
+        """
+        user_low, user_high = Connection.canonical_pair(user_a, user_b)
+        return self.filter(user_low_id=user_low, user_high_id=user_high)
+
+
 class Connection(models.Model):
     """
     Represents a connection request or an established connection
@@ -33,6 +44,16 @@ class Connection(models.Model):
         User, on_delete=models.CASCADE, related_name="received_requests"
     )
 
+    # The same two users with the smaller ID first, so the undirected edge has
+    # exactly one spelling. Filled in by save(); look pairs up with
+    # Connection.objects.between(a, b) instead of OR-ing requester/receiver.
+    user_low = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="+", editable=False
+    )
+    user_high = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="+", editable=False
+    )
+
     # What is the status of this connection?
     status = models.CharField(
         max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING
@@ -44,15 +65,106 @@ class Connection(models.Model):
     # Optional: When was the status last updated?
     # updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ConnectionQuerySet.as_manager()
+
     class Meta:
-        # Ensures that a user cannot send multiple pending requests
-        # to the same other user.
+        # At most one connection record per pair of users, whichever
+        # direction the request went.
         constraints = [
             models.UniqueConstraint(
-                fields=["requester", "receiver"], name="unique_connection_request"
+                fields=["user_low", "user_high"], name="unique_connection_pair"
             )
         ]
+        indexes = [
+            # Adjacency lists (connections/graph.py): one partial index per
+            # side of the pair, covering accepted edges only
+            models.Index(
+                fields=["user_low", "user_high"],
+                condition=Q(status="accepted"),
+                name="conn_accepted_low_idx",
+            ),
+            models.Index(
+                fields=["user_high", "user_low"],
+                condition=Q(status="accepted"),
+                name="conn_accepted_high_idx",
+            ),
+            # Incoming requests (list_pending_requests)
+            models.Index(
+                fields=["receiver", "-created_at"],
+                condition=Q(status="pending"),
+                name="conn_pending_receiver_idx",
+            ),
+        ]
         ordering = ["-created_at"]  # Default order when fetching connections
 
+    @staticmethod
+    def canonical_pair(user_a, user_b):
+        """(smaller id, larger id) for two users or user IDs."""
+        a = getattr(user_a, "pk", user_a)
+        b = getattr(user_b, "pk", user_b)
+        return (a, b) if a < b else (b, a)
+
+    def save(self, *args, **kwargs):
+        self.user_low_id, self.user_high_id = self.canonical_pair(
+            self.requester_id, self.receiver_id
+        )
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.requester.username} -> {self.receiver.username} ({self.get_status_display()})"
+
+
+class Suggestion(models.Model):
+    """
+    A precomputed "people you may know" entry: a second-degree connection of
+    `user`, scored by mutual connections plus shared role/location.
+
+    Rebuilt in bulk by `manage.py build_suggestions`; the suggestions page
+    only ever reads the top few rows for the logged-in user.
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="suggestions"
+    )  # Who the suggestion is for
+    suggested_user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="+"
+    )
+    mutual_count = models.PositiveIntegerField()
+    score = models.FloatField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["-score"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "suggested_user"], name="unique_suggestion"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["user", "-score"], name="conn_suggestion_user_idx")
+        ]
+
+    def __str__(self):
+        return f"{self.suggested_user_id} for {self.user_id} ({self.score:.1f})"
+
+
+# Keep the cached adjacency sets in connections/graph.py in sync
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+
+@receiver(post_save, sender=Connection)
+@receiver(post_delete, sender=Connection)
+def invalidate_connection_graph(sender, instance, **kwargs):
+    from . import graph
+
+    def invalidate():
+        graph.invalidate(instance.requester_id, instance.receiver_id)
+        graph.invalidate_separation(instance.requester_id, instance.receiver_id)
+
+    # Now, for reads later in this transaction (the feed's timeline signals),
+    # and again on commit: a concurrent reader may have cached the pre-commit
+    # neighbors meanwhile, which would otherwise stick for the cache timeout
+    invalidate()
+    transaction.on_commit(invalidate)
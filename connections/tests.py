@@ -1,3 +1,232 @@
-from django.test import TestCase
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from . import graph, suggestions, views
+from .models import Connection, Suggestion
+
+
+class ConnectionGraphCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.ana = User.objects.create_user("ana", password="pw")
+        self.ben = User.objects.create_user("ben", password="pw")
+
+    def test_accepting_invalidates_again_on_commit(self):
+        request = Connection.objects.create(requester=self.ana, receiver=self.ben)
+        self.assertEqual(graph.neighbor_ids(self.ana.id), frozenset())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            request.status = Connection.STATUS_ACCEPTED
+            request.save()
+            # A concurrent reader caches what it saw before the commit
+            cache.set(graph._key(self.ana.id), frozenset())
+            cache.set(graph._key(self.ben.id), frozenset())
+        self.assertTrue(graph.are_connected(self.ana.id, self.ben.id))
+        self.assertTrue(graph.are_connected(self.ben.id, self.ana.id))
+
+
+class SeparationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = {
+            name: User.objects.create_user(name, password="pw")
+            for name in ("me", "a", "a2", "b", "c", "d")
+        }
+        for edge in "me-a me-a2 a-b a2-b b-c c-d".split():
+            self.connect(*edge.split("-"))
+
+    def connect(self, a, b):
+        Connection.objects.create(
+            requester=self.users[a], receiver=self.users[b], status=Connection.STATUS_ACCEPTED
+        )
+
+    def separation(self, other):
+        return graph.separation(self.users["me"].id, self.users[other].id)
+
+    def test_degrees_and_mutual_counts(self):
+        self.assertEqual(self.separation("a"), {"degree": 1, "mutual_count": 0})
+        self.assertEqual(self.separation("b"), {"degree": 2, "mutual_count": 2})
+        self.assertEqual(self.separation("c"), {"degree": 3, "mutual_count": 0})
+        self.assertEqual(self.separation("d"), {"degree": None, "mutual_count": 0})
+
+    def test_third_degree_search_gives_up_after_its_budget(self):
+        with mock.patch.object(graph, "SEPARATION_TIME_BUDGET", -1):
+            self.assertEqual(self.separation("c")["degree"], None)
+
+    def test_cached_per_pair_until_the_pair_changes(self):
+        self.separation("b")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.separation("b")["degree"], 2)
+            # Either way round
+            self.assertEqual(
+                graph.separation(self.users["b"].id, self.users["me"].id)["degree"], 2
+            )
+        self.connect("me", "b")
+        self.assertEqual(self.separation("b")["degree"], 1)
+
+    def test_profile_badge_query_budget(self):
+        self.client.force_login(self.users["me"])
+        for name, badge in [("a", "1st"), ("b", "2nd")]:
+            url = reverse("users:user_profile", args=[name])
+            self.client.get(url)  # Warm the cache
+            # session + auth user + user/profile + portfolio items + posts,
+            # and for anyone not connected the pair's Connection record
+            with self.assertNumQueries(5 if badge == "1st" else 6):
+                response = self.client.get(url)
+            self.assertContains(response, badge)
+        self.assertContains(response, "2 mutual connections")
+
+
+class CanonicalPairTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.ana = User.objects.create_user("ana", password="pw")
+        self.ben = User.objects.create_user("ben", password="pw")
+
+    def test_one_row_per_pair_whichever_direction(self):
+        request = Connection.objects.create(requester=self.ben, receiver=self.ana)
+        self.assertEqual((request.user_low, request.user_high), (self.ana, self.ben))
+        self.assertEqual(Connection.objects.between(self.ana, self.ben).get(), request)
+        self.assertEqual(Connection.objects.between(self.ben.id, self.ana.id).get(), request)
+
+        # A request back the other way finds the pending one instead
+        self.client.force_login(self.ana)
+        self.client.get(reverse("connections:send_connection_request", args=[self.ben.id]))
+        self.assertEqual(Connection.objects.count(), 1)
+
+    def test_re_requesting_after_a_rejection_reuses_the_row(self):
+        request = Connection.objects.create(
+            requester=self.ben, receiver=self.ana, status=Connection.STATUS_REJECTED
+        )
+        self.client.force_login(self.ana)
+        self.client.get(reverse("connections:send_connection_request", args=[self.ben.id]))
+
+        again = Connection.objects.get()
+        self.assertEqual(again.id, request.id)
+        self.assertEqual(
+            (again.requester, again.receiver, again.status),
+            (self.ana, self.ben, Connection.STATUS_PENDING),
+        )
+
+
+class SuggestionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = {}
+        for name, role, location in [
+            ("me", "Editor", "Lisbon"),
+            ("a", "", ""),
+            ("b", "", ""),
+            ("c", "", ""),
+            ("x", "Gaffer", "Porto"),  # 3 mutual
+            ("y", "editor ", "LISBON"),  # 1 mutual + role + location
+            ("z", "Grip", "Lisbon"),  # 1 mutual + location
+            ("w", "", ""),  # 1 mutual
+            ("pending", "", ""),
+            ("rejected", "", ""),
+        ]:
+            user = User.objects.create_user(name)
+            user.profile.role = role
+            user.profile.location = location
+            user.profile.save()
+            self.users[name] = user
+        edges = "me-a me-b me-c a-b x-a x-b x-c y-a z-a w-a pending-a rejected-a"
+        for edge in edges.split():
+            self.connect(*edge.split("-"))
+        self.connect("pending", "me", Connection.STATUS_PENDING)
+        self.connect("me", "rejected", Connection.STATUS_REJECTED)
+
+    def connect(self, a, b, status=Connection.STATUS_ACCEPTED):
+        Connection.objects.create(
+            requester=self.users[a], receiver=self.users[b], status=status
+        )
+
+    def names(self, ranked):
+        by_id = {user.id: name for name, user in self.users.items()}
+        return [(by_id[candidate_id], score, mutual) for score, candidate_id, mutual in ranked]
+
+    def test_ranked_by_mutuals_and_shared_attributes(self):
+        adjacency, blocked = suggestions.load_graph()
+        attributes = suggestions.load_attributes()
+        ranked = suggestions.suggest_for(self.users["me"].id, adjacency, blocked, attributes)
+        # Connected (a, b, c), pending and rejected pairs are left out
+        self.assertEqual(
+            self.names(ranked),
+            [("y", 4.0, 1), ("x", 3.0, 3), ("z", 2.0, 1), ("w", 1.0, 1)],
+        )
+        top = suggestions.suggest_for(
+            self.users["me"].id, adjacency, blocked, attributes, limit=2
+        )
+        self.assertEqual([name for name, _, _ in self.names(top)], ["y", "x"])
+
+    def test_rebuild_replaces_the_table(self):
+        Suggestion.objects.create(
+            user=self.users["me"], suggested_user=self.users["a"], mutual_count=0, score=99
+        )
+        out = StringIO()
+        call_command("build_suggestions", "--limit", "3", stdout=out)
+        self.assertIn("Wrote", out.getvalue())
+        mine = Suggestion.objects.filter(user=self.users["me"])
+        self.assertEqual([s.suggested_user.username for s in mine], ["y", "x", "z"])
+
+        self.client.force_login(self.users["me"])
+        self.connect("me", "y")  # Connected since the batch ran: hidden
+        response = self.client.get(reverse("connections:list_suggestions"))
+        self.assertEqual(
+            [s.suggested_user.username for s in response.context["suggestions"]], ["x", "z"]
+        )
+        self.assertContains(response, "3 mutual connections")
+
+    @mock.patch.object(views, "SUGGESTIONS_SHOWN", 2)
+    def test_hidden_suggestions_dont_shrink_the_page(self):
+        call_command("build_suggestions", stdout=StringIO())
+        self.connect("me", "y")  # Connected since the batch ran
+        self.connect("x", "me", Connection.STATUS_PENDING)  # Requested since
+        self.client.force_login(self.users["me"])
+        response = self.client.get(reverse("connections:list_suggestions"))
+        self.assertEqual(
+            [s.suggested_user.username for s in response.context["suggestions"]], ["z", "w"]
+        )
+
+
+class CanonicalPairMigrationTests(TransactionTestCase):
+    before = [("connections", "0001_initial")]
+    after = [("connections", "0002_canonical_pair")]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_duplicate_directions_are_merged(self):
+        apps = self.migrate(self.before)
+        OldUser = apps.get_model("auth", "User")
+        OldConnection = apps.get_model("connections", "Connection")
+        ana, ben, cy = [OldUser.objects.create(username=name) for name in ("ana", "ben", "cy")]
+        rejected = OldConnection.objects.create(requester=ana, receiver=ben, status="rejected")
+        accepted = OldConnection.objects.create(requester=ben, receiver=ana, status="accepted")
+        older = OldConnection.objects.create(requester=cy, receiver=ana, status="pending")
+        newer = OldConnection.objects.create(requester=ana, receiver=cy, status="pending")
+        OldConnection.objects.filter(id=older.id).update(
+            created_at=newer.created_at.replace(year=2000)
+        )
+
+        apps = self.migrate(self.after)
+        NewConnection = apps.get_model("connections", "Connection")
+        kept = {
+            (row.user_low_id, row.user_high_id): row.id for row in NewConnection.objects.all()
+        }
+        self.assertEqual(kept, {(ana.id, ben.id): accepted.id, (ana.id, cy.id): newer.id})
+        self.assertNotIn(rejected.id, kept.values())
@@ -18,4 +18,5 @@ urlpatterns = [
         name="list_connections",
     ),
     path("requests/", views.list_pending_requests, name="list_pending_requests"),
+    path("suggestions/", views.list_suggestions, name="list_suggestions"),
 ]
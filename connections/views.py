@@ -4,8 +4,12 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.db.models import Q  # Required for complex lookups (OR conditions)
-from .models import Connection
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.db.models import Exists, OuterRef, Q
+from django.db.models.functions import Lower
+from .models import Connection, Suggestion
+from . import graph
 from django.urls import reverse  # To generate URLs dynamically
 
 
@@ -27,9 +31,8 @@ def send_request(request, user_id):
         )  # Assuming 'users:profile' is the view for the logged-in user's profile
 
     # Check if a connection or pending request already exists (in either direction)
-    existing_connection = Connection.objects.filter(
-        (Q(requester=requester, receiver=receiver))
-        | (Q(requester=receiver, receiver=requester))
+    existing_connection = Connection.objects.between(
+        requester, receiver
     ).first()  # .first() gets the object if it exists, or None
 
     if existing_connection:
@@ -55,10 +58,9 @@ def send_request(request, user_id):
             pass  # Allow creating a new request if the old one was rejected
 
     # Only create if no *active* (pending/accepted) connection exists.
-    # We rely on the UniqueConstraint to prevent duplicate *pending* requests if the rejected logic is skipped.
-    # A more robust way for re-requesting might involve updating the 'rejected' status back to 'pending'.
-    # Let's keep it simple: Create if no pending/accepted exists.
-    # The UniqueConstraint will prevent duplicates if we try creating again without the rejected check above.
+    # There is one record per pair of users (unique on user_low/user_high), so
+    # re-requesting after a rejection reuses the rejected record, pointed in
+    # the new direction, instead of creating a second one.
 
     can_create = (
         not existing_connection
@@ -67,26 +69,23 @@ def send_request(request, user_id):
 
     if can_create:
         try:
-            # If a rejected request exists, maybe update it instead of creating new?
-            # For simplicity, let's just try creating. The constraint handles duplicates.
-            # If you want to re-activate a rejected request:
-            # rejected_request = Connection.objects.filter(requester=requester, receiver=receiver, status=Connection.STATUS_REJECTED).first()
-            # if rejected_request:
-            #    rejected_request.status = Connection.STATUS_PENDING
-            #    rejected_request.save()
-            #    messages.success(request, f"Connection request sent again to {receiver.username}.")
-            # else:
-            #    Connection.objects.create(requester=requester, receiver=receiver)
-            #    messages.success(request, f"Connection request sent to {receiver.username}.")
-
-            # Simplest approach relying on constraint:
-            Connection.objects.create(requester=requester, receiver=receiver)
-            messages.success(
-                request, f"Connection request sent to {receiver.username}."
-            )
+            if existing_connection:
+                existing_connection.requester = requester
+                existing_connection.receiver = receiver
+                existing_connection.status = Connection.STATUS_PENDING
+                existing_connection.created_at = timezone.now()
+                existing_connection.save()
+                messages.success(
+                    request, f"Connection request sent again to {receiver.username}."
+                )
+            else:
+                Connection.objects.create(requester=requester, receiver=receiver)
+                messages.success(
+                    request, f"Connection request sent to {receiver.username}."
+                )
 
-        except Exception as e:
-            # This might catch the UniqueConstraint violation if the logic above failed
+        except IntegrityError as e:
+            # Two requests for the same pair raced each other
             messages.error(
                 request, f"Could not send request. It might already exist. Error: {e}"
             )
@@ -104,6 +103,8 @@ def send_request(request, user_id):
 # ... (keep existing imports) ...
 from django.core.exceptions import PermissionDenied
 
+SUGGESTIONS_SHOWN = 10
+
 
 @login_required
 def manage_request(request, connection_id, action):
@@ -134,14 +135,16 @@ def manage_request(request, connection_id, action):
 
     if action == "accept":
         connection.status = Connection.STATUS_ACCEPTED
-        connection.save()
+        with transaction.atomic():  # With its outbox event, see feed/models.py
+            connection.save()
         messages.success(
             request, f"You are now connected with {connection.requester.username}."
         )
         # Optional: Create a notification for the requester
     elif action == "reject":
         connection.status = Connection.STATUS_REJECTED
-        connection.save()
+        with transaction.atomic():  # May record an outbox event too
+            connection.save()
         # OR: delete the request entirely?
         # connection.delete()
         messages.info(
@@ -166,24 +169,14 @@ def list_connections(request):
     """
     View to display a list of users the logged-in user is connected with.
     """
-    user = request.user
-    # Find all Connection objects where the status is 'accepted'
-    # and the current user is either the requester or the receiver.
-    accepted_connections = Connection.objects.filter(
-        (Q(requester=user) | Q(receiver=user)), status=Connection.STATUS_ACCEPTED
+    # IDs come from the cached connection graph; one query then loads the
+    # users (and their profiles, for the role shown in the template)
+    connected_users = (
+        User.objects.filter(id__in=graph.neighbor_ids(request.user.id))
+        .select_related("profile")
+        .order_by(Lower("username"))  # Alphabetical, case-insensitive
     )
 
-    # Extract the actual User objects they are connected *to*.
-    connected_users = []
-    for connection in accepted_connections:
-        if connection.requester == user:
-            connected_users.append(connection.receiver)
-        else:
-            connected_users.append(connection.requester)
-
-    # Sort the list alphabetically by username for consistency
-    connected_users.sort(key=lambda x: x.username.lower())
-
     context = {
         "connected_users": connected_users,
     }
@@ -208,3 +201,28 @@ def list_pending_requests(request):
         "pending_requests": pending_requests,
     }
     return render(request, "connections/list_pending_requests.html", context)
+
+
+@login_required
+def list_suggestions(request):
+    """
+    "People you may know", precomputed by manage.py build_suggestions.
+    """
+    # Anyone connected, requested or rejected since the last batch run is
+    # dropped here (any Connection record, as in suggest_for), inside the
+    # query so the page is still filled up to SUGGESTIONS_SHOWN. One probe
+    # of the unique (user_low, user_high) index per row
+    recorded = Connection.objects.filter(
+        Q(user_low=request.user, user_high=OuterRef("suggested_user_id"))
+        | Q(user_high=request.user, user_low=OuterRef("suggested_user_id"))
+    )
+    suggestions = (
+        Suggestion.objects.filter(user=request.user)
+        .exclude(Exists(recorded))
+        .select_related("suggested_user__profile")[:SUGGESTIONS_SHOWN]
+    )
+
+    context = {
+        "suggestions": suggestions,
+    }
+    return render(request, "connections/list_suggestions.html", context)
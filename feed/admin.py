@@ -1,3 +1,12 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import HighFanoutAuthor
+
+
+@admin.register(HighFanoutAuthor)
+class HighFanoutAuthorAdmin(admin.ModelAdmin):
+    """Who is currently excluded from fan-out-on-write, and why."""
+
+    list_display = ["user", "connection_count", "updated_at"]
+    ordering = ["-connection_count"]
+    search_fields = ["user__username"]
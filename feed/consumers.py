@@ -0,0 +1,51 @@
+# feed/consumers.py
+"""
+Outbox consumers (see outbox/dispatcher.py and settings.OUTBOX_CONSUMERS)
+for the feed's side effects: the post announcing a new portfolio item,
+timeline fan-out/backfill, and switching authors back to fan-out. Each takes an OutboxEvent, may see the same one
+again, and must cope with the objects involved having changed or gone by
+the time it runs.
+"""
+from django.db import transaction
+
+from connections.models import Connection
+from portfolio.models import PortfolioItem
+
+from . import realtime, timeline
+from .models import Post
+
+
+def create_portfolio_post(event):
+    """A feed post announcing a new portfolio item."""
+    if not PortfolioItem.objects.filter(id=event.payload["item_id"]).exists():
+        return  # Deleted before we got to it
+    Post.objects.create(
+        user_id=event.payload["user_id"],
+        post_type="portfolio_add",
+        content=f"Added a new portfolio item: '{event.payload['title']}'",
+    )
+
+
+def fan_out_post(event):
+    """Write a new post into its readers' timelines, then announce it live."""
+    post = Post.objects.filter(id=event.payload["post_id"]).first()
+    if post is None:
+        return
+    timeline.fan_out_post(post)
+    transaction.on_commit(lambda: realtime.publish_post(post))
+
+
+def backfill_connection(event):
+    """Newly connected users see each other's recent posts."""
+    still_connected = Connection.objects.filter(
+        id=event.payload["connection_id"], status=Connection.STATUS_ACCEPTED
+    ).exists()
+    if still_connected:  # Not removed again meanwhile
+        timeline.backfill_connection(
+            event.payload["requester_id"], event.payload["receiver_id"]
+        )
+
+
+def restore_fan_out(event):
+    """An author dropped below the fan-out threshold: fan their posts out again."""
+    timeline.restore_fan_out(event.payload["user_id"])
@@ -0,0 +1,135 @@
+# feed/counters.py
+"""
+Write-behind buffer for the denormalized counters on Post (comment_count,
+reaction_count).
+
+Bumping a counter row on every comment makes a viral post's row a hot spot
+that every commenter's transaction queues on. Instead, increments are added
+up in memory and written every FEED_COUNTER_FLUSH_INTERVAL seconds by a
+background timer, as one UPDATE ... SET x = x + n per distinct n (in
+practice one statement for all the posts that changed).
+
+Counts can lag by up to that interval, and increments still buffered when
+a process is killed are lost. manage.py reconcile_counters recomputes the
+exact values from the rows being counted.
+"""
+import atexit
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Post, Reaction
+
+logger = logging.getLogger(__name__)
+
+# Denormalized counter -> (model it counts, that model's FK to Post)
+SOURCES = {
+    "comment_count": (Comment, "post"),
+    "reaction_count": (Reaction, "post"),
+}
+
+
+class CounterBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = defaultdict(Counter)  # field -> {post_id: delta}
+        self._timer = None
+
+    def add(self, post_id, field, delta=1):
+        """Buffer an increment, once the current transaction (if any) commits."""
+        transaction.on_commit(lambda: self._add(post_id, field, delta))
+
+    def _add(self, post_id, field, delta):
+        interval = getattr(settings, "FEED_COUNTER_FLUSH_INTERVAL", 5)
+        timer = None
+        with self._lock:
+            self._pending[field][post_id] += delta
+            if interval > 0 and self._timer is None:
+                timer = threading.Timer(interval, self._flush_in_background)
+                self._timer = timer
+                timer.daemon = True
+        if interval <= 0:
+            self.flush()  # Write-through
+        elif timer is not None:
+            timer.start()
+
+    def pending(self, post_id, field):
+        with self._lock:
+            return self._pending[field][post_id]
+
+    def flush(self):
+        """Write everything buffered so far. Returns the number of posts updated."""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(Counter)
+            self._timer = None
+        updated = 0
+        try:
+            # All or nothing, so a failed batch can be put back whole
+            with transaction.atomic():
+                for field, deltas in pending.items():
+                    by_delta = defaultdict(list)
+                    for post_id, delta in deltas.items():
+                        if delta:
+                            by_delta[delta].append(post_id)
+                    for delta, post_ids in by_delta.items():
+                        # Never below zero (the counters are unsigned): an
+                        # unlike can be flushed before its like, or after
+                        # the like's increment was lost
+                        updated += Post.objects.filter(id__in=post_ids).update(
+                            **{field: Greatest(F(field) + delta, 0)}
+                        )
+        except Exception:
+            # Put it back for the next flush rather than losing it
+            with self._lock:
+                for field, deltas in pending.items():
+                    self._pending[field].update(deltas)
+            raise
+        return updated
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Flushing post counters failed")
+        finally:
+            connections.close_all()  # This thread's own connections
+
+
+buffer = CounterBuffer()
+atexit.register(buffer._flush_in_background)  # Don't drop what's buffered on a clean exit
+
+
+def reconcile(fields=None, batch_size=1000):
+    """
+    Recompute counters exactly from the counted rows, fixing only the posts
+    that are off. Returns {field: posts corrected}.
+    """
+    corrected = {}
+    for field in fields or SOURCES:
+        model, fk = SOURCES[field]
+        actual = Coalesce(
+            Subquery(
+                model.objects.filter(**{fk: OuterRef("pk")})
+                .order_by()
+                .values(fk)
+                .annotate(n=Count("pk"))
+                .values("n")
+            ),
+            Value(0),
+        )
+        stale_ids = list(
+            Post.objects.annotate(actual=actual)
+            .exclude(**{field: F("actual")})
+            .values_list("id", flat=True)
+        )
+        for start in range(0, len(stale_ids), batch_size):
+            Post.objects.filter(id__in=stale_ids[start : start + batch_size]).update(
+                **{field: actual}
+            )
+        corrected[field] = len(stale_ids)
+    return corrected
@@ -0,0 +1,25 @@
+# feed/management/commands/rebuild_timelines.py
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from feed import timeline
+
+
+class Command(BaseCommand):
+    help = "Rebuild the materialized home timelines from existing posts and connections."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "usernames", nargs="*", help="Only rebuild these users (default: everyone)"
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options["usernames"]:
+            users = users.filter(username__in=options["usernames"])
+
+        count = 0
+        for user_id in users.values_list("id", flat=True).iterator():
+            timeline.rebuild_timeline(user_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} timeline(s)."))
@@ -0,0 +1,24 @@
+# feed/management/commands/reconcile_counters.py
+from django.core.management.base import BaseCommand, CommandError
+
+from feed import counters
+
+
+class Command(BaseCommand):
+    help = "Recompute Post counters (comment_count, ...) exactly from the rows they count."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "fields",
+            nargs="*",
+            help=f"Only these counters (default: all of {', '.join(counters.SOURCES)})",
+        )
+
+    def handle(self, *args, **options):
+        unknown = set(options["fields"]) - set(counters.SOURCES)
+        if unknown:
+            raise CommandError(f"Unknown counter(s): {', '.join(sorted(unknown))}")
+        counters.buffer.flush()  # Anything this process still has buffered
+        corrected = counters.reconcile(options["fields"] or None)
+        for field, count in corrected.items():
+            self.stdout.write(self.style.SUCCESS(f"{field}: corrected {count} post(s)."))
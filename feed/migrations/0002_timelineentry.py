@@ -0,0 +1,58 @@
+# Generated by Django 5.1.15 on 2026-10-18 10:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_timelines(apps, schema_editor):
+    Post = apps.get_model("feed", "Post")
+    Connection = apps.get_model("connections", "Connection")
+    TimelineEntry = apps.get_model("feed", "TimelineEntry")
+
+    neighbours = {}
+    for a, b in Connection.objects.filter(status="accepted").values_list(
+        "requester_id", "receiver_id"
+    ):
+        neighbours.setdefault(a, set()).add(b)
+        neighbours.setdefault(b, set()).add(a)
+
+    entries = []
+    for post_id, user_id, timestamp in Post.objects.values_list(
+        "id", "user_id", "timestamp"
+    ).iterator():
+        for owner_id in neighbours.get(user_id, set()) | {user_id}:
+            entries.append(
+                TimelineEntry(owner_id=owner_id, post_id=post_id, timestamp=timestamp)
+            )
+        if len(entries) >= 1000:
+            TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+            entries = []
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('connections', '0001_initial'),
+        ('feed', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField()),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to=settings.AUTH_USER_MODEL)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='feed.post')),
+            ],
+            options={
+                'ordering': ['-timestamp', '-post'],
+                'indexes': [models.Index(fields=['owner', '-timestamp', '-post'], name='feed_timeline_owner_ts_idx')],
+                'constraints': [models.UniqueConstraint(fields=('owner', 'post'), name='unique_timeline_entry')],
+            },
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.15 on 2026-10-18 10:35
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+
+
+def count_existing_comments(apps, schema_editor):
+    Post = apps.get_model("feed", "Post")
+    Comment = apps.get_model("feed", "Comment")
+    counts = (
+        Comment.objects.filter(post=OuterRef("pk"))
+        .order_by()
+        .values("post")
+        .annotate(n=Count("id"))
+        .values("n")
+    )
+    Post.objects.filter(comments__isnull=False).distinct().update(
+        comment_count=Subquery(counts)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0003_post_user_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_existing_comments, migrations.RunPython.noop),
+    ]
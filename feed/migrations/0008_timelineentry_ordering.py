@@ -0,0 +1,17 @@
+# Generated by Django 5.1.15 on 2026-10-18 11:21
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0007_reaction'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='timelineentry',
+            options={'ordering': ['-timestamp', '-post_id']},
+        ),
+    ]
@@ -23,6 +23,11 @@ class Post(models.Model):
         blank=False, null=False
     )  # The main text content (user-written or system-generated)
     timestamp = models.DateTimeField(auto_now_add=True)
+    # Denormalized so the feed can show "Comments (n)" without a COUNT per post.
+    # Bumped by post_detail when a comment is added.
+    comment_count = models.PositiveIntegerField(default=0)
+    # Same for likes; bumped by feed.reactions.toggle
+    reaction_count = models.PositiveIntegerField(default=0)
 
     # Optional: Link to related object (More advanced, skip for initial MVP if complex)
     # Using GenericForeignKey allows linking to different models (PortfolioItem, JobPost etc.)
@@ -33,7 +38,14 @@ class Post(models.Model):
     # related_object = GenericForeignKey('content_type', 'object_id')
 
     class Meta:
-        ordering = ["-timestamp"]  # Show newest posts first
+        ordering = ["-timestamp", "-id"]  # Show newest posts first
+        indexes = [
+            # Serves "this user's posts, newest first" and keyset paging on
+            # (timestamp, id) without a sort step
+            models.Index(
+                fields=["user", "-timestamp", "-id"], name="feed_post_user_ts_idx"
+            )
+        ]
 
     def __str__(self):
         return f"{self.user.username} ({self.get_post_type_display()}) @ {self.timestamp:%Y-%m-%d %H:%M}"
@@ -49,7 +61,154 @@ class Comment(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        ordering = ["timestamp"]  # Show oldest comments first within a post
+        ordering = ["timestamp", "id"]  # Show oldest comments first within a post
+        indexes = [
+            # A post's comments in order, and keyset paging through them
+            models.Index(
+                fields=["post", "timestamp", "id"], name="feed_comment_post_ts_idx"
+            )
+        ]
 
     def __str__(self):
         return f"Comment by {self.user.username} on post {self.post.id} @ {self.timestamp:%Y-%m-%d %H:%M}"
+
+
+class Reaction(models.Model):
+    """
+    A user liking a post. Only the pair is stored (no per-row payload), and
+    the feed shows Post.reaction_count rather than counting these.
+    """
+
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name="reactions"
+    )
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="reactions"
+    )  # Who reacted
+    timestamp = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # One like per user per post. Its (post, user) index also answers
+            # "which of these posts has this user liked?" for a feed page
+            models.UniqueConstraint(fields=["post", "user"], name="unique_reaction")
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} likes post {self.post_id}"
+
+
+class TimelineEntry(models.Model):
+    """
+    One row per (reader, post) pair: the materialized home timeline.
+
+    Rows are written when a post is created (fan-out-on-write) and when a
+    connection is accepted (backfill), so reading a feed is a single range
+    scan over the (owner, -timestamp) index instead of a join across every
+    connection's posts.
+    """
+
+    owner = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="timeline_entries"
+    )  # Whose feed this row belongs to
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name="timeline_entries"
+    )
+    # Copied from the post so the feed can be ordered without touching feed_post
+    timestamp = models.DateTimeField()
+
+    class Meta:
+        # post_id, not post: ordering by the relation would sort by the joined
+        # feed_post row's own ordering instead of this table's index
+        ordering = ["-timestamp", "-post_id"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "post"], name="unique_timeline_entry"
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["owner", "-timestamp", "-post"],
+                name="feed_timeline_owner_ts_idx",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.post_id} in {self.owner_id}'s timeline"
+
+
+class HighFanoutAuthor(models.Model):
+    """
+    Users with more accepted connections than settings.FEED_FANOUT_THRESHOLD
+    (kept until they drop below FEED_FANOUT_LOW_THRESHOLD).
+
+    Their posts are NOT fanned out into every connection's timeline (that
+    would be tens of thousands of rows per post); instead feed reads merge
+    their recent posts in at read time. See feed/timeline.py.
+    """
+
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name="high_fanout"
+    )
+    # Degree when the flag was last refreshed, for the admin
+    connection_count = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id} ({self.connection_count} connections)"
+
+
+# --- Timeline maintenance ---
+# Kept as signals so every place that creates a Post (create_post, the form
+# embedded in feed_view, portfolio items) fans out without extra code.
+# Fan-out and backfill go through the outbox (outbox/dispatcher.py, handled
+# by feed/consumers.py) rather than holding up the request; callers save
+# inside transaction.atomic() so the event commits with the change.
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from connections.models import Connection
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    if created:
+        from outbox import dispatcher
+        from . import timeline
+
+        # The author's own row can't wait for the dispatcher: create_post
+        # redirects them straight to their feed
+        timeline.add_own_post(instance)
+        dispatcher.record("post_created", post_id=instance.id)
+
+
+@receiver(post_save, sender=Post)
+def invalidate_post_fragments(sender, instance, created, **kwargs):
+    # Edited (e.g. in the admin): re-render its cached card
+    if not created:
+        from moviepeople import fragments
+
+        fragments.invalidate(instance)
+
+
+@receiver(post_save, sender=Connection)
+def sync_timeline_on_connection_change(sender, instance, created, **kwargs):
+    from outbox import dispatcher
+    from . import timeline
+
+    if instance.status == Connection.STATUS_ACCEPTED:
+        dispatcher.record(
+            "connection_accepted",
+            connection_id=instance.id,
+            requester_id=instance.requester_id,
+            receiver_id=instance.receiver_id,
+        )
+    elif not created:
+        # A brand-new pending request never had timeline rows to remove
+        timeline.remove_connection(instance.requester_id, instance.receiver_id)
+
+
+@receiver(post_delete, sender=Connection)
+def remove_timeline_on_connection_delete(sender, instance, **kwargs):
+    from . import timeline
+
+    timeline.remove_connection(instance.requester_id, instance.receiver_id)
@@ -0,0 +1,50 @@
+# feed/reactions.py
+"""
+Likes on posts.
+
+A like is one Reaction row, unique per (post, user). Totals are never
+counted from that table on read: Post.reaction_count is kept by the same
+write-behind buffer as comment_count (see feed/counters.py), and
+manage.py reconcile_counters reaction_count recomputes it.
+
+Whether the current user liked each post on a feed page is looked up for
+the whole page at once by mark_reacted, so showing it costs one query
+however many posts there are.
+"""
+from django.db import IntegrityError, transaction
+
+from . import counters
+from .models import Post, Reaction
+
+
+def toggle(user, post):
+    """Like the post, or unlike it if already liked. Returns whether it is now liked."""
+    if Reaction.objects.filter(post=post, user=user).delete()[0]:
+        counters.buffer.add(post.id, "reaction_count", -1)  # Floored at 0 on flush
+        return False
+    try:
+        with transaction.atomic():
+            Reaction.objects.create(post=post, user=user)
+    except IntegrityError:
+        return True  # A concurrent request (double click) liked it first
+    counters.buffer.add(post.id, "reaction_count")
+    return True
+
+
+def reaction_count(post_id):
+    """A post's like count, including increments this process has not flushed yet."""
+    stored = Post.objects.filter(id=post_id).values_list("reaction_count", flat=True)
+    pending = counters.buffer.pending(post_id, "reaction_count")
+    return max((stored.first() or 0) + pending, 0)
+
+
+def mark_reacted(user, posts):
+    """Set post.reacted on each post: whether user has liked it. One query."""
+    reacted_ids = set(
+        Reaction.objects.filter(
+            user=user, post_id__in=[post.id for post in posts]
+        ).values_list("post_id", flat=True)
+    )
+    for post in posts:
+        post.reacted = post.id in reacted_ids
+    return posts
@@ -0,0 +1,24 @@
+# feed/realtime.py
+"""
+Live feed updates: every new Post is published to its author's posts channel
+(moviepeople/pubsub.py) once its transaction commits. The event stream in
+moviepeople/events.py subscribes to the channels of the reader's connections.
+"""
+from moviepeople import pubsub
+
+
+def post_event(post):
+    """The JSON pushed to clients for a new post."""
+    return {
+        "type": "post",
+        "id": post.id,
+        "user_id": post.user_id,
+        "author": post.user.username,
+        "post_type": post.post_type,
+        "content": post.content,
+        "timestamp": post.timestamp.isoformat(),
+    }
+
+
+def publish_post(post):
+    pubsub.publish(pubsub.posts_channel(post.user_id), post_event(post))
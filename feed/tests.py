@@ -1,3 +1,455 @@
-from django.test import TestCase
+import re
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.db.models import QuerySet
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from connections.models import Connection
+from moviepeople import fragments
+from moviepeople.pagination import decode_cursor
+from outbox import dispatcher
+from outbox.models import OutboxEvent
+from . import counters, reactions, timeline
+from .models import Comment, HighFanoutAuthor, Post, Reaction, TimelineEntry
+
+
+class FeedQueryCountTests(TestCase):
+    """The feed must cost the same number of queries however many posts it shows."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("director", password="pw")
+        cls.friend = User.objects.create_user("editor", password="pw")
+        Connection.objects.create(
+            requester=cls.user, receiver=cls.friend, status=Connection.STATUS_ACCEPTED
+        )
+
+    def setUp(self):
+        cache.clear()  # Cached connection graph from earlier tests
+        self.client.force_login(self.user)
+
+    def make_posts(self, count):
+        for i in range(count):
+            post = Post.objects.create(user=self.friend, content=f"Post {i}")
+            Comment.objects.create(post=post, user=self.user, content="Nice")
+        dispatcher.dispatch()  # Fan the posts out (normally manage.py dispatch_outbox)
+
+    def test_feed_query_budget_is_fixed(self):
+        # With the connection graph cached: session + auth user + one
+        # timeline range scan (posts and authors joined) + one lookup of
+        # which of the page's posts the user has liked
+        self.make_posts(2)
+        self.client.get(reverse("feed:feed_view"))  # Warm the cache
+        with self.assertNumQueries(4):
+            self.client.get(reverse("feed:feed_view"))
+
+        self.make_posts(15)
+        Reaction.objects.create(post=Post.objects.first(), user=self.user)
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("feed:feed_view"))
+        self.assertEqual(len(response.context["posts"]), 17)
+
+    def test_comment_count_is_kept_current(self):
+        post = Post.objects.create(user=self.friend, content="Rough cut is ready")
+        dispatcher.dispatch()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("feed:post_detail", args=[post.id]), {"content": "Looks great"}
+            )
+        counters.buffer.flush()  # Normally done by the write-behind timer
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        response = self.client.get(reverse("feed:feed_view"))
+        self.assertContains(response, "Comments (1)")
+
+    @override_settings(FEED_COMMENT_PAGE_SIZE=5)
+    def test_post_detail_pages_comments_in_fixed_queries(self):
+        post = Post.objects.create(user=self.friend, content="Teaser is out")
+        commenters = [User.objects.create_user(f"fan{i}") for i in range(12)]
+        for i, commenter in enumerate(commenters):
+            Comment.objects.create(post=post, user=commenter, content=f"Comment {i}")
+        url = reverse("feed:post_detail", args=[post.id])
+        self.client.get(url)  # Warm the cache
+
+        # Session + auth user + post with author + one page of comments with authors
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context["comments"]), 5)
+
+        seen = [comment.content for comment in response.context["comments"]]
+        cursor = response.context["next_cursor"]
+        while cursor:
+            page = self.client.get(
+                reverse("feed:post_comments", args=[post.id]), {"cursor": cursor}
+            ).json()
+            seen += re.findall(r"Comment \d+", page["html"])
+            cursor = page["next_cursor"]
+        self.assertEqual(seen, [f"Comment {i}" for i in range(12)])
+
+
+class TimelineMaintenanceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.ana, self.ben, self.cy = [
+            User.objects.create_user(name, password="pw") for name in ("ana", "ben", "cy")
+        ]
+
+    def owners(self, post):
+        return set(
+            TimelineEntry.objects.filter(post=post).values_list("owner__username", flat=True)
+        )
+
+    def request(self, requester, receiver):
+        return Connection.objects.create(requester=requester, receiver=receiver)
+
+    def test_new_posts_are_fanned_out_to_connections(self):
+        self.request(self.ana, self.ben)  # Still pending: ben doesn't see her posts
+        Connection.objects.create(
+            requester=self.ana, receiver=self.cy, status=Connection.STATUS_ACCEPTED
+        )
+        dispatcher.dispatch()
+        post = Post.objects.create(user=self.ana, content="Wrap party Friday")
+        self.assertEqual(self.owners(post), {"ana"})  # The rest once dispatched
+        dispatcher.dispatch()
+        self.assertEqual(self.owners(post), {"ana", "cy"})
+
+    def test_authors_see_their_post_before_it_is_dispatched(self):
+        self.client.force_login(self.ana)
+        response = self.client.post(
+            reverse("feed:create_post"), {"content": "Casting call Monday"}, follow=True
+        )
+        self.assertEqual(response.redirect_chain, [(reverse("feed:feed_view"), 302)])
+        self.assertContains(response, "Casting call Monday")
+
+    def test_accepting_backfills_and_removing_drops_posts(self):
+        ana_post = Post.objects.create(user=self.ana, content="Looking for a gaffer")
+        ben_post = Post.objects.create(user=self.ben, content="Gaffer, available")
+        connection = self.request(self.ana, self.ben)
+        dispatcher.dispatch()
+        self.assertEqual(self.owners(ana_post), {"ana"})
+
+        self.client.force_login(self.ben)
+        self.client.get(
+            reverse("connections:manage_connection_request", args=[connection.id, "accept"])
+        )
+        dispatcher.dispatch()
+        self.assertEqual(self.owners(ana_post), {"ana", "ben"})
+        self.assertEqual(self.owners(ben_post), {"ana", "ben"})
+
+        connection.status = Connection.STATUS_REJECTED
+        connection.save()
+        self.assertEqual(self.owners(ana_post), {"ana"})
+        self.assertEqual(self.owners(ben_post), {"ben"})
+
+        connection.status = Connection.STATUS_ACCEPTED
+        connection.save()
+        dispatcher.dispatch()
+        connection.delete()
+        self.assertEqual(self.owners(ana_post), {"ana"})
+        self.assertEqual(self.owners(ben_post), {"ben"})
+
+    def test_rejected_requests_never_backfill(self):
+        ana_post = Post.objects.create(user=self.ana, content="Day one")
+        connection = self.request(self.ana, self.ben)
+        self.client.force_login(self.ben)
+        self.client.get(
+            reverse("connections:manage_connection_request", args=[connection.id, "reject"])
+        )
+        dispatcher.dispatch()
+        self.assertEqual(self.owners(ana_post), {"ana"})
+
+    def test_rebuild_timelines(self):
+        Connection.objects.create(
+            requester=self.ana, receiver=self.ben, status=Connection.STATUS_ACCEPTED
+        )
+        posts = [Post.objects.create(user=user, content="hi") for user in (self.ana, self.cy)]
+        dispatcher.dispatch()
+        expected = set(TimelineEntry.objects.values_list("owner_id", "post_id"))
+        TimelineEntry.objects.all().delete()
+
+        out = StringIO()
+        call_command("rebuild_timelines", "ben", stdout=out)
+        self.assertIn("Rebuilt 1 timeline(s).", out.getvalue())
+        self.assertEqual(
+            set(TimelineEntry.objects.values_list("owner_id", "post_id")),
+            {(self.ben.id, posts[0].id)},
+        )
+        call_command("rebuild_timelines", stdout=out)
+        self.assertEqual(
+            set(TimelineEntry.objects.values_list("owner_id", "post_id")), expected
+        )
+
+
+class TimelinePagingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("director", password="pw")
+        self.friend = User.objects.create_user("editor", password="pw")
+        Connection.objects.create(
+            requester=self.user, receiver=self.friend, status=Connection.STATUS_ACCEPTED
+        )
+        self.posts = [
+            Post.objects.create(user=self.friend, content=f"Post {i}") for i in range(5)
+        ]
+        dispatcher.dispatch()
+        # Same timestamp for all: only the post ID tells them apart
+        tied = self.posts[0].timestamp
+        Post.objects.update(timestamp=tied)
+        TimelineEntry.objects.update(timestamp=tied)
+        self.newest_first = [post.id for post in reversed(self.posts)]
+
+    def test_ties_are_paged_by_post_id(self):
+        seen, cursor = [], None
+        while True:
+            posts, next_cursor = timeline.get_timeline(self.user, cursor, page_size=2)
+            seen += [post.id for post in posts]
+            if next_cursor is None:
+                break
+            cursor = decode_cursor(next_cursor)
+        self.assertEqual(seen, self.newest_first)
+
+    def test_feed_page_endpoint(self):
+        self.client.force_login(self.user)
+        url = reverse("feed:feed_page")
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+            page = self.client.get(url, params).json()
+            seen += [int(n) for n in re.findall(r"Post (\d+)", page["html"])]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(seen, [4, 3, 2, 1, 0])
+
+        response = self.client.get(url, {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 400)
+
+
+class HybridFanoutTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.star = User.objects.create_user("star", password="pw")
+        self.fans = [User.objects.create_user(f"fan{i}", password="pw") for i in range(3)]
+
+    def connect(self, a, b):
+        Connection.objects.create(
+            requester=a, receiver=b, status=Connection.STATUS_ACCEPTED
+        )
+
+    @mock.patch.object(timeline, "FANOUT_THRESHOLD", 2)
+    def test_high_fanout_posts_are_merged_at_read_time(self):
+        for fan in self.fans:
+            self.connect(fan, self.star)
+        dispatcher.dispatch()
+        self.assertTrue(HighFanoutAuthor.objects.filter(user=self.star).exists())
+
+        reader = self.fans[0]
+        Post.objects.create(user=reader, content="mine, older")
+        star_post = Post.objects.create(user=self.star, content="premiere tonight")
+        dispatcher.dispatch()
+        # Only the star's own timeline gets a row
+        owners = TimelineEntry.objects.filter(post=star_post).values_list(
+            "owner_id", flat=True
+        )
+        self.assertEqual(list(owners), [self.star.id])
+
+        posts, next_cursor = timeline.get_timeline(reader, page_size=1)
+        self.assertEqual(posts, [star_post])
+        older, _ = timeline.get_timeline(
+            reader, decode_cursor(next_cursor), page_size=1
+        )
+        self.assertEqual([p.content for p in older], ["mine, older"])
+
+
+    @mock.patch.object(timeline, "FANOUT_THRESHOLD", 2)
+    @mock.patch.object(timeline, "FANOUT_LOW_THRESHOLD", 2)
+    def test_switching_back_waits_for_the_low_threshold_and_the_dispatcher(self):
+        for fan in self.fans:
+            self.connect(fan, self.star)
+        dispatcher.dispatch()
+        star_post = Post.objects.create(user=self.star, content="premiere tonight")
+        dispatcher.dispatch()
+
+        # Back at the threshold: still merged at read time
+        Connection.objects.between(self.star, self.fans[2]).delete()
+        self.assertTrue(HighFanoutAuthor.objects.filter(user=self.star).exists())
+        self.assertFalse(OutboxEvent.objects.filter(topic="fanout_lowered").exists())
+
+        # Below the low threshold: switched back by the dispatcher, not the request
+        Connection.objects.between(self.star, self.fans[1]).delete()
+        self.assertTrue(HighFanoutAuthor.objects.filter(user=self.star).exists())
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.fans[0]).exists())
+        self.assertEqual(timeline.get_timeline(self.fans[0])[0], [star_post])
+
+        dispatcher.dispatch()
+        self.assertFalse(HighFanoutAuthor.objects.filter(user=self.star).exists())
+        self.assertTrue(
+            TimelineEntry.objects.filter(owner=self.fans[0], post=star_post).exists()
+        )
+        self.assertEqual(timeline.get_timeline(self.fans[0])[0], [star_post])
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user("author")
+        self.posts = [Post.objects.create(user=self.author, content=f"Post {i}") for i in range(3)]
+
+    @override_settings(FEED_COUNTER_FLUSH_INTERVAL=60)
+    def test_increments_are_batched(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for post in self.posts:
+                counters.buffer.add(post.id, "comment_count")
+            counters.buffer.add(self.posts[0].id, "comment_count")
+        self.assertEqual(counters.buffer.pending(self.posts[0].id, "comment_count"), 2)
+
+        # One UPDATE per distinct increment, not one per comment (plus the
+        # transaction they share, a savepoint inside the test's own)
+        with self.assertNumQueries(4):
+            self.assertEqual(counters.buffer.flush(), 3)
+        counts = dict(Post.objects.values_list("id", "comment_count"))
+        self.assertEqual([counts[post.id] for post in self.posts], [2, 1, 1])
+
+    @override_settings(FEED_COUNTER_FLUSH_INTERVAL=60)
+    def test_failed_flush_is_retried_without_double_counting(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            counters.buffer.add(self.posts[0].id, "comment_count")
+            counters.buffer.add(self.posts[1].id, "comment_count", 2)
+
+        real_update = QuerySet.update
+        calls = []
+
+        def fail_second_update(queryset, **kwargs):
+            calls.append(kwargs)
+            if len(calls) == 2:
+                raise DatabaseError("connection lost")
+            return real_update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, "update", fail_second_update):
+            with self.assertRaises(DatabaseError):
+                counters.buffer.flush()
+        # The first UPDATE was rolled back with the second, and all of it re-queued
+        self.assertEqual(counters.buffer.pending(self.posts[0].id, "comment_count"), 1)
+        self.assertEqual(counters.buffer.flush(), 2)
+        counts = dict(Post.objects.values_list("id", "comment_count"))
+        self.assertEqual([counts[post.id] for post in self.posts], [1, 2, 0])
+
+    def test_reconcile_recomputes_exact_counts(self):
+        Comment.objects.create(post=self.posts[0], user=self.author, content="a")
+        Comment.objects.create(post=self.posts[0], user=self.author, content="b")
+        Post.objects.filter(id=self.posts[1].id).update(comment_count=5)
+
+        out = StringIO()
+        call_command("reconcile_counters", stdout=out)
+        self.assertIn("comment_count: corrected 2 post(s).", out.getvalue())
+        counts = dict(Post.objects.values_list("id", "comment_count"))
+        self.assertEqual([counts[post.id] for post in self.posts], [2, 0, 0])
+
+
+@override_settings(FEED_COUNTER_FLUSH_INTERVAL=0)  # Write-through, to see counts at once
+class ReactionTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user("author", password="pw")
+        self.fan = User.objects.create_user("fan", password="pw")
+        self.post = Post.objects.create(user=self.author, content="Teaser is out")
+        self.client.force_login(self.fan)
+
+    def react(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse("feed:react", args=[self.post.id])).json()
+
+    def test_toggle_likes_and_unlikes(self):
+        self.assertTrue(self.react()["reacted"])
+        self.assertEqual(reactions.reaction_count(self.post.id), 1)
+
+        self.assertFalse(self.react()["reacted"])
+        self.assertEqual(reactions.reaction_count(self.post.id), 0)
+        self.assertFalse(Reaction.objects.exists())
+
+    def test_count_never_goes_below_zero(self):
+        # The unlike's decrement flushed before the like's increment (another
+        # process) or after it was lost: the stored count is still 0
+        Reaction.objects.create(post=self.post, user=self.fan)
+        self.assertFalse(self.react()["reacted"])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.reaction_count, 0)
+
+    def test_feed_page_shows_liked_state(self):
+        other = Post.objects.create(user=self.author, content="Wrapped!")
+        self.react()
+        posts = reactions.mark_reacted(self.fan, [self.post, other])
+        self.assertEqual([post.reacted for post in posts], [True, False])
+
+
+class PostCardFragmentTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        fragments.stats.reset()
+        self.author = User.objects.create_user("writer", password="pw")
+        self.readers = [User.objects.create_user(f"reader{i}", password="pw") for i in range(2)]
+        for reader in self.readers:
+            Connection.objects.create(
+                requester=reader, receiver=self.author, status=Connection.STATUS_ACCEPTED
+            )
+        self.post = Post.objects.create(user=self.author, content="Casting call")
+        dispatcher.dispatch()
+
+    def feed_as(self, user):
+        self.client.force_login(user)
+        return self.client.get(reverse("feed:feed_view"))
+
+    def test_cards_are_shared_between_viewers_until_they_change(self):
+        self.feed_as(self.readers[0])
+        response = self.feed_as(self.readers[1])  # Someone else's feed, same card
+        self.assertContains(response, "Casting call")
+        card = fragments.stats.snapshot()["post_card"]
+        self.assertEqual((card["misses"], card["hits"]), (1, 1))
+
+        # A new counter value is a new key; a renamed author invalidates it
+        Post.objects.filter(id=self.post.id).update(comment_count=3)
+        self.assertContains(self.feed_as(self.readers[0]), "Comments (3)")
+        self.author.username = "screenwriter"
+        self.author.save()
+        self.assertContains(self.feed_as(self.readers[0]), "screenwriter")
+        self.assertEqual(fragments.stats.snapshot()["post_card"]["misses"], 3)
+
+    def test_a_page_of_cards_is_two_cache_round_trips(self):
+        for i in range(4):
+            Post.objects.create(user=self.author, content=f"Call sheet {i}")
+        dispatcher.dispatch()
+        self.feed_as(self.readers[0])
+
+        with mock.patch.object(fragments, "cache", mock.Mock(wraps=cache)) as spy:
+            response = self.feed_as(self.readers[1])
+        self.assertEqual(spy.get_many.call_count, 2)  # Generation tokens, then cards
+        spy.get.assert_not_called()
+        spy.set.assert_not_called()
+        for i in range(4):
+            self.assertContains(response, f"Call sheet {i}", count=1)
+        card = fragments.stats.snapshot()["post_card"]
+        self.assertEqual((card["misses"], card["hits"]), (5, 5))
+
+    def test_loops_are_read_ahead_the_way_for_binds_them(self):
+        page = Template(
+            "{% load fragments %}{% for a, b in pairs reversed %}"
+            '{% fragment "pair" a b %}{{ a }}{{ b }};{% endfragment %}{% endfor %}'
+            "{% for post in post.user.posts.all %}"
+            '{% fragment "nested" post %}{{ post.content }}{% endfragment %}{% endfor %}'
+        )
+        context = Context({"pairs": [(1, "x"), (2, "y")], "post": self.post})
+        self.assertEqual(page.render(context), "2y;1x;Casting call")
+        self.assertEqual(page.render(context), "2y;1x;Casting call")  # From the cache
+
+    def test_stats_are_staff_only(self):
+        self.feed_as(self.readers[0])
+        self.assertEqual(self.client.get(reverse("fragment_stats")).status_code, 302)
+        staff = User.objects.create_user("ops", password="pw", is_staff=True)
+        self.client.force_login(staff)
+        stats = self.client.get(reverse("fragment_stats")).json()
+        self.assertEqual(stats["post_card"]["misses"], 1)
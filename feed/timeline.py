@@ -0,0 +1,221 @@
+# feed/timeline.py
+"""
+Helpers that keep the materialized home timeline (TimelineEntry) in sync.
+
+Writes happen here (fan-out when a post is created, backfill/removal when a
+connection changes); feed_view only ever reads from get_timeline().
+
+Fan-out is hybrid: authors with more than FEED_FANOUT_THRESHOLD accepted
+connections (HighFanoutAuthor) only get a row in their own timeline, and
+their posts are merged into readers' pages at read time instead. They only
+go back to fan-out-on-write below FEED_FANOUT_LOW_THRESHOLD, so someone at
+the line doesn't switch on every connect/disconnect, and the backfill that
+takes is done by an outbox consumer rather than the request.
+"""
+import heapq
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from connections import graph
+from outbox import dispatcher
+from moviepeople.pagination import encode_cursor, keyset_filter
+from .models import HighFanoutAuthor, Post, TimelineEntry
+
+logger = logging.getLogger(__name__)
+
+# How many of a user's most recent posts get copied into a new connection's
+# timeline when a request is accepted.
+BACKFILL_LIMIT = getattr(settings, "FEED_TIMELINE_BACKFILL", 500)
+BATCH_SIZE = 1000
+PAGE_SIZE = getattr(settings, "FEED_PAGE_SIZE", 20)
+FANOUT_THRESHOLD = getattr(settings, "FEED_FANOUT_THRESHOLD", 5000)
+FANOUT_LOW_THRESHOLD = getattr(settings, "FEED_FANOUT_LOW_THRESHOLD", 4000)
+HIGH_FANOUT_CACHE_KEY = "feed:high_fanout_ids"
+
+
+def high_fanout_ids():
+    """frozenset of every HighFanoutAuthor's user ID (a small, cached set)."""
+    ids = cache.get(HIGH_FANOUT_CACHE_KEY)
+    if ids is None:
+        ids = frozenset(HighFanoutAuthor.objects.values_list("user_id", flat=True))
+        cache.set(HIGH_FANOUT_CACHE_KEY, ids, None)
+    return ids
+
+
+def is_high_fanout(user_id):
+    return user_id in high_fanout_ids()
+
+
+def refresh_fanout_mode(user_id):
+    """
+    Re-check user_id against the fan-out thresholds and update HighFanoutAuthor.
+
+    Above FANOUT_THRESHOLD a user becomes high-fanout at once. Dropping below
+    FANOUT_LOW_THRESHOLD records a fanout_lowered event instead of switching
+    back here: restore_fan_out, run by the dispatcher, copies their recent
+    posts into every connection's timeline, which can be millions of rows.
+    Returns True if the user is (still) high-fanout.
+    """
+    count = graph.degree(user_id)
+    if count > FANOUT_THRESHOLD:
+        _, created = HighFanoutAuthor.objects.update_or_create(
+            user_id=user_id, defaults={"connection_count": count}
+        )
+        if created:
+            cache.delete(HIGH_FANOUT_CACHE_KEY)
+        return True
+
+    if not is_high_fanout(user_id):
+        return False
+    if count < FANOUT_LOW_THRESHOLD:
+        dispatcher.record("fanout_lowered", user_id=user_id)
+    # Merged at read time until restore_fan_out has run
+    return True
+
+
+def restore_fan_out(user_id):
+    """
+    Switch a user back to fan-out-on-write: drop their HighFanoutAuthor row
+    and copy their recent posts into their connections' timelines. Does
+    nothing if they are no longer below FANOUT_LOW_THRESHOLD or already
+    switched. Returns True if it switched them.
+    """
+    if graph.degree(user_id) >= FANOUT_LOW_THRESHOLD:
+        return False
+    if not HighFanoutAuthor.objects.filter(user_id=user_id).delete()[0]:
+        return False
+    # Now for this transaction, and again once other processes can see it
+    cache.delete(HIGH_FANOUT_CACHE_KEY)
+    transaction.on_commit(lambda: cache.delete(HIGH_FANOUT_CACHE_KEY))
+    logger.info("User %s dropped below the fan-out threshold", user_id)
+    for other_id in graph.neighbor_ids(user_id):
+        _copy_posts(user_id, other_id)
+    return True
+
+
+def add_own_post(post):
+    """Put a new post in its author's timeline (the rest is fan_out_post's job)."""
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(owner_id=post.user_id, post_id=post.id, timestamp=post.timestamp)],
+        ignore_conflicts=True,
+    )
+
+
+def fan_out_post(post):
+    """Write the post into its author's timeline and every connection's."""
+    owner_ids = {post.user_id}  # Users always see their own posts
+    if not is_high_fanout(post.user_id):
+        owner_ids |= graph.neighbor_ids(post.user_id)
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(owner_id=owner_id, post_id=post.id, timestamp=post.timestamp)
+            for owner_id in owner_ids
+        ],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,  # Safe to call twice for the same post
+    )
+
+
+def _copy_posts(author_id, owner_id):
+    recent = Post.objects.filter(user_id=author_id).values_list("id", "timestamp")[
+        :BACKFILL_LIMIT
+    ]
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(owner_id=owner_id, post_id=post_id, timestamp=timestamp)
+            for post_id, timestamp in recent
+        ],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill_connection(user_a_id, user_b_id):
+    """Newly connected users see each other's recent posts."""
+    for author_id, owner_id in ((user_a_id, user_b_id), (user_b_id, user_a_id)):
+        # High-fanout authors are merged at read time, no rows needed
+        if not refresh_fanout_mode(author_id):
+            _copy_posts(author_id, owner_id)
+
+
+def remove_connection(user_a_id, user_b_id):
+    """Drop each user's posts from the other's timeline."""
+    TimelineEntry.objects.filter(
+        Q(owner_id=user_a_id, post__user_id=user_b_id)
+        | Q(owner_id=user_b_id, post__user_id=user_a_id)
+    ).delete()
+    refresh_fanout_mode(user_a_id)
+    refresh_fanout_mode(user_b_id)
+
+
+def rebuild_timeline(user_id):
+    """Recreate one user's timeline from scratch (used by rebuild_timelines)."""
+    refresh_fanout_mode(user_id)
+    TimelineEntry.objects.filter(owner_id=user_id).delete()
+    _copy_posts(user_id, user_id)
+    for other_id in graph.neighbor_ids(user_id) - high_fanout_ids():
+        _copy_posts(other_id, user_id)
+
+
+def get_timeline(user, cursor=None, page_size=PAGE_SIZE):
+    """
+    One page of the user's home timeline, newest first.
+
+    Returns (posts, next_cursor). The materialized part is a single range
+    scan on (owner, -timestamp, -post) starting at the cursor. Posts by
+    high-fanout connections come from Post's (user, -timestamp, -id) index,
+    one short scan per such author, and are k-way merged in. Either way the
+    cost depends on page_size, not on the size of the network or of
+    feed_post, or on how deep into the feed the page is.
+    """
+    started = time.perf_counter()
+    # Fetch one extra row per stream to know whether another page exists
+    entries = keyset_filter(
+        TimelineEntry.objects.filter(owner=user)
+        .select_related("post__user")  # The template shows the author's username
+        .order_by("-timestamp", "-post_id"),  # Matches the index and the cursor
+        cursor,
+        ts_field="timestamp",
+        id_field="post_id",
+    )[: page_size + 1]
+    streams = [[entry.post for entry in entries]]
+
+    # Connections whose posts were not fanned out; both sets come from cache
+    merged_author_ids = graph.neighbor_ids(user.id) & high_fanout_ids()
+    for author_id in merged_author_ids:
+        recent = keyset_filter(
+            Post.objects.filter(user_id=author_id).select_related("user"), cursor
+        )
+        streams.append(list(recent[: page_size + 1]))
+
+    posts = []
+    seen = set()  # A post can be in two streams if its author crossed the threshold
+    for post in heapq.merge(*streams, key=lambda p: (p.timestamp, p.id), reverse=True):
+        if post.id in seen:
+            continue
+        seen.add(post.id)
+        posts.append(post)
+        if len(posts) > page_size:
+            break
+
+    next_cursor = None
+    if len(posts) > page_size:
+        posts = posts[:page_size]
+        next_cursor = encode_cursor(posts[-1].timestamp, posts[-1].id)
+
+    if merged_author_ids:
+        logger.debug(
+            "Timeline merge for user %s: %d high-fanout source(s), %d row(s) "
+            "read, %.1f ms (threshold %d)",
+            user.id,
+            len(merged_author_ids),
+            sum(len(stream) for stream in streams),
+            (time.perf_counter() - started) * 1000,
+            FANOUT_THRESHOLD,
+        )
+    return posts, next_cursor
@@ -7,5 +7,10 @@ app_name = "feed"
 urlpatterns = [
     path("create/", views.create_post, name="create_post"),
     path("", views.feed_view, name="feed_view"),  # Make feed the default for the app
+    path("page/", views.feed_page, name="feed_page"),  # JSON, for infinite scroll
     path("post/<int:post_id>/", views.post_detail, name="post_detail"),
+    path(
+        "post/<int:post_id>/comments/", views.post_comments, name="post_comments"
+    ),  # JSON, for "More comments"
+    path("post/<int:post_id>/react/", views.react, name="react"),  # JSON, like/unlike
 ]
@@ -1,17 +1,26 @@
 # feed/views.py
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.views.decorators.http import require_POST
+from django.template.loader import render_to_string
 from django.urls import (
     reverse_lazy,
 )  # Use reverse_lazy for class-based views or success_urls
 
 from .models import Post, Comment  # Import models
 from .forms import PostForm  # Import form
+from . import counters, reactions, timeline
 
-# Import Connection model (adjust path as needed)
-from connections.models import Connection
-from django.db.models import Q
 from django.contrib.auth.models import User
+from moviepeople.pagination import (
+    InvalidCursor,
+    clamp_page_size,
+    decode_cursor,
+    paginate,
+)
 
 
 @login_required
@@ -26,7 +35,8 @@ def create_post(request):
             post.post_type = (
                 "user_post"  # Explicitly set type (though it's the default)
             )
-            post.save()  # Now save the Post to the database
+            with transaction.atomic():  # With its outbox event, see feed/models.py
+                post.save()  # Now save the Post to the database
             return redirect(
                 "feed:feed_view"
             )  # Redirect to the main feed page after posting
@@ -37,31 +47,34 @@ def create_post(request):
     return render(request, "feed/create_post.html", {"form": form})
 
 
-@login_required
-def feed_view(request):
-    user = request.user
-
-    # 1. Get IDs of users the current user is connected to
-    connection_queryset = Connection.objects.filter(status="accepted").filter(
-        Q(requester=user) | Q(receiver=user)
+def _timeline_page(request):
+    """
+    Read one page of the logged-in user's timeline using ?cursor= and ?limit=.
+    Raises InvalidCursor for a tampered/garbled cursor.
+    """
+    token = request.GET.get("cursor")
+    cursor = decode_cursor(token) if token else None
+    page_size = clamp_page_size(
+        request.GET.get("limit"), settings.FEED_PAGE_SIZE, settings.FEED_MAX_PAGE_SIZE
     )
-    connected_user_ids = set([user.id])  # Start with the current user's ID
-    for conn in connection_queryset:
-        if conn.requester == user:
-            connected_user_ids.add(conn.receiver.id)
-        else:
-            connected_user_ids.add(conn.requester.id)
+    posts, next_cursor = timeline.get_timeline(request.user, cursor, page_size)
+    # Like buttons: which of these the user has liked, in one query
+    return reactions.mark_reacted(request.user, posts), next_cursor
 
-    # 2. Fetch posts from the user and their connections
-    #    Order is handled by the Post model's Meta class ('-timestamp')
-    posts = Post.objects.filter(
-        user_id__in=connected_user_ids
-    )  # Efficiently filter by user IDs
 
-    # 3. Optional: Include the Post creation form directly on the feed page
+@login_required
+def feed_view(request):
+    # 1. Read one page of the materialized timeline (filled in when posts are
+    #    created and when connections are accepted, see feed/timeline.py)
+    try:
+        posts, next_cursor = _timeline_page(request)
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid cursor")
+
+    # 2. Optional: Include the Post creation form directly on the feed page
     post_form = PostForm()
 
-    # 4. Handle creation form submission IF submitted from this page
+    # 3. Handle creation form submission IF submitted from this page
     #    (Alternative to dedicated create_post page, choose one or both)
     if request.method == "POST":
         # Check if this POST is for creating a post (e.g., add a name attribute to submit button)
@@ -71,7 +84,8 @@ def feed_view(request):
             new_post = submitted_form.save(commit=False)
             new_post.user = request.user
             new_post.post_type = "user_post"
-            new_post.save()
+            with transaction.atomic():
+                new_post.save()
             return redirect("feed:feed_view")  # Redirect to refresh the feed
         else:
             # If form submitted here is invalid, pass it back to template to show errors
@@ -79,19 +93,53 @@ def feed_view(request):
 
     context = {
         "posts": posts,
+        "next_cursor": next_cursor,  # None when there are no older posts
         "post_form": post_form,  # Include the form for creating posts
     }
     return render(request, "feed/feed.html", context)
 
+
+@login_required
+def feed_page(request):
+    """
+    JSON endpoint for infinite scroll: the rendered HTML for the next page of
+    posts plus the cursor to ask for the one after it.
+    """
+    try:
+        posts, next_cursor = _timeline_page(request)
+    except InvalidCursor:
+        return JsonResponse({"error": "Invalid cursor"}, status=400)
+
+    html = render_to_string("feed/post_list.html", {"posts": posts}, request=request)
+    return JsonResponse({"html": html, "next_cursor": next_cursor})
+
 from .forms import CommentForm  # Import CommentForm
 
 
+def _comment_page(request, post):
+    """
+    One page of a post's comments, oldest first, read with ?cursor= and
+    ?limit= as a range scan on the (post, timestamp, id) index. Returns
+    (comments, cursor for the next page). Raises InvalidCursor.
+    """
+    token = request.GET.get("cursor")
+    cursor = decode_cursor(token) if token else None
+    page_size = clamp_page_size(
+        request.GET.get("limit"),
+        settings.FEED_COMMENT_PAGE_SIZE,
+        settings.FEED_COMMENT_MAX_PAGE_SIZE,
+    )
+    comments = (
+        Comment.objects.filter(post=post)
+        .select_related("user")  # Authors in the same query
+        .order_by("timestamp", "id")
+    )
+    return paginate(comments, cursor, page_size, descending=False)
+
+
 @login_required
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    comments = (
-        post.comments.all()
-    )  # Get comments using related_name, ordered by model Meta
+    post = get_object_or_404(Post.objects.select_related("user"), id=post_id)
 
     if request.method == "POST":
         comment_form = CommentForm(request.POST)
@@ -100,19 +148,58 @@ def post_detail(request, post_id):
             new_comment.post = post  # Link comment to the current post
             new_comment.user = request.user  # Set comment author
             new_comment.save()
+            # Bump the denormalized counter shown in the feed, batched with
+            # other increments rather than an UPDATE per comment
+            counters.buffer.add(post.id, "comment_count")
             # Redirect back to the same post detail page to see the new comment
             return redirect("feed:post_detail", post_id=post.id)
     else:  # GET request
         comment_form = CommentForm()  # Create empty form
 
+    # First page only; the rest come from post_comments ("More comments")
+    try:
+        comments, next_cursor = _comment_page(request, post)
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid cursor")
+
     context = {
         "post": post,
         "comments": comments,
+        "next_cursor": next_cursor,
         "comment_form": comment_form,
     }
     return render(request, "feed/post_detail.html", context)
 
 
+@login_required
+def post_comments(request, post_id):
+    """
+    JSON endpoint for "More comments": the rendered HTML for the page after
+    ?cursor= plus the cursor to ask for the one after it.
+    """
+    post = get_object_or_404(Post, id=post_id)
+    try:
+        comments, next_cursor = _comment_page(request, post)
+    except InvalidCursor:
+        return JsonResponse({"error": "Invalid cursor"}, status=400)
+
+    html = render_to_string(
+        "feed/comment_list.html", {"comments": comments}, request=request
+    )
+    return JsonResponse({"html": html, "next_cursor": next_cursor})
+
+
+@login_required
+@require_POST
+def react(request, post_id):
+    """Like or unlike a post. JSON, for the like button."""
+    post = get_object_or_404(Post, id=post_id)
+    reacted = reactions.toggle(request.user, post)
+    return JsonResponse(
+        {"reacted": reacted, "reaction_count": reactions.reaction_count(post.id)}
+    )
+
+
 # --- Add View for Adding Comments (Alternative - handled within post_detail now) ---
 # We merged comment adding into post_detail view for simplicity.
 # A separate add_comment view is possible but adds complexity for MVP.
@@ -0,0 +1,209 @@
+# messaging/archive.py
+"""
+Cold storage for old messages.
+
+manage.py archive_messages moves messages older than
+MESSAGE_ARCHIVE_AFTER_DAYS out of the Message table into compressed JSONL
+segment files on disk, one or more per conversation, and records each file
+as an ArchiveSegment. The Message table (and its indexes) then only holds
+recent messages, however long the service runs.
+
+Segments are zstd-compressed when the `zstandard` package is installed and
+gzip-compressed otherwise; both can be read either way (by file extension).
+Files never change once written, so decoded segments are cached in memory.
+
+Everything in a conversation's archive is older than anything still in the
+table, so the (timestamp, id) cursors used to page back through a
+conversation carry on into the archive unchanged: see messages_before.
+"""
+import gzip
+import json
+import os
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+
+from moviepeople.pagination import encode_cursor
+
+from .models import ArchiveSegment, Message
+
+try:
+    import zstandard
+except ImportError:  # Optional; fall back to gzip
+    zstandard = None
+
+ARCHIVE_DIR = Path(
+    getattr(settings, "MESSAGE_ARCHIVE_DIR", settings.BASE_DIR / "message_archive")
+)
+SEGMENT_SIZE = getattr(settings, "MESSAGE_ARCHIVE_SEGMENT_SIZE", 1000)
+
+
+def _compress(data):
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(data), ".jsonl.zst"
+    return gzip.compress(data), ".jsonl.gz"
+
+
+def _decompress(data, path):
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"{path} is zstd-compressed; install zstandard to read it")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+# --- Writing ---
+
+
+def _write_segment(conversation_id, messages):
+    """Write one segment file and return its path relative to ARCHIVE_DIR."""
+    lines = [
+        json.dumps(
+            {
+                "id": message.id,
+                "sender_id": message.sender_id,
+                "recipient_id": message.recipient_id,
+                "content": message.content,
+                "timestamp": message.timestamp.isoformat(),
+            }
+        )
+        for message in messages
+    ]
+    data, extension = _compress("\n".join(lines).encode())
+    relative = f"{conversation_id}/{messages[0].id}-{messages[-1].id}{extension}"
+    path = ARCHIVE_DIR / relative
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write then rename, so a crash never leaves a half-written segment
+    temporary = path.with_name(path.name + ".tmp")
+    temporary.write_bytes(data)
+    os.replace(temporary, path)
+    return relative
+
+
+def archive_conversation(conversation_id, cutoff, segment_size=SEGMENT_SIZE):
+    """Move one conversation's messages older than cutoff into segments. Returns how many."""
+    moved = 0
+    while True:
+        batch = list(
+            Message.objects.filter(conversation_id=conversation_id, timestamp__lt=cutoff)
+            .order_by("timestamp", "id")[:segment_size]
+        )
+        if not batch:
+            return moved
+        relative = _write_segment(conversation_id, batch)
+        # The file is in place before the rows go; if this fails the rows
+        # stay and the next run rewrites the same file
+        with transaction.atomic():
+            ArchiveSegment.objects.create(
+                conversation_id=conversation_id,
+                first_timestamp=batch[0].timestamp,
+                first_message_id=batch[0].id,
+                last_timestamp=batch[-1].timestamp,
+                last_message_id=batch[-1].id,
+                message_count=len(batch),
+                path=relative,
+            )
+            Message.objects.filter(id__in=[message.id for message in batch]).delete()
+        moved += len(batch)
+
+
+def archive_messages(cutoff, segment_size=SEGMENT_SIZE):
+    """Archive every conversation's messages older than cutoff. Returns (messages, conversations)."""
+    conversation_ids = (
+        Message.objects.filter(timestamp__lt=cutoff, conversation__isnull=False)
+        .order_by()
+        .values_list("conversation_id", flat=True)
+        .distinct()
+    )
+    moved = conversations = 0
+    for conversation_id in list(conversation_ids):
+        moved += archive_conversation(conversation_id, cutoff, segment_size)
+        conversations += 1
+    return moved, conversations
+
+
+# --- Reading ---
+
+
+def _read_segment(relative):
+    """A segment's records, oldest first."""
+    return _read_file(str(ARCHIVE_DIR / relative))
+
+
+@lru_cache(maxsize=64)
+def _read_file(path):
+    # Cached: segment files never change once written
+    with open(path, "rb") as f:
+        data = _decompress(f.read(), path)
+    records = []
+    for line in data.decode().splitlines():
+        record = json.loads(line)
+        record["timestamp"] = datetime.fromisoformat(record["timestamp"])
+        records.append(record)
+    return records
+
+
+def _segments_before(conversation, before):
+    segments = ArchiveSegment.objects.filter(conversation=conversation)
+    if before is not None:
+        timestamp, pk = before
+        segments = segments.filter(
+            Q(first_timestamp__lt=timestamp)
+            | Q(first_timestamp=timestamp, first_message_id__lt=pk)
+        )
+    return segments.order_by("-last_timestamp", "-last_message_id")
+
+
+def has_messages_before(conversation, before):
+    return _segments_before(conversation, before).exists()
+
+
+def messages_before(conversation, before, limit):
+    """
+    Up to `limit` archived messages of a conversation older than the
+    (timestamp, id) key `before` (None for the newest), newest first, as
+    unsaved Message instances with their sender attached.
+    """
+    records = []
+    for segment in _segments_before(conversation, before).iterator():
+        for record in reversed(_read_segment(segment.path)):
+            if before is None or (record["timestamp"], record["id"]) < before:
+                records.append(record)
+                if len(records) == limit:
+                    break
+        if len(records) == limit:
+            break
+
+    users = User.objects.in_bulk({record["sender_id"] for record in records})
+    messages = []
+    for record in records:
+        if record["sender_id"] not in users:
+            continue  # The sender's account has since been deleted
+        message = Message(conversation=conversation, **record)
+        message.sender = users[record["sender_id"]]
+        messages.append(message)
+    return messages
+
+
+def fill_page(conversation, messages, cursor, page_size):
+    """
+    Complete a newest-first page whose query ran out of messages in the
+    table (paginate returned no next cursor) with archived ones, and work
+    out the cursor for the page after it. Returns (messages, next_cursor).
+    """
+    before = (messages[-1].timestamp, messages[-1].id) if messages else cursor
+    needed = page_size - len(messages)
+    if needed:
+        older = messages_before(conversation, before, needed + 1)
+        messages = messages + older[:needed]
+        more = len(older) > needed
+    else:
+        more = has_messages_before(conversation, before)
+    if not (more and messages):
+        return messages, None
+    return messages, encode_cursor(messages[-1].timestamp, messages[-1].id)
@@ -0,0 +1,9 @@
+# messaging/context_processors.py
+from . import unread
+
+
+def unread_messages(request):
+    """unread_message_count for the nav badge (cached, see messaging/unread.py)."""
+    if not request.user.is_authenticated:
+        return {}
+    return {"unread_message_count": unread.total_unread(request.user.id)}
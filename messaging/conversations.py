@@ -0,0 +1,207 @@
+# messaging/conversations.py
+"""
+Writing messages and keeping each Conversation's summary (last message time
+and preview, and the participants' inbox ordering and read state) in step
+with them.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+
+from connections import graph
+
+from . import unread
+from .models import Conversation, ConversationParticipant, Message
+
+PREVIEW_LENGTH = 100
+
+
+def get_or_create_conversation(user_a, user_b):
+    """The conversation between two users, created (with its participants) if needed."""
+    conversation = Conversation.objects.between(user_a, user_b).first()
+    if conversation is not None:
+        return conversation
+
+    user_low, user_high = Conversation.canonical_pair(user_a, user_b)
+    try:
+        with transaction.atomic():
+            conversation = Conversation.objects.create(
+                user_low_id=user_low, user_high_id=user_high
+            )
+            ConversationParticipant.objects.bulk_create(
+                [
+                    ConversationParticipant(conversation=conversation, user_id=user_id)
+                    for user_id in {user_low, user_high}
+                ]
+            )
+    except IntegrityError:
+        # The other participant created it at the same moment
+        conversation = Conversation.objects.between(user_a, user_b).get()
+    return conversation
+
+
+@transaction.atomic
+def send(sender, recipient, content):
+    """
+    Store a message and update its conversation summary in one transaction.
+    Returns the new Message.
+    """
+    conversation = get_or_create_conversation(sender, recipient)
+    message = Message.objects.create(
+        conversation=conversation, sender=sender, recipient=recipient, content=content
+    )
+    # Guarded on last_message_at so a slower, older send can't overwrite a newer summary
+    Conversation.objects.filter(id=conversation.id).exclude(
+        last_message_at__gt=message.timestamp
+    ).update(
+        last_message_at=message.timestamp,
+        last_message_preview=content[:PREVIEW_LENGTH],
+        last_sender=sender,
+    )
+    ConversationParticipant.objects.filter(conversation=conversation).exclude(
+        last_message_at__gt=message.timestamp
+    ).update(last_message_at=message.timestamp)
+    ConversationParticipant.objects.filter(
+        conversation=conversation, user=recipient
+    ).update(unread_count=F("unread_count") + 1)
+    transaction.on_commit(lambda: unread.invalidate(recipient.id))
+    return message
+
+
+def mark_read(participant, read_up_to):
+    """
+    Move a participant's read cursor to read_up_to (the newest message they
+    were shown) and clear their unread count. Does nothing if a newer
+    message has arrived since, so it is never marked read unseen.
+    Returns True if anything changed.
+    """
+    if read_up_to is None or (
+        participant.unread_count == 0 and participant.last_read_at == read_up_to
+    ):
+        return False
+
+    updated = ConversationParticipant.objects.filter(
+        pk=participant.pk, last_message_at__lte=read_up_to
+    ).update(unread_count=0, last_read_at=read_up_to)
+    if not updated:
+        return False
+
+    from . import realtime
+
+    participant.unread_count, participant.last_read_at = 0, read_up_to
+    transaction.on_commit(lambda: unread.invalidate(participant.user_id))
+    transaction.on_commit(lambda: realtime.publish_read(participant))
+    return True
+
+
+# Per-recipient results of broadcast()
+SENT = "sent"
+NOT_CONNECTED = "not_connected"
+INVALID = "invalid"
+
+
+@transaction.atomic
+def broadcast(sender, recipient_ids, content):
+    """
+    Send the same message to many users at once. Returns {recipient: result}
+    with SENT, NOT_CONNECTED (including the sender themselves) or INVALID
+    (not a user ID), keyed by the recipient as given.
+
+    The query count doesn't grow with the number of recipients: one cached
+    connection-graph lookup checks every recipient, and conversations,
+    participants, messages and summaries are each written in bulk.
+    """
+    results = {}
+    targets = set()
+    connected = graph.neighbor_ids(sender.id)
+    for given in recipient_ids:
+        try:
+            user_id = int(given)
+        except (TypeError, ValueError):
+            results[given] = INVALID
+            continue
+        if user_id in connected:
+            results[given] = SENT
+            targets.add(user_id)
+        else:
+            results[given] = NOT_CONNECTED
+    if not targets:
+        return results
+
+    conversations = _conversations_with(sender, targets)
+    messages = Message.objects.bulk_create(
+        [
+            Message(
+                conversation=conversations[user_id],
+                sender=sender,
+                recipient_id=user_id,
+                content=content,
+            )
+            for user_id in targets
+        ]
+    )
+
+    # One timestamp for the whole batch: auto_now_add gave each message its
+    # own, and a recipient whose message is older than the conversation's
+    # last_message_at could never mark it read (see mark_read)
+    now = max(message.timestamp for message in messages)
+    Message.objects.filter(id__in=[message.id for message in messages]).update(
+        timestamp=now
+    )
+    for message in messages:
+        message.timestamp = now
+
+    # bulk_create skips post_save, so do what send() and its signal do, in bulk
+    conversation_ids = [conversation.id for conversation in conversations.values()]
+    Conversation.objects.filter(id__in=conversation_ids).exclude(
+        last_message_at__gt=now
+    ).update(
+        last_message_at=now,
+        last_message_preview=content[:PREVIEW_LENGTH],
+        last_sender=sender,
+    )
+    participants = ConversationParticipant.objects.filter(
+        conversation_id__in=conversation_ids
+    )
+    participants.exclude(last_message_at__gt=now).update(last_message_at=now)
+    participants.exclude(user=sender).update(unread_count=F("unread_count") + 1)
+
+    from . import realtime
+
+    def after_commit():
+        unread.invalidate_many(targets)
+        for message in messages:
+            realtime.publish_message(message)
+
+    transaction.on_commit(after_commit)
+    return results
+
+
+def _conversations_with(sender, user_ids):
+    """{user_id: Conversation} between sender and each user, creating missing ones in bulk."""
+
+    def existing():
+        rows = Conversation.objects.filter(
+            Q(user_low=sender, user_high_id__in=user_ids)
+            | Q(user_high=sender, user_low_id__in=user_ids)
+        )
+        return {row.other_participant_id(sender.id): row for row in rows}
+
+    found = existing()
+    missing = set(user_ids) - set(found)
+    if missing:
+        pairs = [Conversation.canonical_pair(sender, user_id) for user_id in missing]
+        # ignore_conflicts: a concurrent send may create some of them first
+        Conversation.objects.bulk_create(
+            [Conversation(user_low_id=low, user_high_id=high) for low, high in pairs],
+            ignore_conflicts=True,
+        )
+        found = existing()
+        ConversationParticipant.objects.bulk_create(
+            [
+                ConversationParticipant(conversation=found[user_id], user_id=member_id)
+                for user_id in missing
+                for member_id in (sender.id, user_id)
+            ],
+            ignore_conflicts=True,
+        )
+    return found
@@ -0,0 +1,38 @@
+# messaging/management/commands/archive_messages.py
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from messaging.archive import SEGMENT_SIZE, archive_messages
+
+
+class Command(BaseCommand):
+    help = "Move old messages out of the database into compressed archive segments."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=getattr(settings, "MESSAGE_ARCHIVE_AFTER_DAYS", 365),
+            help="Archive messages older than this many days",
+        )
+        parser.add_argument(
+            "--segment-size",
+            type=int,
+            default=SEGMENT_SIZE,
+            help="Most messages per segment file",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        moved, conversations = archive_messages(cutoff, options["segment_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Archived {moved} message(s) from {conversations} conversation(s) "
+                f"in {time.monotonic() - started:.1f}s."
+            )
+        )
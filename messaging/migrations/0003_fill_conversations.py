@@ -0,0 +1,48 @@
+from django.db import migrations
+
+
+def fill_conversations(apps, schema_editor):
+    """Group existing messages into conversations and summarize each one."""
+    Message = apps.get_model("messaging", "Message")
+    Conversation = apps.get_model("messaging", "Conversation")
+    ConversationParticipant = apps.get_model("messaging", "ConversationParticipant")
+
+    latest = {}  # (low, high) -> (timestamp, sender_id, content) of the newest message
+    for message_id, sender_id, recipient_id, timestamp, content in (
+        Message.objects.order_by("timestamp", "id")
+        .values_list("id", "sender_id", "recipient_id", "timestamp", "content")
+        .iterator()
+    ):
+        pair = tuple(sorted((sender_id, recipient_id)))
+        latest[pair] = (timestamp, sender_id, content)
+
+    for (user_low, user_high), (timestamp, sender_id, content) in latest.items():
+        conversation = Conversation.objects.create(
+            user_low_id=user_low,
+            user_high_id=user_high,
+            last_message_at=timestamp,
+            last_message_preview=content[:100],
+            last_sender_id=sender_id,
+        )
+        ConversationParticipant.objects.bulk_create(
+            [
+                ConversationParticipant(
+                    conversation=conversation, user_id=user_id, last_message_at=timestamp
+                )
+                for user_id in {user_low, user_high}
+            ]
+        )
+        Message.objects.filter(
+            sender_id__in=(user_low, user_high), recipient_id__in=(user_low, user_high)
+        ).update(conversation=conversation)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("messaging", "0002_conversation"),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_conversations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.15 on 2026-10-18 10:53
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_history_read(apps, schema_editor):
+    # There was no read tracking before, so start everyone with nothing unread
+    ConversationParticipant = apps.get_model("messaging", "ConversationParticipant")
+    ConversationParticipant.objects.update(last_read_at=F("last_message_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0004_message_conversation_ts_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversationparticipant',
+            name='last_read_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversationparticipant',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(mark_history_read, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.15 on 2026-10-18 10:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0005_read_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_timestamp', models.DateTimeField()),
+                ('first_message_id', models.PositiveBigIntegerField()),
+                ('last_timestamp', models.DateTimeField()),
+                ('last_message_id', models.PositiveBigIntegerField()),
+                ('message_count', models.PositiveIntegerField()),
+                ('path', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archive_segments', to='messaging.conversation')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['conversation', '-last_timestamp', '-last_message_id'], name='msg_archive_conversation_idx')],
+            },
+        ),
+    ]
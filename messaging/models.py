@@ -3,7 +3,101 @@ from django.db import models
 from django.contrib.auth.models import User  # Or your custom user model if you have one
 
 
+class ConversationQuerySet(models.QuerySet):
+    def between(self, user_a, user_b):
+        """The conversation between two users or user IDs (one index probe)."""
+        user_low, user_high = Conversation.canonical_pair(user_a, user_b)
+        return self.filter(user_low_id=user_low, user_high_id=user_high)
+
+
+class Conversation(models.Model):
+    """
+    A one-to-one message thread. Keeps a summary of its latest message so the
+    inbox can be listed without looking at the Message table at all.
+    """
+
+    # The two participants, smaller user ID first (one row per pair)
+    user_low = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    user_high = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    last_message_preview = models.CharField(max_length=100, blank=True)
+    last_sender = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ConversationQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user_low", "user_high"], name="unique_conversation_pair"
+            )
+        ]
+
+    @staticmethod
+    def canonical_pair(user_a, user_b):
+        """(smaller id, larger id) for two users or user IDs."""
+        a = getattr(user_a, "pk", user_a)
+        b = getattr(user_b, "pk", user_b)
+        return (a, b) if a < b else (b, a)
+
+    def other_participant(self, user):
+        """The participant who isn't `user` (both are select_related by the inbox)."""
+        return self.user_high if self.user_low_id == user.id else self.user_low
+
+    def other_participant_id(self, user_id):
+        return self.user_high_id if self.user_low_id == user_id else self.user_low_id
+
+    def __str__(self):
+        return f"Conversation {self.user_low_id} <-> {self.user_high_id}"
+
+
+class ConversationParticipant(models.Model):
+    """
+    One row per (conversation, user). last_message_at is copied from the
+    conversation so "my conversations, latest first" is a range scan on the
+    (user, -last_message_at, -id) index.
+
+    It is also the user's read state: last_read_at is their read cursor (the
+    other participant sees it as a read receipt) and unread_count is how many
+    messages arrived after it. See messaging/unread.py.
+    """
+
+    conversation = models.ForeignKey(
+        Conversation, on_delete=models.CASCADE, related_name="participants"
+    )
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="conversation_memberships"
+    )
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    last_read_at = models.DateTimeField(null=True, blank=True)
+    unread_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["conversation", "user"], name="unique_conversation_participant"
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "-last_message_at", "-id"],
+                name="msg_participant_inbox_idx",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} in conversation {self.conversation_id}"
+
+
 class Message(models.Model):
+    conversation = models.ForeignKey(
+        Conversation,
+        related_name="messages",
+        on_delete=models.CASCADE,
+        null=True,  # Filled for old rows by migration 0003; always set by send_message
+    )
     sender = models.ForeignKey(
         User, related_name="sent_messages", on_delete=models.CASCADE
     )
@@ -12,10 +106,65 @@ class Message(models.Model):
     )
     content = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
-    # is_read = models.BooleanField(default=False) # Optional for MVP, useful later
+    # Read state is kept per conversation, not per message: see
+    # ConversationParticipant.last_read_at and unread_count
 
     def __str__(self):
         return f"From {self.sender.username} to {self.recipient.username} at {self.timestamp:%Y-%m-%d %H:%M}"
 
     class Meta:
         ordering = ["timestamp"]  # Default order when fetching messages
+        indexes = [
+            # Conversation history pages, newest first (see conversation_view)
+            models.Index(
+                fields=["conversation", "-timestamp", "-id"],
+                name="msg_conversation_ts_idx",
+            ),
+        ]
+
+
+
+class ArchiveSegment(models.Model):
+    """
+    A compressed JSONL file of old messages from one conversation, moved out
+    of the Message table by manage.py archive_messages (see
+    messaging/archive.py). Records the key range it covers so paging back
+    through a conversation knows which files to open.
+    """
+
+    conversation = models.ForeignKey(
+        Conversation, on_delete=models.CASCADE, related_name="archive_segments"
+    )
+    # Oldest and newest message in the file, in (timestamp, id) order
+    first_timestamp = models.DateTimeField()
+    first_message_id = models.PositiveBigIntegerField()
+    last_timestamp = models.DateTimeField()
+    last_message_id = models.PositiveBigIntegerField()
+    message_count = models.PositiveIntegerField()
+    path = models.CharField(max_length=255)  # Relative to MESSAGE_ARCHIVE_DIR
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["conversation", "-last_timestamp", "-last_message_id"],
+                name="msg_archive_conversation_idx",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.path} ({self.message_count} messages)"
+
+
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+
+@receiver(post_save, sender=Message)
+def publish_new_message(sender, instance, created, **kwargs):
+    if created:
+        from . import realtime
+
+        # Only once it is committed, so clients never see a rolled-back message
+        transaction.on_commit(lambda: realtime.publish_message(instance))
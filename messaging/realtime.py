@@ -0,0 +1,168 @@
+# messaging/realtime.py
+"""
+Real-time message delivery.
+
+Every new Message is published to its sender's and recipient's user channels
+(moviepeople/pubsub.py) once its transaction commits. Browsers keep a
+WebSocket open to /ws/messages/, served by websocket_application below (routed
+from moviepeople/asgi.py). It forwards those events and also accepts new
+messages, so sending doesn't need a POST, a redirect and a full page render.
+"""
+import asyncio
+import json
+from http.cookies import SimpleCookie
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.contrib.auth.models import User
+from django.db import close_old_connections
+
+from connections import graph
+from moviepeople import pubsub
+
+from . import conversations
+
+WEBSOCKET_PATH = "/ws/messages/"
+
+
+def message_event(message):
+    """The JSON pushed to clients for a new message."""
+    return {
+        "type": "message",
+        "id": message.id,
+        "conversation_id": message.conversation_id,
+        "sender_id": message.sender_id,
+        "sender": message.sender.username,
+        "recipient_id": message.recipient_id,
+        "content": message.content,
+        "timestamp": message.timestamp.isoformat(),
+    }
+
+
+def publish_message(message):
+    event = message_event(message)
+    for user_id in {message.sender_id, message.recipient_id}:
+        pubsub.publish(pubsub.user_channel(user_id), event)
+
+
+def publish_read(participant):
+    """
+    Tell both participants how far this one has read: the other shows it as
+    a read receipt, the reader's other tabs clear their unread badge.
+    """
+    conversation = participant.conversation
+    event = {
+        "type": "read",
+        "conversation_id": conversation.id,
+        "reader_id": participant.user_id,
+        "last_read_at": participant.last_read_at.isoformat(),
+    }
+    for user_id in {conversation.user_low_id, conversation.user_high_id}:
+        pubsub.publish(pubsub.user_channel(user_id), event)
+
+
+# --- WebSocket ---
+
+
+def _database_call(func, *args):
+    # A socket can stay open for hours, so don't keep using a connection the
+    # database may have dropped (Django does this per request for views)
+    close_old_connections()
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+def _header(scope, name):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _same_origin(scope):
+    # Browsers send cookies with cross-site WebSocket handshakes, so reject
+    # pages from other origins
+    origin = _header(scope, b"origin")
+    return origin is None or urlsplit(origin).netloc == _header(scope, b"host")
+
+
+def _authenticate(scope):
+    """The logged-in user for a handshake, from its session cookie."""
+    cookies = SimpleCookie(_header(scope, b"cookie") or "")
+    morsel = cookies.get(settings.SESSION_COOKIE_NAME)
+    engine = import_module(settings.SESSION_ENGINE)
+    session = engine.SessionStore(morsel.value if morsel else None)
+    return get_user(SimpleNamespace(session=session))
+
+
+def _receive_message(user, text):
+    """Store a message sent over the socket. Returns an error string or None."""
+    try:
+        data = json.loads(text)
+        recipient_id = int(data["recipient_id"])
+        content = str(data["content"]).strip()
+    except (TypeError, ValueError, KeyError):
+        return "Malformed message"
+    if not content:
+        return "Message is empty"
+    # Same rule as send_message: connections only, never yourself
+    if recipient_id == user.id or not graph.are_connected(user.id, recipient_id):
+        return "You can only message your connections"
+
+    try:
+        recipient = User.objects.get(id=recipient_id)
+    except User.DoesNotExist:  # Deleted, but still in a cached neighbor set
+        return "You can only message your connections"
+    conversations.send(user, recipient, content)  # Published by the post_save signal
+    return None
+
+
+async def _forward(subscription, send):
+    async for event in subscription:
+        await send({"type": "websocket.send", "text": json.dumps(event)})
+
+
+async def websocket_application(scope, receive, send):
+    """
+    ASGI app for /ws/messages/. Pushes {"type": "message", ...} events for
+    the logged-in user and accepts {"recipient_id", "content"} frames.
+    """
+    if (await receive())["type"] != "websocket.connect":
+        return
+    if scope["path"] != WEBSOCKET_PATH or not _same_origin(scope):
+        await send({"type": "websocket.close"})  # Rejects the handshake
+        return
+    user = await sync_to_async(_database_call)(_authenticate, scope)
+    if not user.is_authenticated:
+        await send({"type": "websocket.close"})
+        return
+    await send({"type": "websocket.accept"})
+
+    channel = pubsub.user_channel(user.id)
+    async with pubsub.get_broker().subscribe([channel]) as subscription:
+        forwarder = asyncio.create_task(_forward(subscription, send))
+        try:
+            while True:
+                event = await receive()
+                if event["type"] == "websocket.disconnect":
+                    break
+                if event["type"] != "websocket.receive":
+                    continue
+                error = await sync_to_async(_database_call)(
+                    _receive_message, user, event.get("text")
+                )
+                if error:
+                    await send(
+                        {
+                            "type": "websocket.send",
+                            "text": json.dumps({"type": "error", "error": error}),
+                        }
+                    )
+        finally:
+            forwarder.cancel()
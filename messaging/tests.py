@@ -1,3 +1,414 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import json
+import re
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import AsyncClient, Client, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from connections import graph
+from connections.models import Connection
+from feed.models import Post
+from outbox import dispatcher
+
+from . import archive, conversations, unread, views
+from .models import ArchiveSegment, Conversation, ConversationParticipant, Message
+from .realtime import _receive_message, websocket_application
+
+
+class WebSocketDeliveryTests(TransactionTestCase):
+    # Transactional so the on_commit publish actually runs
+
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user("alice", password="x")
+        self.bob = User.objects.create_user("bob", password="x")
+        self.carol = User.objects.create_user("carol", password="x")
+        Connection.objects.create(
+            requester=self.alice, receiver=self.bob, status=Connection.STATUS_ACCEPTED
+        )
+
+    def _scope(self, user):
+        client = Client()
+        client.force_login(user)
+        session_key = client.cookies[settings.SESSION_COOKIE_NAME].value
+        return {
+            "type": "websocket",
+            "path": "/ws/messages/",
+            "headers": [
+                (b"host", b"testserver"),
+                (b"origin", b"http://testserver"),
+                (b"cookie", f"{settings.SESSION_COOKIE_NAME}={session_key}".encode()),
+            ],
+        }
+
+    @async_to_sync
+    async def _exchange(self, alice_scope, bob_scope):
+        bob = ApplicationCommunicator(websocket_application, bob_scope)
+        await bob.send_input({"type": "websocket.connect"})
+        self.assertEqual((await bob.receive_output(1))["type"], "websocket.accept")
+
+        alice = ApplicationCommunicator(websocket_application, alice_scope)
+        await alice.send_input({"type": "websocket.connect"})
+        await alice.receive_output(1)
+        await alice.send_input(
+            {
+                "type": "websocket.receive",
+                "text": json.dumps({"recipient_id": self.bob.id, "content": "hello"}),
+            }
+        )
+        received = json.loads((await bob.receive_output(2))["text"])
+        echoed = json.loads((await alice.receive_output(2))["text"])
+
+        await alice.send_input(
+            {
+                "type": "websocket.receive",
+                "text": json.dumps({"recipient_id": self.carol.id, "content": "hi"}),
+            }
+        )
+        error = json.loads((await alice.receive_output(2))["text"])
+
+        for socket in (alice, bob):
+            await socket.send_input({"type": "websocket.disconnect", "code": 1000})
+            await socket.wait(1)
+        return received, echoed, error
+
+    def test_message_is_pushed_to_both_participants(self):
+        received, echoed, error = self._exchange(
+            self._scope(self.alice), self._scope(self.bob)
+        )
+
+        message = Message.objects.get()
+        self.assertEqual(received["id"], message.id)
+        self.assertEqual(received["content"], "hello")
+        self.assertEqual(echoed, received)
+        # Not connected to carol: refused, and nothing stored
+        self.assertEqual(error["type"], "error")
+        self.assertEqual(Message.objects.count(), 1)
+
+    @async_to_sync
+    async def test_anonymous_handshake_is_rejected(self):
+        socket = ApplicationCommunicator(
+            websocket_application,
+            {"type": "websocket", "path": "/ws/messages/", "headers": []},
+        )
+        await socket.send_input({"type": "websocket.connect"})
+        self.assertEqual((await socket.receive_output(1))["type"], "websocket.close")
+
+
+class ReceiveMessageTests(TestCase):
+    def test_recipient_deleted_but_still_in_the_cached_graph(self):
+        cache.clear()
+        alice = User.objects.create_user("alice", password="x")
+        cache.set(graph._key(alice.id), frozenset({alice.id + 1000}))
+        frame = json.dumps({"recipient_id": alice.id + 1000, "content": "hi"})
+        self.assertEqual(_receive_message(alice, frame), "You can only message your connections")
+        self.assertFalse(Message.objects.exists())
+
+
+class EventStreamTests(TransactionTestCase):
+    # Transactional so the on_commit publishes actually run
+
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user("alice", password="x")
+        self.bob = User.objects.create_user("bob", password="x")
+        Connection.objects.create(
+            requester=self.alice, receiver=self.bob, status=Connection.STATUS_ACCEPTED
+        )
+        self.client.force_login(self.alice)
+
+    async def _read_events(self, stream, count):
+        events = []
+        while len(events) < count:
+            chunk = await asyncio.wait_for(anext(stream), 2)
+            chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+            if chunk.startswith("id:"):
+                fields = dict(line.split(": ", 1) for line in chunk.strip().split("\n"))
+                events.append((fields["id"], fields["event"], json.loads(fields["data"])))
+        return events
+
+    @async_to_sync
+    async def _live_then_resumed(self, cookies):
+        client = AsyncClient()
+        client.cookies = cookies
+
+        response = await client.get("/events/")
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b"retry: 3000\n\n")
+        pending = asyncio.ensure_future(self._read_events(stream, 2))
+        await asyncio.sleep(0.1)  # Let the stream subscribe
+        await sync_to_async(Post.objects.create)(user=self.bob, content="new post")
+        await sync_to_async(dispatcher.dispatch)()  # Announced by the outbox consumer
+        await sync_to_async(conversations.send)(self.bob, self.alice, "hello")
+        live = await pending
+        await stream.aclose()
+
+        # Reconnect from before both events: they are replayed from the database
+        response = await client.get("/events/", headers={"Last-Event-ID": "m0.p0"})
+        resumed = await self._read_events(aiter(response.streaming_content), 2)
+        return live, resumed
+
+    def test_live_events_and_resume(self):
+        live, resumed = self._live_then_resumed(self.client.cookies)
+
+        post = Post.objects.get()
+        message = Message.objects.get()
+        self.assertEqual(
+            [(kind, data["id"]) for _, kind, data in live],
+            [("post", post.id), ("message", message.id)],
+        )
+        self.assertEqual(live[-1][0], f"m{message.id}.p{post.id}")
+        self.assertEqual([data for _, _, data in resumed], [data for _, _, data in live])
+
+    def test_invalid_last_event_id(self):
+        response = self.client.get("/events/", headers={"Last-Event-ID": "bogus"})
+        self.assertEqual(response.status_code, 400)
+
+
+class InboxTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.me = User.objects.create_user("me", password="x")
+        self.others = [User.objects.create_user(f"friend{i}") for i in range(5)]
+
+    def test_send_keeps_the_summary_current(self):
+        conversations.send(self.me, self.others[0], "Call sheet attached")
+        reply = conversations.send(self.others[0], self.me, "x" * 150)
+        conversation = Conversation.objects.get()
+        self.assertEqual(conversation.last_message_at, reply.timestamp)
+        self.assertEqual(conversation.last_message_preview, "x" * conversations.PREVIEW_LENGTH)
+        self.assertEqual(conversation.last_sender, self.others[0])
+        self.assertEqual(
+            set(conversation.participants.values_list("last_message_at", flat=True)),
+            {reply.timestamp},
+        )
+
+        # A newer send already summarized: an older, slower one leaves it alone
+        newer = reply.timestamp + timedelta(minutes=5)
+        Conversation.objects.update(last_message_at=newer, last_message_preview="newer")
+        ConversationParticipant.objects.update(last_message_at=newer)
+        conversations.send(self.me, self.others[0], "slower")
+        conversation.refresh_from_db()
+        self.assertEqual(
+            (conversation.last_message_at, conversation.last_message_preview),
+            (newer, "newer"),
+        )
+        self.assertEqual(
+            set(conversation.participants.values_list("last_message_at", flat=True)), {newer}
+        )
+
+    @mock.patch.object(views, "INBOX_PAGE_SIZE", 2)
+    def test_latest_first_with_cursor_paging(self):
+        for i, other in enumerate(self.others):
+            conversations.send(other, self.me, f"hello {i}")
+        conversations.send(self.me, self.others[1], "bumped")
+        Conversation.objects.create(user_low=self.others[3], user_high=self.others[4])
+
+        self.client.force_login(self.me)
+        seen, cursor = [], None
+        while True:
+            response = self.client.get("/messages/", {"cursor": cursor} if cursor else {})
+            seen += [item["other_user"].username for item in response.context["conversations"]]
+            cursor = response.context["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(seen, ["friend1", "friend4", "friend3", "friend2", "friend0"])
+        self.assertContains(response, "(1 unread)")
+        self.assertEqual(self.client.get("/messages/", {"cursor": "bad"}).status_code, 400)
+
+    def test_migration_groups_existing_messages(self):
+        for other in self.others[:2]:
+            Message.objects.create(sender=self.me, recipient=other, content="old")
+        latest = Message.objects.create(sender=self.others[0], recipient=self.me, content="reply")
+
+        migration = importlib.import_module("messaging.migrations.0003_fill_conversations")
+        migration.fill_conversations(apps, None)
+
+        self.assertEqual(Conversation.objects.count(), 2)
+        self.assertFalse(Message.objects.filter(conversation=None).exists())
+        conversation = Conversation.objects.between(self.me, self.others[0]).get()
+        self.assertEqual(conversation.messages.count(), 2)
+        self.assertEqual(
+            (conversation.last_message_at, conversation.last_message_preview),
+            (latest.timestamp, "reply"),
+        )
+        self.assertEqual(conversation.participants.count(), 2)
+
+
+@override_settings(MESSAGE_PAGE_SIZE=5)
+class MessageHistoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user("alice", password="x")
+        self.bob = User.objects.create_user("bob", password="x")
+        Connection.objects.create(
+            requester=self.alice, receiver=self.bob, status=Connection.STATUS_ACCEPTED
+        )
+        for i in range(12):
+            sender, recipient = (self.alice, self.bob) if i % 2 else (self.bob, self.alice)
+            conversations.send(sender, recipient, f"message {i}")
+        self.client.force_login(self.alice)
+
+    def test_latest_page_then_older_pages(self):
+        response = self.client.get("/messages/bob/")
+        seen = [message.content for message in response.context["messages"]]
+        self.assertEqual(seen, [f"message {i}" for i in range(7, 12)])  # Oldest first
+
+        cursor = response.context["next_cursor"]
+        while cursor:
+            page = self.client.get("/messages/bob/older/", {"cursor": cursor}).json()
+            older = re.findall(r"message \d+", page["html"])
+            self.assertLessEqual(len(older), 5)
+            seen = older + seen
+            cursor = page["next_cursor"]
+        self.assertEqual(seen, [f"message {i}" for i in range(12)])
+
+    def test_older_pages_need_a_connection_and_a_valid_cursor(self):
+        User.objects.create_user("stranger")
+        self.assertEqual(self.client.get("/messages/stranger/older/").status_code, 403)
+        response = self.client.get("/messages/bob/older/", {"cursor": "bad"})
+        self.assertEqual(response.status_code, 400)
+
+
+class UnreadCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user("alice", password="x")
+        self.bob = User.objects.create_user("bob", password="x")
+        Connection.objects.create(
+            requester=self.alice, receiver=self.bob, status=Connection.STATUS_ACCEPTED
+        )
+
+    def test_badge_is_cached_and_cleared_by_reading(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            conversations.send(self.alice, self.bob, "one")
+        self.assertEqual(unread.total_unread(self.bob.id), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            conversations.send(self.alice, self.bob, "two")
+        self.assertEqual(unread.total_unread(self.bob.id), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(unread.total_unread(self.bob.id), 2)
+
+        self.client.force_login(self.bob)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get("/messages/alice/")
+        self.assertEqual(unread.total_unread(self.bob.id), 0)
+        participant = ConversationParticipant.objects.get(user=self.bob)
+        self.assertEqual(participant.last_read_at, Message.objects.latest("id").timestamp)
+
+    def test_total_read_during_a_send_is_not_kept(self):
+        count = unread._count
+
+        def send_while_counting(user_id):
+            # The badge sums the rows, then a send commits before it caches
+            total = count(user_id)
+            with self.captureOnCommitCallbacks(execute=True):
+                conversations.send(self.alice, self.bob, "meanwhile")
+            return total
+
+        with mock.patch.object(unread, "_count", send_while_counting):
+            self.assertEqual(unread.total_unread(self.bob.id), 0)
+        self.assertEqual(unread.total_unread(self.bob.id), 1)
+
+
+class BroadcastTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.sender = User.objects.create_user("sender", password="x")
+        self.crew = [User.objects.create_user(f"crew{i}") for i in range(5)]
+        for member in self.crew:
+            Connection.objects.create(
+                requester=self.sender, receiver=member, status=Connection.STATUS_ACCEPTED
+            )
+        self.stranger = User.objects.create_user("stranger")
+        # An existing conversation is reused, not duplicated
+        conversations.send(self.sender, self.crew[0], "earlier")
+
+    def test_per_recipient_results(self):
+        self.client.force_login(self.sender)
+        ids = [str(member.id) for member in self.crew]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/messages/broadcast/",
+                {"recipient_ids": ids + [str(self.stranger.id), "abc"], "content": "Call time 6am"},
+            )
+
+        body = response.json()
+        self.assertEqual(body["sent"], 5)
+        self.assertEqual(body["results"][str(self.stranger.id)], conversations.NOT_CONNECTED)
+        self.assertEqual(body["results"]["abc"], conversations.INVALID)
+        self.assertEqual(Message.objects.filter(content="Call time 6am").count(), 5)
+        self.assertEqual(Conversation.objects.count(), 5)
+        self.assertEqual(
+            ConversationParticipant.objects.get(user=self.crew[0]).unread_count, 2
+        )
+        self.assertEqual(unread.total_unread(self.crew[3].id), 1)
+
+    def test_every_recipient_can_read_it(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            conversations.broadcast(self.sender, [m.id for m in self.crew], "Wrap party")
+        for member in self.crew:
+            self.assertGreater(unread.total_unread(member.id), 0)
+            self.client.force_login(member)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.get("/messages/sender/")
+            self.assertEqual(unread.total_unread(member.id), 0, member.username)
+
+    def test_query_count_does_not_grow_with_recipients(self):
+        conversations.broadcast(self.sender, [self.crew[0].id], "warm the graph cache")
+        # Both calls start some new conversations (crew1-2, then crew3-4)
+        with self.assertNumQueries(11):
+            conversations.broadcast(self.sender, [m.id for m in self.crew[:3]], "three")
+        with self.assertNumQueries(11):
+            conversations.broadcast(self.sender, [m.id for m in self.crew], "five")
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user("alice", password="x")
+        self.bob = User.objects.create_user("bob", password="x")
+        Connection.objects.create(
+            requester=self.alice, receiver=self.bob, status=Connection.STATUS_ACCEPTED
+        )
+        for i in range(7):
+            conversations.send(self.alice, self.bob, f"message {i}")
+        # The first five are a year old
+        old = timezone.now() - timedelta(days=400)
+        for i, message in enumerate(Message.objects.order_by("id")[:5]):
+            Message.objects.filter(id=message.id).update(timestamp=old + timedelta(minutes=i))
+
+    def test_paging_back_reads_across_the_archive(self):
+        with tempfile.TemporaryDirectory() as directory, mock.patch.object(
+            archive, "ARCHIVE_DIR", Path(directory)
+        ):
+            call_command("archive_messages", "--segment-size", "2", stdout=StringIO())
+            self.assertEqual(Message.objects.count(), 2)
+            self.assertEqual(ArchiveSegment.objects.count(), 3)
+
+            self.client.force_login(self.alice)
+            response = self.client.get("/messages/bob/", {"limit": 3})
+            seen = [message.content for message in response.context["messages"]]
+            cursor = response.context["next_cursor"]
+            while cursor:
+                page = self.client.get(
+                    "/messages/bob/older/", {"cursor": cursor, "limit": 3}
+                ).json()
+                seen = re.findall(r"message \d", page["html"]) + seen
+                cursor = page["next_cursor"]
+
+        self.assertEqual(seen, [f"message {i}" for i in range(7)])
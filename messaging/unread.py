@@ -0,0 +1,73 @@
+# messaging/unread.py
+"""
+Unread message totals for the nav badge.
+
+Per-conversation counts live on ConversationParticipant.unread_count:
+conversations.send bumps the recipient's (conversations.broadcast many at
+once) and conversations.mark_read clears it. The per-user total is cached,
+so the badge on every page (the messaging.context_processors.unread_messages
+context processor) costs no queries on a cache hit; a miss is one SUM over
+the user's participant rows.
+
+Changes invalidate the total on commit by replacing the user's generation
+token, and a cached total is only used while it carries the current token.
+So a reader that summed the rows just before a send committed can't leave
+its stale total behind: it is cached under the old token and ignored.
+"""
+import uuid
+
+from django.core.cache import cache
+from django.db.models import Sum
+
+from .models import ConversationParticipant
+
+# Only a backstop (e.g. for an evicted generation token); totals are
+# invalidated on every change
+CACHE_TIMEOUT = 60 * 60
+
+
+def _key(user_id):
+    return f"messaging:unread:{user_id}"
+
+
+def _generation_key(user_id):
+    return f"messaging:unread:{user_id}:generation"
+
+
+def _count(user_id):
+    return (
+        ConversationParticipant.objects.filter(user_id=user_id).aggregate(
+            total=Sum("unread_count")
+        )["total"]
+        or 0
+    )
+
+
+def total_unread(user_id):
+    key, generation_key = _key(user_id), _generation_key(user_id)
+    cached = cache.get_many([key, generation_key])
+    generation = cached.get(generation_key)
+    if generation is not None and key in cached:
+        cached_generation, total = cached[key]
+        if cached_generation == generation:
+            return total
+    if generation is None:
+        cache.add(generation_key, uuid.uuid4().hex, None)
+        generation = cache.get(generation_key)
+    # Read the token before the rows: a change committing in between
+    # replaces it, so what we cache here is never used
+    total = _count(user_id)
+    cache.set(key, (generation, total), CACHE_TIMEOUT)
+    return total
+
+
+def invalidate(user_id):
+    """Call once a change to the user's unread counts has committed."""
+    invalidate_many([user_id])
+
+
+def invalidate_many(user_ids):
+    """One cache round trip however many users (used by broadcasts)."""
+    cache.set_many(
+        {_generation_key(user_id): uuid.uuid4().hex for user_id in user_ids}, None
+    )
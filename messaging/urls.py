@@ -5,8 +5,16 @@ from . import views
 app_name = "messaging"  # Optional: Namespacing for clarity
 
 urlpatterns = [
+    # The logged-in user's conversations, latest first
+    path("", views.inbox, name="inbox"),
     # URL for processing the message sending form submission
     path("send/", views.send_message, name="send_message"),
+    # One message to many connections (form on GET, JSON results on POST)
+    path("broadcast/", views.broadcast, name="broadcast"),
     # URL pattern for viewing a conversation with a specific user
     path("<str:username>/", views.conversation_view, name="conversation"),
+    # JSON: the page of messages before ?cursor=, for "Load older messages"
+    path("<str:username>/older/", views.conversation_older, name="conversation_older"),
+    # POST: mark the conversation read up to a message seen live
+    path("<str:username>/read/", views.mark_read, name="mark_read"),
 ]
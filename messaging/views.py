@@ -4,20 +4,99 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.views.decorators.http import require_POST
 from django.urls import reverse
-from django.db.models import Q  # Needed for complex lookups
 
-# --- IMPORTANT: Import your Connection model ---
-# Adjust the import path based on where your Connection model lives
-# Example if it's in a 'connections' app:
-from connections.models import Connection
+# Connection checks go through the cached connection graph
+from connections import graph
 
-# Example if it's in the 'users' app:
-# from users.models import Connection
+from .models import Conversation, ConversationParticipant, Message
+from . import archive, conversations
+from moviepeople.pagination import (
+    InvalidCursor,
+    clamp_page_size,
+    decode_cursor,
+    paginate,
+)
+from django.conf import settings
+from django.db.models.functions import Lower
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.template.loader import render_to_string
 
-from .models import Message
+INBOX_PAGE_SIZE = 20
 
-# messaging/views.py
-# ... (keep existing imports and send_message view)
+
+@login_required
+def inbox(request):
+    """
+    The logged-in user's conversations, most recent first. A range scan on
+    the participant (user, -last_message_at, -id) index, so the cost is one page
+    regardless of how many conversations or messages exist.
+    """
+    token = request.GET.get("cursor")
+    try:
+        cursor = decode_cursor(token) if token else None
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid cursor")
+
+    memberships = (
+        ConversationParticipant.objects.filter(
+            user=request.user, last_message_at__isnull=False
+        )
+        .select_related(
+            "conversation__user_low",
+            "conversation__user_high",
+        )
+        .order_by("-last_message_at", "-id")
+    )
+    memberships, next_cursor = paginate(
+        memberships, cursor, INBOX_PAGE_SIZE, ts_field="last_message_at"
+    )
+
+    context = {
+        "conversations": [
+            {
+                "conversation": membership.conversation,
+                "other_user": membership.conversation.other_participant(request.user),
+                "unread_count": membership.unread_count,
+            }
+            for membership in memberships
+        ],
+        "next_cursor": next_cursor,
+    }
+    return render(request, "messaging/inbox.html", context)
+
+
+def _message_page(request, conversation):
+    """
+    One page of a conversation (which may be None if the two users have never
+    exchanged messages), read with ?cursor= and ?limit= as a range scan on the
+    (conversation, -timestamp, -id) index.
+    Returns (messages oldest first, cursor for the next older page).
+    Raises InvalidCursor for a tampered/garbled cursor.
+    """
+    token = request.GET.get("cursor")
+    cursor = decode_cursor(token) if token else None
+    page_size = clamp_page_size(
+        request.GET.get("limit"),
+        settings.MESSAGE_PAGE_SIZE,
+        settings.MESSAGE_MAX_PAGE_SIZE,
+    )
+
+    if conversation is None:
+        return [], None
+
+    messages = (
+        Message.objects.filter(conversation=conversation)
+        .select_related("sender")
+        .order_by("-timestamp", "-id")
+    )
+    messages, next_cursor = paginate(messages, cursor, page_size)
+    if next_cursor is None:
+        # Nothing older left in the table: carry on into the archive
+        messages, next_cursor = archive.fill_page(
+            conversation, messages, cursor, page_size
+        )
+    messages.reverse()  # Fetched newest first, displayed oldest first
+    return messages, next_cursor
 
 
 @login_required
@@ -34,13 +113,7 @@ def conversation_view(request, username):  # Takes username from URL
 
     # --- SECURITY CHECK: Verify users are connected ---
     # (Same check as in send_message)
-    are_connected = Connection.objects.filter(
-        (
-            Q(requester=user, receiver=other_user)
-            | Q(requester=other_user, receiver=user)
-        )
-        & Q(status="accepted")
-    ).exists()
+    are_connected = graph.are_connected(user.id, other_user.id)
 
     if (
         not are_connected and user != other_user
@@ -51,20 +124,142 @@ def conversation_view(request, username):  # Takes username from URL
             "profile_view", username=other_user.username
         )  # Redirect to their profile
 
-    # Fetch messages between the two users
-    messages = Message.objects.filter(
-        (Q(sender=user, recipient=other_user) | Q(sender=other_user, recipient=user))
-    ).order_by(
-        "timestamp"
-    )  # Ensure chronological order
+    # Both participants' read state, with the conversation, in one query
+    participants = {
+        participant.user_id: participant
+        for participant in ConversationParticipant.objects.filter(
+            conversation__in=Conversation.objects.between(user, other_user)
+        ).select_related("conversation")
+    }
+    mine = participants.get(user.id)
+
+    # Only the latest page; older pages come from conversation_older
+    try:
+        messages, next_cursor = _message_page(
+            request, mine.conversation if mine else None
+        )
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid cursor")
+
+    seen = False
+    if messages:
+        latest = messages[-1]
+        # Everything up to the newest message is now read
+        conversations.mark_read(mine, latest.timestamp)
+        # Read receipt: has the other user read my latest message?
+        theirs = participants.get(other_user.id)
+        seen = (
+            latest.sender_id == user.id
+            and theirs is not None
+            and theirs.last_read_at is not None
+            and theirs.last_read_at >= latest.timestamp
+        )
 
     context = {
         "other_user": other_user,
         "messages": messages,
+        "next_cursor": next_cursor,
+        "conversation_id": mine.conversation_id if mine else None,
+        "seen": seen,
     }
     return render(request, "messaging/conversation.html", context)
 
 
+@login_required
+def conversation_older(request, username):
+    """
+    JSON endpoint for "Load older messages": the rendered HTML for the page
+    before ?cursor= plus the cursor to ask for the one before that.
+    """
+    other_user = get_object_or_404(User, username=username)
+    if not graph.are_connected(request.user.id, other_user.id):
+        return JsonResponse({"error": "Not connected"}, status=403)
+
+    try:
+        messages, next_cursor = _message_page(
+            request, Conversation.objects.between(request.user, other_user).first()
+        )
+    except InvalidCursor:
+        return JsonResponse({"error": "Invalid cursor"}, status=400)
+
+    html = render_to_string(
+        "messaging/message_list.html", {"messages": messages}, request=request
+    )
+    return JsonResponse({"html": html, "next_cursor": next_cursor})
+
+
+@login_required
+@require_POST
+def mark_read(request, username):
+    """
+    Mark the conversation read up to POST message_id. Called by the
+    conversation page when a message arrives live while it is open.
+    """
+    try:
+        message_id = int(request.POST.get("message_id", ""))
+    except ValueError:
+        return JsonResponse({"error": "Invalid message_id"}, status=400)
+
+    participant = (
+        ConversationParticipant.objects.filter(
+            conversation__in=Conversation.objects.between(
+                request.user, get_object_or_404(User, username=username)
+            ),
+            user=request.user,
+        )
+        .select_related("conversation")
+        .first()
+    )
+    if participant is None:
+        return JsonResponse({"error": "No such conversation"}, status=404)
+    read_up_to = (
+        Message.objects.filter(
+            id=message_id,
+            conversation_id=participant.conversation_id,
+        )
+        .values_list("timestamp", flat=True)
+        .first()
+    )
+    if read_up_to is None:
+        return JsonResponse({"error": "No such message"}, status=404)
+
+    conversations.mark_read(participant, read_up_to)
+    return JsonResponse({"unread_count": participant.unread_count})
+
+
+@login_required
+def broadcast(request):
+    """
+    Message many connections at once. GET shows the form; POST takes
+    recipient_ids (repeated) and content and returns the per-recipient
+    results as JSON, e.g. {"results": {"12": "sent", "99": "not_connected"}}.
+    """
+    if request.method != "POST":
+        recipients = (
+            User.objects.filter(id__in=graph.neighbor_ids(request.user.id))
+            .select_related("profile")
+            .order_by(Lower("username"))
+        )
+        return render(request, "messaging/broadcast.html", {"recipients": recipients})
+
+    recipient_ids = request.POST.getlist("recipient_ids")
+    content = request.POST.get("content", "").strip()
+    if not recipient_ids or not content:
+        return JsonResponse({"error": "recipient_ids and content are required"}, status=400)
+    if len(recipient_ids) > settings.MESSAGE_BROADCAST_MAX_RECIPIENTS:
+        return JsonResponse(
+            {
+                "error": "Too many recipients (at most "
+                f"{settings.MESSAGE_BROADCAST_MAX_RECIPIENTS})"
+            },
+            status=400,
+        )
+
+    results = conversations.broadcast(request.user, recipient_ids, content)
+    sent = sum(1 for result in results.values() if result == conversations.SENT)
+    return JsonResponse({"results": results, "sent": sent})
+
+
 @login_required  # Ensures only logged-in users can send messages
 @require_POST  # Ensures this view only accepts POST requests (form submissions)
 def send_message(request):
@@ -88,13 +283,7 @@ def send_message(request):
     sender = request.user
 
     # --- SECURITY CHECK: Verify users are connected ---
-    are_connected = Connection.objects.filter(
-        (
-            Q(requester=sender, receiver=recipient)
-            | Q(requester=recipient, receiver=sender)
-        )
-        & Q(status="accepted")
-    ).exists()
+    are_connected = graph.are_connected(sender.id, recipient.id)
 
     if not are_connected:
         # Handle error: Users are not connected, cannot send message
@@ -106,7 +295,8 @@ def send_message(request):
 
     # If all checks pass, create and save the message
     if sender != recipient:  # Prevent sending messages to oneself (optional)
-        Message.objects.create(sender=sender, recipient=recipient, content=content)
+        # Stores the message and updates the conversation summary atomically
+        conversations.send(sender, recipient, content)
 
     # Redirect back to the conversation page with the recipient
     # The 'conversation' name is what we'll define in urls.py for conversation_view
@@ -13,4 +13,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'moviepeople.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up, since it imports models
+from messaging.realtime import websocket_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # Django handles HTTP; WebSockets (real-time messaging) are handled here
+    if scope["type"] == "websocket":
+        await websocket_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -0,0 +1,140 @@
+# moviepeople/events.py
+"""
+Server-Sent Events stream: new messages for the logged-in user and new posts
+from their connections, for clients whose proxies break WebSockets.
+
+The view is async and served by ASGI. An idle stream is one coroutine waiting
+on its pub/sub subscription (moviepeople/pubsub.py), not a thread and not a
+database poll loop. The database is only read when a stream opens.
+
+Every event carries an id of the form "m<message id>.p<post id>", the newest
+of each the client has been sent. EventSource sends it back as Last-Event-ID
+when it reconnects, and anything newer that was missed is replayed from the
+database before live events resume.
+
+Connections made while a stream is open are picked up on its next reconnect.
+"""
+import asyncio
+import json
+import re
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.db.models import Q
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+
+from connections import graph
+from feed.models import Post
+from feed.realtime import post_event
+from messaging.models import Message
+from messaging.realtime import message_event
+
+from . import pubsub
+
+KEEPALIVE_INTERVAL = getattr(settings, "EVENT_STREAM_KEEPALIVE_INTERVAL", 15)
+REPLAY_LIMIT = getattr(settings, "EVENT_STREAM_REPLAY_LIMIT", 100)
+RETRY_MS = 3000
+EVENT_ID_RE = re.compile(r"^m(\d+)\.p(\d+)$")
+
+
+def parse_event_id(value):
+    """'m12.p40' -> (12, 40). Raises ValueError."""
+    match = EVENT_ID_RE.match(value.strip())
+    if match is None:
+        raise ValueError(f"Malformed event id: {value!r}")
+    return int(match.group(1)), int(match.group(2))
+
+
+def _format(event, last_ids):
+    return (
+        f"id: m{last_ids['message']}.p{last_ids['post']}\n"
+        f"event: {event['type']}\n"
+        f"data: {json.dumps(event)}\n\n"
+    )
+
+
+async def _latest_id(queryset):
+    # Highest primary key, a single probe of the pk index
+    return await queryset.order_by("-id").values_list("id", flat=True).afirst() or 0
+
+
+async def _missed_events(user_id, author_ids, message_id, post_id):
+    """Events newer than the client's last ids, oldest first, at most REPLAY_LIMIT of each."""
+    messages = (
+        Message.objects.filter(
+            Q(sender_id=user_id) | Q(recipient_id=user_id), id__gt=message_id
+        )
+        .select_related("sender")
+        .order_by("id")[:REPLAY_LIMIT]
+    )
+    posts = (
+        Post.objects.filter(user_id__in=author_ids, id__gt=post_id)
+        .select_related("user")
+        .order_by("id")[:REPLAY_LIMIT]
+    )
+    events = [message_event(message) async for message in messages]
+    events += [post_event(post) async for post in posts]
+    return sorted(events, key=lambda event: event["timestamp"])
+
+
+async def _stream(user_id, last_event_id):
+    author_ids = await sync_to_async(graph.neighbor_ids)(user_id)
+    channels = [pubsub.user_channel(user_id)]
+    channels += [pubsub.posts_channel(author_id) for author_id in author_ids]
+
+    yield f"retry: {RETRY_MS}\n\n"
+    # Subscribe before reading the database so nothing falls in between
+    async with pubsub.get_broker().subscribe(channels) as subscription:
+        if last_event_id is None:
+            last_ids = {
+                "message": await _latest_id(Message.objects.all()),
+                "post": await _latest_id(Post.objects.all()),
+            }
+            replayed = []
+        else:
+            last_ids = dict(zip(("message", "post"), last_event_id))
+            replayed = await _missed_events(user_id, author_ids, *last_event_id)
+
+        sent = set()
+        for event in replayed:
+            sent.add((event["type"], event["id"]))
+            last_ids[event["type"]] = max(last_ids[event["type"]], event["id"])
+            yield _format(event, last_ids)
+
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                # A comment line keeps proxies from closing an idle stream
+                yield ": keepalive\n\n"
+                continue
+            if event["type"] not in last_ids:
+                # Not resumable (e.g. read receipts): passed through as-is
+                yield _format(event, last_ids)
+                continue
+            if (event["type"], event["id"]) in sent:
+                continue  # Already replayed
+            last_ids[event["type"]] = max(last_ids[event["type"]], event["id"])
+            yield _format(event, last_ids)
+
+
+@login_required
+async def event_stream(request):
+    """
+    text/event-stream of "message", "post" and "read" events. Resumes from the
+    Last-Event-ID header (or ?last_event_id= for a client's first connection).
+    """
+    value = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id")
+    try:
+        last_event_id = parse_event_id(value) if value else None
+    except ValueError:
+        return HttpResponseBadRequest("Invalid Last-Event-ID")
+
+    user = await request.auser()
+    response = StreamingHttpResponse(
+        _stream(user.id, last_event_id), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # Don't let nginx buffer the stream
+    return response
@@ -0,0 +1,244 @@
+# moviepeople/fragments.py
+"""
+Fragment caching for templates: render a piece of a page once and reuse
+the HTML for every request (and every viewer) until what it shows changes.
+
+    {% load fragments %}
+    {% fragment "post_card" post post.user post.comment_count %}
+      ...
+    {% endfragment %}
+
+The fragment's cache key is built from its name and the values after it:
+
+- plain values (counters, updated_at timestamps...) go in as they are, so
+  the key changes by itself when they do;
+- model instances go in as a generation token of their own, which
+  invalidate(instance) replaces. Model signals call it for changes that
+  aren't visible in a value on the page's objects, e.g. a renamed user on
+  their post cards (see users/models.py).
+
+Keep anything that differs between viewers (CSRF tokens, "you liked this")
+outside the fragment, or pass it in as a value.
+
+Directly inside a {% for %} loop, the first iteration works out every
+iteration's key and fetches the lot: one get_many for the generation
+tokens and one for the fragments, however long the page.
+
+Hits, misses and rendering time are counted per fragment name, per
+process; staff can read them at /fragment-stats/ (stats_view).
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import defaultdict
+
+from django import template
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import cache
+from django.db import models
+from django.http import JsonResponse
+
+register = template.Library()
+
+
+# --- Keys ---
+
+
+def _generation_key(label, pk):
+    return f"fragments:gen:{label}:{pk}"
+
+
+def _instance_key(instance):
+    return _generation_key(instance._meta.label_lower, instance.pk)
+
+
+def invalidate(instance):
+    """Re-render every fragment that was given this model instance."""
+    # Dropping the token is enough: a missing one is replaced by a new one
+    cache.delete(_instance_key(instance))
+
+
+def _generations(keys):
+    """{key: token} for these generation keys, creating missing ones. One cache round trip on a hit."""
+    if not keys:
+        return {}
+    tokens = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in tokens}
+    if missing:
+        # No timeout: an expired token would look like a fresh one
+        cache.set_many(missing, None)
+        tokens.update(missing)
+    return {key: str(tokens[key]) for key in keys}
+
+
+def fragment_keys(name, values_lists):
+    """fragment_key for many fragments, reading all their generation tokens at once."""
+    instance_keys = [
+        [_instance_key(value) for value in values if isinstance(value, models.Model)]
+        for values in values_lists
+    ]
+    tokens = _generations(list(dict.fromkeys(key for keys in instance_keys for key in keys)))
+    built = []
+    for values, keys in zip(values_lists, instance_keys):
+        parts = [
+            _instance_key(value) if isinstance(value, models.Model) else repr(value)
+            for value in values
+        ]
+        parts += [tokens[key] for key in keys]
+        digest = hashlib.md5("\x1f".join(parts).encode(), usedforsecurity=False).hexdigest()
+        built.append(f"fragments:{name}:{digest}")
+    return built
+
+
+def fragment_key(name, values):
+    return fragment_keys(name, [values])[0]
+
+
+# --- Stats ---
+
+
+class FragmentStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = defaultdict(
+            lambda: {"hits": 0, "misses": 0, "hit_seconds": 0.0, "miss_seconds": 0.0}
+        )
+
+    def record(self, name, hit, seconds):
+        with self._lock:
+            stats = self._stats[name]
+            if hit:
+                stats["hits"] += 1
+                stats["hit_seconds"] += seconds
+            else:
+                stats["misses"] += 1
+                stats["miss_seconds"] += seconds
+
+    def snapshot(self):
+        """Per fragment name: counts, hit rate, and the rendering time hits saved."""
+        with self._lock:
+            stats = {name: dict(values) for name, values in self._stats.items()}
+        for values in stats.values():
+            lookups = values["hits"] + values["misses"]
+            values["hit_rate"] = values["hits"] / lookups if lookups else 0.0
+            # Each hit saved an average miss's rendering, less its own lookup
+            misses = values["misses"]
+            average_render = values["miss_seconds"] / misses if misses else 0.0
+            values["seconds_saved"] = (
+                values["hits"] * average_render - values["hit_seconds"]
+            )
+        return stats
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+stats = FragmentStats()
+
+
+@staff_member_required
+def stats_view(request):
+    """This process's fragment cache stats, as JSON."""
+    return JsonResponse(stats.snapshot())
+
+
+# --- Template tag ---
+
+
+class FragmentNode(template.Node):
+    def __init__(self, nodelist, name, values, loop=None):
+        self.nodelist = nodelist
+        self.name = name
+        self.values = values
+        # (loopvars, sequence, is_reversed) of the {% for %} directly around
+        # this tag, if any: its iterations are looked up together
+        self.loop = loop
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        started = time.perf_counter()
+        key, html = self._lookup(context, name)
+        hit = html is not None
+        if not hit:
+            html = self.nodelist.render(context)
+            cache.set(key, html, getattr(settings, "FRAGMENT_CACHE_TIMEOUT", 60 * 60))
+        stats.record(name, hit, time.perf_counter() - started)
+        return html
+
+    def _lookup(self, context, name):
+        """(key, cached HTML or None) for this rendering of the fragment."""
+        if self.loop is not None:
+            forloop = context["forloop"]
+            if forloop["first"] or self not in context.render_context:
+                context.render_context[self] = self._prefetch(context, name)
+            page = context.render_context[self]
+            if page is not None and forloop["counter0"] < len(page):
+                return page[forloop["counter0"]]
+        key = fragment_key(name, [value.resolve(context) for value in self.values])
+        return key, cache.get(key)
+
+    def _prefetch(self, context, name):
+        """
+        (key, cached HTML or None) for every iteration of the enclosing loop,
+        in two cache round trips, or None if the loop can't be read ahead.
+        """
+        loopvars, sequence, is_reversed = self.loop
+        items = sequence.resolve(context, ignore_failures=True)
+        if not hasattr(items, "__len__"):
+            return None  # E.g. a generator: reading it here would use it up
+        items = list(items)
+        if is_reversed:
+            items.reverse()
+        values_lists = []
+        with context.push():
+            for item in items:
+                # Bind the loop variables the way ForNode does
+                if len(loopvars) > 1:
+                    for var, value in zip(loopvars, item):
+                        context[var] = value
+                else:
+                    context[loopvars[0]] = item
+                values_lists.append([value.resolve(context) for value in self.values])
+        keys = fragment_keys(name, values_lists)
+        cached = cache.get_many(keys)
+        return [(key, cached.get(key)) for key in keys]
+
+
+def _enclosing_loop(parser):
+    """(loopvars, sequence, is_reversed) of the {% for %} the tag being parsed sits directly in."""
+    if len(parser.command_stack) < 2:
+        return None
+    command, token = parser.command_stack[-2]
+    if command != "for":
+        return None
+    # Same parsing as django.template.defaulttags.do_for, which has already
+    # checked the syntax
+    bits = token.split_contents()
+    is_reversed = bits[-1] == "reversed"
+    in_index = -3 if is_reversed else -2
+    loopvars = re.split(r" *, *", " ".join(bits[1:in_index]))
+    sequence = parser.compile_filter(bits[in_index + 1])
+    lookups = getattr(sequence.var, "lookups", None) or ()
+    if lookups and lookups[0] in loopvars:
+        return None  # {% for item in item.children %}: can't be resolved ahead
+    return loopvars, sequence, is_reversed
+
+
+@register.tag("fragment")
+def do_fragment(parser, token):
+    """{% fragment "name" value... %} ... {% endfragment %}"""
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' needs a fragment name.")
+    loop = _enclosing_loop(parser)
+    nodelist = parser.parse(("endfragment",))
+    parser.delete_first_token()
+    return FragmentNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        [parser.compile_filter(bit) for bit in bits[2:]],
+        loop,
+    )
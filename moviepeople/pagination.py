@@ -0,0 +1,84 @@
+# moviepeople/pagination.py
+"""
+Keyset ("cursor") pagination helpers shared by the apps.
+
+A cursor is an opaque token encoding the (timestamp, id) of the last row on
+the previous page. The next page is "rows strictly after that key", which the
+database answers with an index range scan no matter how deep the page is --
+unlike OFFSET, which has to walk and throw away every earlier row.
+"""
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(timestamp, pk):
+    raw = f"{timestamp.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Turn a cursor token back into (timestamp, id). Raises InvalidCursor."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        timestamp, pk = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(pk)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f"Malformed cursor: {token!r}") from e
+
+
+def clamp_page_size(value, default, maximum):
+    """Parse a ?limit= value, falling back to default and never exceeding maximum."""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, maximum))
+
+
+def keyset_filter(queryset, cursor, ts_field="timestamp", id_field="id", descending=True):
+    """
+    Restrict queryset to rows after cursor in (ts_field, id_field) order.
+
+    descending=True means the page is ordered newest first, so "after" means
+    older. cursor may be None for the first page.
+    """
+    if cursor is None:
+        return queryset
+    timestamp, pk = cursor
+    op = "lt" if descending else "gt"
+    return queryset.filter(
+        Q(**{f"{ts_field}__{op}": timestamp})
+        | Q(**{ts_field: timestamp, f"{id_field}__{op}": pk})
+    )
+
+
+def paginate(queryset, cursor, page_size, ts_field="timestamp", id_field="id", descending=True):
+    """
+    Return (rows, next_cursor) for one page of an already-ordered queryset.
+
+    One extra row is fetched to find out whether another page exists;
+    next_cursor is None on the last page.
+    """
+    rows = list(
+        keyset_filter(queryset, cursor, ts_field, id_field, descending)[: page_size + 1]
+    )
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(
+            _resolve(last, ts_field), _resolve(last, id_field)
+        )
+    return rows, next_cursor
+
+
+def _resolve(obj, path):
+    for attr in path.split("__"):
+        obj = getattr(obj, attr)
+    return obj
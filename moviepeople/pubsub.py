@@ -0,0 +1,218 @@
+# moviepeople/pubsub.py
+"""
+Publish/subscribe for real-time delivery (the messaging WebSocket in
+messaging/realtime.py and the event stream in moviepeople/events.py).
+
+Code that changes data calls publish(channel, event) with a JSON-serializable
+dict; it is safe to call from ordinary synchronous views and signal handlers.
+Async code that holds a client connection subscribes to one or more channels
+and reads events as they arrive.
+
+Each process keeps one in-process hub: channel -> local subscribers, each
+with its own bounded asyncio queue. The backend decides how events reach the
+hub:
+
+- MemoryBroker delivers straight to the local hub. Good for tests and for a
+  single ASGI process.
+- RedisBroker publishes through Redis and runs one listener per process that
+  feeds the local hub, so events reach sockets held by any worker. Needs the
+  `redis` package.
+
+The backend is chosen by settings.PUBSUB, in the same shape as CACHES.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Events a subscriber may fall behind by before new ones are dropped for it
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class Subscription:
+    """
+    A local subscriber. Use as an async context manager and iterate:
+
+        async with get_broker().subscribe(["user:1"]) as subscription:
+            async for event in subscription:
+                ...
+    """
+
+    def __init__(self, broker, channels):
+        self._broker = broker
+        self.channels = list(channels)
+        self._loop = None
+        self._queue = None
+
+    async def __aenter__(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        await self._broker._add(self)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._broker._discard(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.get()
+
+    async def get(self):
+        """The next event, waiting for one if necessary."""
+        return await self._queue.get()
+
+    def deliver(self, event):
+        """Queue an event for this subscriber. Safe to call from any thread."""
+        try:
+            self._loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:  # The subscriber's event loop has closed
+            pass
+
+    def _put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            logger.warning("Dropping event for slow subscriber on %s", self.channels)
+
+
+class MemoryBroker:
+    """Delivers events to subscribers in this process only."""
+
+    def __init__(self, location=None):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)  # channel -> {Subscription}
+
+    def subscribe(self, channels):
+        return Subscription(self, channels)
+
+    def publish(self, channel, event):
+        self._dispatch(channel, event)
+
+    def _dispatch(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.deliver(event)
+
+    async def _add(self, subscription):
+        """Register a subscription. Returns the channels that had no subscribers."""
+        with self._lock:
+            new_channels = [c for c in subscription.channels if not self._subscribers[c]]
+            for channel in subscription.channels:
+                self._subscribers[channel].add(subscription)
+        return new_channels
+
+    async def _discard(self, subscription):
+        """Unregister a subscription. Returns the channels now without subscribers."""
+        with self._lock:
+            empty_channels = []
+            for channel in subscription.channels:
+                self._subscribers[channel].discard(subscription)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+                    empty_channels.append(channel)
+        return empty_channels
+
+
+class RedisBroker(MemoryBroker):
+    """
+    Publishes through Redis. Each process holds one Redis subscription for
+    all its local subscribers (not one per socket), adding and removing
+    channels as the first subscriber arrives and the last one leaves.
+    """
+
+    def __init__(self, location):
+        super().__init__()
+        import redis  # Optional dependency, only needed with this backend
+
+        self._location = location
+        self._client = redis.Redis.from_url(location)
+        self._pubsub = None
+        self._listener = None
+        self._pubsub_lock = None
+
+    def publish(self, channel, event):
+        self._client.publish(channel, json.dumps(event))
+
+    async def _add(self, subscription):
+        new_channels = await super()._add(subscription)
+        if self._start_listener():
+            # Fresh connection: (re)subscribe everything local subscribers need
+            with self._lock:
+                new_channels = list(self._subscribers)
+        if new_channels:
+            async with self._pubsub_lock:
+                await self._pubsub.subscribe(*new_channels)
+        return new_channels
+
+    async def _discard(self, subscription):
+        empty_channels = await super()._discard(subscription)
+        if empty_channels and self._pubsub is not None:
+            async with self._pubsub_lock:
+                await self._pubsub.unsubscribe(*empty_channels)
+        return empty_channels
+
+    def _start_listener(self):
+        """Connect and start the listener task unless it is running. True if started."""
+        if self._listener is not None and not self._listener.done():
+            return False
+        import redis.asyncio
+
+        self._pubsub_lock = asyncio.Lock()
+        self._pubsub = redis.asyncio.Redis.from_url(self._location).pubsub(
+            ignore_subscribe_messages=True
+        )
+        self._listener = asyncio.create_task(self._listen())
+        return True
+
+    async def _listen(self):
+        while True:
+            try:
+                item = await self._pubsub.get_message(timeout=1.0)
+            except Exception:
+                logger.exception("Lost the Redis pub/sub connection")
+                self._pubsub = None
+                return  # The next subscriber to arrive reconnects
+            if item is None or item["type"] != "message":
+                continue
+            channel = item["channel"].decode()
+            self._dispatch(channel, json.loads(item["data"]))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """The process-wide broker configured by settings.PUBSUB."""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                config = getattr(
+                    settings, "PUBSUB", {"BACKEND": "moviepeople.pubsub.MemoryBroker"}
+                )
+                _broker = import_string(config["BACKEND"])(config.get("LOCATION"))
+    return _broker
+
+
+def publish(channel, event):
+    get_broker().publish(channel, event)
+
+
+def user_channel(user_id):
+    """The channel carrying everything addressed to one user."""
+    return f"user:{user_id}"
+
+
+def posts_channel(user_id):
+    """The channel carrying one user's new posts, for their connections' feeds."""
+    return f"posts:{user_id}"
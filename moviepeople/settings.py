@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +43,7 @@ INSTALLED_APPS = [
     "connections",
     "messaging",
     "feed",
+    "outbox",
 ]
 
 MIDDLEWARE = [
@@ -67,7 +69,12 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "messaging.context_processors.unread_messages",
             ],
+            "libraries": {
+                # {% fragment %}: cached template fragments
+                "fragments": "moviepeople.fragments",
+            },
         },
     },
 ]
@@ -90,6 +97,35 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# In-process cache for local development; set REDIS_URL in production so
+# every worker shares the same cache.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+# How long a cached template fragment ({% fragment %}, moviepeople/fragments.py)
+# may go unused before it is dropped
+FRAGMENT_CACHE_TIMEOUT = 60 * 60
+# Real-time pub/sub (moviepeople/pubsub.py), same idea: in-process by
+# default, through Redis so events reach sockets held by any worker
+PUBSUB = {
+    "BACKEND": "moviepeople.pubsub.MemoryBroker",
+}
+if os.environ.get("REDIS_URL"):
+    CACHES["default"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ["REDIS_URL"],
+    }
+    PUBSUB = {
+        "BACKEND": "moviepeople.pubsub.RedisBroker",
+        "LOCATION": os.environ["REDIS_URL"],
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -130,3 +166,115 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Feed
+# Number of posts per feed page, and the most a client may ask for via ?limit=
+FEED_PAGE_SIZE = 20
+FEED_MAX_PAGE_SIZE = 50
+# Recent posts copied into each other's timelines when a connection is accepted
+FEED_TIMELINE_BACKFILL = 500
+# Authors with more accepted connections than this skip fan-out-on-write;
+# their posts are merged into readers' feeds at read time instead. They go
+# back to fan-out (in the background) only below the low threshold
+FEED_FANOUT_THRESHOLD = 5000
+FEED_FANOUT_LOW_THRESHOLD = 4000
+# Comments shown per page on a post's detail page, and the most one
+# "more comments" request may ask for
+FEED_COMMENT_PAGE_SIZE = 50
+FEED_COMMENT_MAX_PAGE_SIZE = 100
+# Post counters (comment_count) are buffered in memory and written every
+# this many seconds (feed/counters.py); 0 writes each increment immediately
+FEED_COUNTER_FLUSH_INTERVAL = 5
+
+
+# Connections
+# How long a user's cached set of connection IDs lives (it is also
+# invalidated whenever one of their connections changes)
+CONNECTION_GRAPH_CACHE_TIMEOUT = 60 * 60 * 24
+# Degree-of-separation badges on profiles: cache lifetime per pair, and the
+# time budget (seconds) for the 3rd-degree search on a cache miss
+CONNECTION_SEPARATION_CACHE_TIMEOUT = 60 * 10
+CONNECTION_SEPARATION_TIME_BUDGET = 0.05
+# "People you may know" (manage.py build_suggestions): how many to keep per
+# user, and how much a shared role/location adds to the mutual-connection count
+CONNECTION_SUGGESTIONS_PER_USER = 20
+CONNECTION_SUGGESTION_ROLE_BOOST = 2.0
+CONNECTION_SUGGESTION_LOCATION_BOOST = 1.0
+
+
+# Portfolio
+# Media metadata (portfolio/media.py, fetched by manage.py media_worker):
+# which oEmbed providers to ask, per-request timeout (seconds), attempts
+# before giving up on a URL, base delay (seconds) before a retry, doubled
+# each time, and how often an idle worker checks for new URLs
+PORTFOLIO_MEDIA_PROVIDERS = [
+    "portfolio.media.YouTubeProvider",
+    "portfolio.media.VimeoProvider",
+]
+PORTFOLIO_MEDIA_FETCH_TIMEOUT = 10
+PORTFOLIO_MEDIA_MAX_ATTEMPTS = 5
+PORTFOLIO_MEDIA_RETRY_DELAY = 60
+PORTFOLIO_MEDIA_POLL_INTERVAL = 5
+# Local thumbnail store (portfolio/thumbnails.py): where it lives, the widths
+# pre-generated (needs Pillow), and the disk quota beyond which the least
+# recently served thumbnails are removed
+PORTFOLIO_THUMBNAIL_DIR = BASE_DIR / "thumbnails"
+PORTFOLIO_THUMBNAIL_SIZES = (160, 320, 640)
+PORTFOLIO_THUMBNAIL_MAX_BYTES = 512 * 1024 * 1024
+# Set to an internal nginx location serving PORTFOLIO_THUMBNAIL_DIR (e.g.
+# "/internal-thumbnails/") to hand thumbnail files off with X-Accel-Redirect
+PORTFOLIO_THUMBNAIL_ACCEL_REDIRECT = None
+
+
+# Users
+# Typeahead on the search page: matches returned per field, and how often
+# (seconds) a process rebuilds its prefix index after another process
+# changed a profile
+AUTOCOMPLETE_RESULT_LIMIT = 8
+AUTOCOMPLETE_REBUILD_INTERVAL = 60
+# Profile pages (users/profiles.py): newest portfolio items and posts shown
+PROFILE_PORTFOLIO_LIMIT = 6
+PROFILE_RECENT_POSTS = 5
+
+
+# Messaging
+# Messages shown when a conversation opens, and the most one "load older"
+# request may ask for
+MESSAGE_PAGE_SIZE = 30
+MESSAGE_MAX_PAGE_SIZE = 100
+# Most recipients one broadcast (messaging:broadcast) may address
+MESSAGE_BROADCAST_MAX_RECIPIENTS = 500
+# manage.py archive_messages: messages older than this many days move out of
+# the database into compressed segment files (at most SEGMENT_SIZE messages
+# each) under MESSAGE_ARCHIVE_DIR
+MESSAGE_ARCHIVE_AFTER_DAYS = 365
+MESSAGE_ARCHIVE_SEGMENT_SIZE = 1000
+MESSAGE_ARCHIVE_DIR = BASE_DIR / "message_archive"
+
+
+# Outbox (outbox/dispatcher.py): side effects of new posts, portfolio items
+# and accepted connections, delivered by manage.py dispatch_outbox to the
+# consumers listed per event topic. OUTBOX_DISPATCH_INLINE runs them right
+# away inside the request instead, as before (no dispatcher process needed).
+OUTBOX_CONSUMERS = {
+    "post_created": ["feed.consumers.fan_out_post"],
+    "portfolio_item_created": ["feed.consumers.create_portfolio_post"],
+    "connection_accepted": ["feed.consumers.backfill_connection"],
+    "fanout_lowered": ["feed.consumers.restore_fan_out"],
+}
+OUTBOX_DISPATCH_INLINE = False
+# Seconds an idle dispatcher waits between polls; base delay (seconds)
+# before retrying a failed event, doubled each time up to an hour; days
+# delivered events are kept for inspection
+OUTBOX_POLL_INTERVAL = 1
+OUTBOX_RETRY_DELAY = 30
+OUTBOX_RETENTION_DAYS = 7
+
+
+# Live updates
+# Server-Sent Events stream (moviepeople/events.py): seconds between
+# keepalive comments on an idle stream, and the most messages/posts replayed
+# to a client reconnecting with Last-Event-ID
+EVENT_STREAM_KEEPALIVE_INTERVAL = 15
+EVENT_STREAM_REPLAY_LIMIT = 100
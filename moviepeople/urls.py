@@ -16,7 +16,7 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from . import views
+from . import events, fragments, views
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -26,4 +26,8 @@ urlpatterns = [
     path("connections/", include("connections.urls")),
     path("messages/", include("messaging.urls")),
     path("feed/", include("feed.urls")),
+    # Server-Sent Events: live messages and feed posts (needs ASGI)
+    path("events/", events.event_stream, name="events"),
+    # Fragment cache hit rates (staff only, JSON)
+    path("fragment-stats/", fragments.stats_view, name="fragment_stats"),
 ]
@@ -0,0 +1,12 @@
+from django.contrib import admin
+
+from .models import OutboxEvent
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    """Recorded domain events and whether their consumers have run."""
+
+    list_display = ["id", "topic", "created_at", "dispatched_at", "attempts", "last_error"]
+    list_filter = ["topic"]
+    ordering = ["-id"]
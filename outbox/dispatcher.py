@@ -0,0 +1,122 @@
+# outbox/dispatcher.py
+"""
+Transactional outbox for side effects that don't need to happen on the
+request path.
+
+A change records an event with record() inside its own transaction (the
+model signals do this for new posts, portfolio items and accepted
+connections), so either both are committed or neither is. manage.py
+dispatch_outbox then hands each event to the consumers listed for its topic
+in settings.OUTBOX_CONSUMERS:
+
+    post_created            {"post_id"}
+    portfolio_item_created  {"item_id", "user_id", "title"}
+    connection_accepted     {"connection_id", "requester_id", "receiver_id"}
+    fanout_lowered          {"user_id"}
+
+Delivery is at least once: a consumer that raises is retried with backoff
+(and its changes rolled back), and a dispatcher that dies mid-batch leaves
+its events to be picked up again. Each consumer runs in a transaction that
+also writes a ConsumedEvent row for it, so one that already handled an
+event is skipped when the event comes round again.
+
+With OUTBOX_DISPATCH_INLINE the consumers instead run straight away inside
+the recording transaction, as before the outbox; no dispatcher needed.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import ConsumedEvent, OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+# How long a dispatcher may hold a claimed event before others may retry it
+CLAIM_TIMEOUT = timedelta(minutes=5)
+MAX_RETRY_DELAY = 60 * 60
+
+
+def consumers_for(topic):
+    return getattr(settings, "OUTBOX_CONSUMERS", {}).get(topic, [])
+
+
+def record(topic, **payload):
+    """Record an event; call inside the transaction making the change."""
+    event = OutboxEvent.objects.create(topic=topic, payload=payload)
+    if getattr(settings, "OUTBOX_DISPATCH_INLINE", False):
+        try:
+            _deliver(event)
+        except Exception as e:
+            # Left for the dispatcher; the change itself still goes ahead
+            _failed(event, e)
+    return event
+
+
+def _deliver(event):
+    for path in consumers_for(event.topic):
+        with transaction.atomic():
+            _, new = ConsumedEvent.objects.get_or_create(event=event, consumer=path)
+            if new:
+                import_string(path)(event)
+    OutboxEvent.objects.filter(id=event.id).update(dispatched_at=timezone.now())
+
+
+def _failed(event, error):
+    logger.exception("Delivering outbox event %s failed", event)
+    # Never given up on: 1x, 2x, 4x ... the base delay, up to an hour
+    base_delay = getattr(settings, "OUTBOX_RETRY_DELAY", 30)
+    delay = min(base_delay * 2 ** max(event.attempts - 1, 0), MAX_RETRY_DELAY)
+    OutboxEvent.objects.filter(id=event.id).update(
+        next_attempt_at=timezone.now() + timedelta(seconds=delay),
+        last_error=repr(error),
+    )
+
+
+def _claim(event_id):
+    """Take a due event for this dispatcher. False if another got there first."""
+    now = timezone.now()
+    return (
+        OutboxEvent.objects.filter(
+            id=event_id, dispatched_at__isnull=True, next_attempt_at__lte=now
+        ).update(next_attempt_at=now + CLAIM_TIMEOUT, attempts=F("attempts") + 1)
+        == 1
+    )
+
+
+def dispatch(limit=100):
+    """Deliver up to `limit` due events, oldest first. Returns (delivered, failed)."""
+    due_ids = list(
+        OutboxEvent.objects.filter(
+            dispatched_at__isnull=True, next_attempt_at__lte=timezone.now()
+        )
+        .order_by("next_attempt_at", "id")
+        .values_list("id", flat=True)[:limit]
+    )
+    delivered = failed = 0
+    for event_id in due_ids:
+        if not _claim(event_id):
+            continue
+        event = OutboxEvent.objects.get(id=event_id)
+        try:
+            _deliver(event)
+        except Exception as e:
+            _failed(event, e)
+            failed += 1
+        else:
+            delivered += 1
+    return delivered, failed
+
+
+def purge(older_than=None):
+    """Delete delivered events (and their ConsumedEvent rows). Returns how many events."""
+    if older_than is None:
+        older_than = timedelta(days=getattr(settings, "OUTBOX_RETENTION_DAYS", 7))
+    _, by_model = OutboxEvent.objects.filter(
+        dispatched_at__lt=timezone.now() - older_than
+    ).delete()
+    return by_model.get(OutboxEvent._meta.label, 0)
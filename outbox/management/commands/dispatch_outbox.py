@@ -0,0 +1,47 @@
+# outbox/management/commands/dispatch_outbox.py
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from outbox import dispatcher
+
+PURGE_INTERVAL = 60 * 60
+
+
+class Command(BaseCommand):
+    help = "Deliver recorded outbox events (new posts, portfolio items, accepted connections) to their consumers."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once nothing is due instead of waiting for more events",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=100, help="Events claimed per pass"
+        )
+
+    def handle(self, *args, **options):
+        poll_interval = getattr(settings, "OUTBOX_POLL_INTERVAL", 1)
+        delivered = failed = 0
+        last_purge = 0
+        try:
+            while True:
+                close_old_connections()
+                done, errors = dispatcher.dispatch(options["batch_size"])
+                delivered += done
+                failed += errors
+                if time.monotonic() - last_purge > PURGE_INTERVAL:
+                    dispatcher.purge()  # Delivered events past their retention
+                    last_purge = time.monotonic()
+                if not (done or errors):
+                    if options["once"]:
+                        break
+                    time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(
+            self.style.SUCCESS(f"Delivered {delivered} event(s), {failed} failed attempt(s).")
+        )
@@ -0,0 +1,61 @@
+# outbox/models.py
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class OutboxEvent(models.Model):
+    """
+    Something that happened (a post was created, a connection accepted...),
+    written in the same transaction as the change itself so that it can't
+    be lost, and handed to its consumers later by outbox/dispatcher.py.
+    """
+
+    topic = models.CharField(max_length=50)  # e.g. "post_created"
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(default=timezone.now)
+    dispatched_at = models.DateTimeField(null=True, blank=True)  # Every consumer done
+    # Retry bookkeeping: when a dispatcher may next try (also pushed forward
+    # while one holds the event), and how it went so far
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # Only undelivered events: the dispatcher's scan stays small
+            # however many delivered ones are kept around
+            models.Index(
+                fields=["next_attempt_at"],
+                condition=Q(dispatched_at__isnull=True),
+                name="outbox_pending_idx",
+            ),
+            models.Index(fields=["dispatched_at"], name="outbox_dispatched_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} #{self.id}"
+
+
+class ConsumedEvent(models.Model):
+    """
+    Marks that one consumer has handled one event. Written in the same
+    transaction as the consumer's own changes, so redelivering an event
+    (events are delivered at least once) never applies it twice.
+    """
+
+    event = models.ForeignKey(
+        OutboxEvent, on_delete=models.CASCADE, related_name="consumed"
+    )
+    consumer = models.CharField(max_length=200)  # Dotted path
+    consumed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["event", "consumer"], name="unique_consumed_event"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.consumer} handled {self.event_id}"
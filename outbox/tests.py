@@ -0,0 +1,87 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from feed.models import Post, TimelineEntry
+from portfolio.models import PortfolioItem
+
+from . import dispatcher
+from .models import ConsumedEvent, OutboxEvent
+
+failures = []
+
+
+def flaky_consumer(event):
+    """Creates a post, then fails while failures are queued up."""
+    Post.objects.create(user_id=event.payload["user_id"], content="half done")
+    if failures:
+        raise failures.pop(0)
+
+
+def drain():
+    """Dispatch until nothing is due (consumers can record further events)."""
+    while dispatcher.dispatch() != (0, 0):
+        pass
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("producer", password="pw")
+        self.client.force_login(self.user)
+
+    def test_portfolio_item_is_announced_by_the_dispatcher(self):
+        self.client.post(
+            reverse("portfolio:create_portfolio_item"),
+            {
+                "title": "Night Shoot",
+                "description": "Short film",
+                "media_url": "https://example.com/night-shoot",
+            },
+        )
+        item = PortfolioItem.objects.get()
+        self.assertFalse(Post.objects.exists())  # Not on the request path
+        self.assertEqual(
+            OutboxEvent.objects.get().payload,
+            {"item_id": item.id, "user_id": self.user.id, "title": "Night Shoot"},
+        )
+
+        drain()
+        post = Post.objects.get()
+        self.assertEqual(post.post_type, "portfolio_add")
+        self.assertEqual(post.content, "Added a new portfolio item: 'Night Shoot'")
+        # ...whose own post_created event fanned it out
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.user, post=post).exists())
+        self.assertFalse(OutboxEvent.objects.filter(dispatched_at__isnull=True).exists())
+
+        # Delivered again (at least once): the consumers skip it
+        OutboxEvent.objects.update(dispatched_at=None)
+        drain()
+        self.assertEqual(Post.objects.count(), 1)
+
+    @override_settings(OUTBOX_CONSUMERS={"test": ["outbox.tests.flaky_consumer"]})
+    def test_failed_consumers_are_rolled_back_and_retried(self):
+        failures.append(RuntimeError("search index down"))
+        event = dispatcher.record("test", user_id=self.user.id)
+
+        with self.assertLogs("outbox.dispatcher", "ERROR"):
+            self.assertEqual(dispatcher.dispatch(), (0, 1))
+        event.refresh_from_db()
+        self.assertIsNone(event.dispatched_at)
+        self.assertEqual(event.attempts, 1)
+        self.assertIn("search index down", event.last_error)
+        self.assertGreater(event.next_attempt_at, timezone.now())
+        self.assertFalse(Post.objects.exists())  # Its changes were rolled back
+        self.assertFalse(ConsumedEvent.objects.exists())
+
+        OutboxEvent.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(dispatcher.dispatch(), (1, 0))
+        self.assertEqual(Post.objects.count(), 1)
+
+    @override_settings(OUTBOX_DISPATCH_INLINE=True)
+    def test_inline_dispatch(self):
+        post = Post.objects.create(user=self.user, content="Wrapped!")
+        self.assertTrue(TimelineEntry.objects.filter(post=post).exists())
+        self.assertEqual(dispatcher.dispatch(), (0, 0))  # Nothing left over
@@ -1,3 +1,12 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import MediaMetadata
+
+
+@admin.register(MediaMetadata)
+class MediaMetadataAdmin(admin.ModelAdmin):
+    """Provider metadata per media URL, and where the worker's queue stands."""
+
+    list_display = ["url", "provider", "status", "title", "attempts", "next_attempt_at"]
+    list_filter = ["status", "provider"]
+    search_fields = ["url", "title"]
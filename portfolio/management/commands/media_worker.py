@@ -0,0 +1,53 @@
+# portfolio/management/commands/media_worker.py
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from portfolio import media, thumbnails
+
+
+class Command(BaseCommand):
+    help = "Fetch provider metadata (title, thumbnail, duration) for queued portfolio media URLs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once nothing is due instead of waiting for more work",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=100, help="URLs claimed per pass"
+        )
+        parser.add_argument(
+            "--enqueue-existing",
+            action="store_true",
+            help="First queue the URLs of portfolio items that have never been queued",
+        )
+
+    def handle(self, *args, **options):
+        poll_interval = getattr(settings, "PORTFOLIO_MEDIA_POLL_INTERVAL", 5)
+        providers = media.load_providers()
+        limiter = media.RateLimiter()  # Kept across passes
+        fetched = failed = 0
+        if options["enqueue_existing"]:
+            queued = media.enqueue_existing()
+            self.stdout.write(f"Queued {queued} existing URL(s).")
+        try:
+            while True:
+                close_old_connections()
+                done, errors = media.run_once(options["batch_size"], providers, limiter)
+                fetched += done
+                failed += errors
+                if done:
+                    thumbnails.evict()  # Keep the store within its quota
+                if not (done or errors):
+                    if options["once"]:
+                        break
+                    time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(
+            self.style.SUCCESS(f"Fetched {fetched} URL(s), {failed} failed attempt(s).")
+        )
@@ -0,0 +1,277 @@
+# portfolio/media.py
+"""
+Provider metadata (title, thumbnail, duration) for portfolio media URLs.
+
+Saving a PortfolioItem enqueues its media_url: a pending MediaMetadata row,
+one per URL, so the same video used by many items is fetched once (items
+from before the queue existed: media_worker --enqueue-existing). Nothing
+is fetched on the request path. manage.py media_worker drains the queue,
+asking the provider's oEmbed endpoint about each URL:
+
+- Requests to each provider are spaced out by its min_interval.
+- Network errors, timeouts, 429s and 5xx responses are retried with
+  exponential backoff, up to PORTFOLIO_MEDIA_MAX_ATTEMPTS attempts in all;
+  other errors (deleted or private videos) fail straight away.
+- Several workers can run at once: each claims a row with a conditional
+  UPDATE that pushes next_attempt_at forward, so a row is only fetched by
+  one of them, and is picked up again if that worker dies.
+
+Thumbnails are downloaded into the local store in portfolio/thumbnails.py
+as part of the same fetch. Pages read the results with attach, in one
+query, and simply link the URL until they are ready.
+"""
+import json
+import logging
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import thumbnails
+from .models import MediaMetadata, PortfolioItem
+
+logger = logging.getLogger(__name__)
+
+# How long a worker may hold a claimed row before others may retry it
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+
+class FetchError(Exception):
+    """The provider couldn't describe a URL. retry=False when trying again won't help."""
+
+    def __init__(self, message, retry=True):
+        super().__init__(message)
+        self.retry = retry
+
+
+# --- Providers ---
+
+
+class OEmbedProvider:
+    name = None
+    hosts = frozenset()
+    endpoint = None
+    min_interval = 1.0  # Seconds between requests to this provider
+
+    def matches(self, url):
+        return (urllib.parse.urlsplit(url).hostname or "").lower() in self.hosts
+
+    def fetch(self, url):
+        """{title, author_name, thumbnail_url, duration} for url. Raises FetchError."""
+        query = urllib.parse.urlencode({"url": url, "format": "json"})
+        timeout = getattr(settings, "PORTFOLIO_MEDIA_FETCH_TIMEOUT", 10)
+        try:
+            with urllib.request.urlopen(
+                f"{self.endpoint}?{query}", timeout=timeout
+            ) as response:
+                data = json.load(response)
+        except urllib.error.HTTPError as e:
+            raise FetchError(
+                f"{self.name} answered HTTP {e.code}",
+                retry=e.code == 429 or e.code >= 500,
+            ) from e
+        except (urllib.error.URLError, TimeoutError, ValueError) as e:
+            raise FetchError(f"{self.name}: {e}") from e
+        thumbnail_url = data.get("thumbnail_url") or ""
+        return {
+            "title": (data.get("title") or "")[:300],
+            "author_name": (data.get("author_name") or "")[:200],
+            "thumbnail_url": thumbnail_url if len(thumbnail_url) <= 500 else "",
+            "duration": data.get("duration"),  # Vimeo only
+        }
+
+
+class YouTubeProvider(OEmbedProvider):
+    name = "youtube"
+    hosts = frozenset({"youtube.com", "www.youtube.com", "m.youtube.com", "youtu.be"})
+    endpoint = "https://www.youtube.com/oembed"
+
+
+class VimeoProvider(OEmbedProvider):
+    name = "vimeo"
+    hosts = frozenset({"vimeo.com", "www.vimeo.com", "player.vimeo.com"})
+    endpoint = "https://vimeo.com/api/oembed.json"
+
+
+def load_providers():
+    """Instances of settings.PORTFOLIO_MEDIA_PROVIDERS, by name."""
+    paths = getattr(
+        settings,
+        "PORTFOLIO_MEDIA_PROVIDERS",
+        ["portfolio.media.YouTubeProvider", "portfolio.media.VimeoProvider"],
+    )
+    providers = [import_string(path)() for path in paths]
+    return {provider.name: provider for provider in providers}
+
+
+def provider_for(url, providers=None):
+    for provider in (providers or load_providers()).values():
+        if provider.matches(url):
+            return provider
+    return None
+
+
+# --- Queue ---
+
+
+def enqueue(url):
+    """Make sure url's metadata gets fetched (once). Returns its row, or None if no provider knows it."""
+    provider = provider_for(url)
+    if provider is None:
+        return None
+    row, created = MediaMetadata.objects.get_or_create(
+        url=url, defaults={"provider": provider.name}
+    )
+    if not created and row.status == MediaMetadata.STATUS_FAILED:
+        # Saved again, e.g. after making the video public: give it another go
+        MediaMetadata.objects.filter(id=row.id).update(
+            status=MediaMetadata.STATUS_PENDING,
+            attempts=0,
+            next_attempt_at=timezone.now(),
+        )
+    return row
+
+
+def enqueue_existing(batch_size=1000):
+    """
+    Queue the URLs of portfolio items saved before there was a queue (those
+    without a row yet). Returns how many were queued.
+    """
+    providers = load_providers()
+    known = MediaMetadata.objects.filter(url=OuterRef("media_url"))
+    urls = (
+        PortfolioItem.objects.exclude(Exists(known))
+        .order_by()
+        .values_list("media_url", flat=True)
+        .distinct()
+    )
+    rows = []
+    for url in urls.iterator(chunk_size=batch_size):
+        provider = provider_for(url, providers)
+        if provider is not None:
+            rows.append(MediaMetadata(url=url, provider=provider.name))
+    # A row enqueued meanwhile by a save wins
+    MediaMetadata.objects.bulk_create(rows, batch_size=batch_size, ignore_conflicts=True)
+    return len(rows)
+
+
+def attach(items):
+    """Set item.media on each portfolio item: its metadata once ready, else None. One query."""
+    ready = {
+        media.url: media
+        for media in MediaMetadata.objects.filter(
+            url__in={item.media_url for item in items},
+            status=MediaMetadata.STATUS_READY,
+        )
+    }
+    for item in items:
+        item.media = ready.get(item.media_url)
+    return items
+
+
+# --- Worker ---
+
+
+class RateLimiter:
+    """Spaces out this worker's requests to each provider by its min_interval."""
+
+    def __init__(self):
+        self._next_slot = {}  # provider name -> monotonic time of its next request
+
+    def wait(self, provider):
+        now = time.monotonic()
+        slot = max(now, self._next_slot.get(provider.name, now))
+        if slot > now:
+            time.sleep(slot - now)
+        self._next_slot[provider.name] = slot + provider.min_interval
+
+
+def _claim(row_id):
+    """Take a due row for this worker. False if another worker got there first."""
+    now = timezone.now()
+    return (
+        MediaMetadata.objects.filter(
+            id=row_id, status=MediaMetadata.STATUS_PENDING, next_attempt_at__lte=now
+        ).update(next_attempt_at=now + CLAIM_TIMEOUT, attempts=F("attempts") + 1)
+        == 1
+    )
+
+
+def _fetch(row, provider, limiter):
+    try:
+        if provider is None:
+            raise FetchError(f"No provider named {row.provider!r}", retry=False)
+        limiter.wait(provider)
+        data = provider.fetch(row.url)
+    except FetchError as e:
+        _failed(row, e)
+        return False
+    except Exception as e:  # A bug in a provider shouldn't stop the worker
+        logger.exception("Fetching metadata for %s failed", row.url)
+        _failed(row, FetchError(repr(e)))
+        return False
+
+    for field, value in data.items():
+        setattr(row, field, value)
+    if row.thumbnail_url and not row.thumbnail_sha256:
+        try:
+            row.thumbnail_sha256 = thumbnails.fetch(row.thumbnail_url)
+        except (OSError, ValueError) as e:
+            # Not worth a retry: pages hot-link thumbnail_url instead
+            logger.warning("Storing thumbnail %s failed: %s", row.thumbnail_url, e)
+    row.status = MediaMetadata.STATUS_READY
+    row.fetched_at = timezone.now()
+    row.last_error = ""
+    row.save()
+    return True
+
+
+def _failed(row, error):
+    row.last_error = str(error)
+    max_attempts = getattr(settings, "PORTFOLIO_MEDIA_MAX_ATTEMPTS", 5)
+    if error.retry and row.attempts < max_attempts:
+        # 1x, 2x, 4x ... the base delay
+        delay = getattr(settings, "PORTFOLIO_MEDIA_RETRY_DELAY", 60) * 2 ** (row.attempts - 1)
+        row.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+    else:
+        row.status = MediaMetadata.STATUS_FAILED
+    row.save(update_fields=["status", "next_attempt_at", "last_error"])
+    logger.warning(
+        "Media metadata for %s: %s (attempt %d, %s)",
+        row.url,
+        error,
+        row.attempts,
+        row.status,
+    )
+
+
+def run_once(limit=100, providers=None, limiter=None):
+    """
+    Fetch metadata for up to `limit` due URLs, oldest first. Returns
+    (fetched, failed) counts, where failed includes ones to be retried.
+    """
+    providers = providers or load_providers()
+    limiter = limiter or RateLimiter()
+    due_ids = list(
+        MediaMetadata.objects.filter(
+            status=MediaMetadata.STATUS_PENDING, next_attempt_at__lte=timezone.now()
+        )
+        .order_by("next_attempt_at")
+        .values_list("id", flat=True)[:limit]
+    )
+    fetched = failed = 0
+    for row_id in due_ids:
+        if not _claim(row_id):
+            continue
+        row = MediaMetadata.objects.get(id=row_id)
+        if _fetch(row, providers.get(row.provider), limiter):
+            fetched += 1
+        else:
+            failed += 1
+    return fetched, failed
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.15 on 2026-10-18 11:04
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaMetadata',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(unique=True)),
+                ('provider', models.CharField(max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('title', models.CharField(blank=True, max_length=300)),
+                ('author_name', models.CharField(blank=True, max_length=200)),
+                ('thumbnail_url', models.URLField(blank=True, max_length=500)),
+                ('duration', models.PositiveIntegerField(blank=True, null=True)),
+                ('fetched_at', models.DateTimeField(blank=True, null=True)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name_plural': 'media metadata',
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='portfolio_media_due_idx')],
+            },
+        ),
+    ]
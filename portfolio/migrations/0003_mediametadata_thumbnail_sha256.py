@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 11:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0002_mediametadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediametadata',
+            name='thumbnail_sha256',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
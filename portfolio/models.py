@@ -1,5 +1,8 @@
 from django.db import models
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 
 # Under the hood, this creates a database table with columns for each field.
@@ -17,3 +20,87 @@ class PortfolioItem(models.Model):
 
     def __str__(self):
         return self.title
+
+
+class MediaMetadata(models.Model):
+    """
+    What the provider (YouTube, Vimeo) says about a media URL: title,
+    thumbnail, duration. One row per URL however many portfolio items use it.
+
+    The rows still pending are also the work queue for manage.py media_worker
+    (see portfolio/media.py), so pages only ever read what is already here
+    and never wait on the provider.
+    """
+
+    STATUS_PENDING = "pending"
+    STATUS_READY = "ready"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_READY, "Ready"),
+        (STATUS_FAILED, "Failed"),  # Gave up; the page just links the URL
+    ]
+
+    url = models.URLField(unique=True)
+    provider = models.CharField(max_length=20)
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING
+    )
+    title = models.CharField(max_length=300, blank=True)
+    author_name = models.CharField(max_length=200, blank=True)
+    thumbnail_url = models.URLField(max_length=500, blank=True)
+    duration = models.PositiveIntegerField(null=True, blank=True)  # Seconds
+    # Our copy of the thumbnail (portfolio/thumbnails.py); "" until stored or
+    # once evicted, when pages hot-link thumbnail_url instead
+    thumbnail_sha256 = models.CharField(max_length=64, blank=True)
+    fetched_at = models.DateTimeField(null=True, blank=True)
+    # Queue bookkeeping: when the worker may next try (also pushed forward
+    # while a worker holds the row), and how it went so far
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name_plural = "media metadata"
+        indexes = [
+            # The worker's "what is due?" scan
+            models.Index(
+                fields=["status", "next_attempt_at"], name="portfolio_media_due_idx"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.url} ({self.status})"
+
+    @property
+    def duration_display(self):
+        """e.g. "4:05" or "1:02:30"; "" when the provider doesn't say."""
+        if self.duration is None:
+            return ""
+        hours, rest = divmod(self.duration, 3600)
+        minutes, seconds = divmod(rest, 60)
+        if hours:
+            return f"{hours}:{minutes:02}:{seconds:02}"
+        return f"{minutes}:{seconds:02}"
+
+
+@receiver(post_save, sender=PortfolioItem)
+def enqueue_media_metadata(sender, instance, **kwargs):
+    from . import media
+
+    media.enqueue(instance.media_url)
+
+
+# The feed post announcing it is made by an outbox consumer
+# (feed.consumers.create_portfolio_post), not on the request path
+@receiver(post_save, sender=PortfolioItem)
+def record_portfolio_item_created(sender, instance, created, **kwargs):
+    if created:
+        from outbox import dispatcher
+
+        dispatcher.record(
+            "portfolio_item_created",
+            item_id=instance.id,
+            user_id=instance.user_id,
+            title=instance.title,
+        )
@@ -1,3 +1,204 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import media, thumbnails
+from .models import MediaMetadata, PortfolioItem
+
+# A 1x1 GIF; trailing bytes after its end marker make distinct files
+GIF = (
+    b"GIF89a\x01\x00\x01\x00\x80\x00\x00\xff\xff\xff\x00\x00\x00!\xf9\x04\x01\x00"
+    b"\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;"
+)
+
+
+def use_temporary_thumbnail_dir(test):
+    directory = tempfile.TemporaryDirectory()
+    test.addCleanup(directory.cleanup)
+    patcher = mock.patch.object(thumbnails, "THUMBNAIL_DIR", Path(directory.name))
+    patcher.start()
+    test.addCleanup(patcher.stop)
+
+
+class StubProvider(media.OEmbedProvider):
+    """Answers for https://videos.test/... without touching the network."""
+
+    name = "stub"
+    hosts = frozenset({"videos.test"})
+    min_interval = 0
+    calls = []
+    errors = []  # Raised (in order) before answering normally
+
+    def fetch(self, url):
+        StubProvider.calls.append(url)
+        if StubProvider.errors:
+            raise StubProvider.errors.pop(0)
+        return {
+            "title": f"Title of {url.rsplit('/', 1)[-1]}",
+            "author_name": "Stub Studio",
+            "thumbnail_url": f"{url}/thumb.jpg",
+            "duration": 245,
+        }
+
+
+@override_settings(
+    PORTFOLIO_MEDIA_PROVIDERS=["portfolio.tests.StubProvider"],
+    PORTFOLIO_MEDIA_MAX_ATTEMPTS=2,
+)
+class MediaMetadataTests(TestCase):
+    def setUp(self):
+        StubProvider.calls = []
+        StubProvider.errors = []
+        self.user = User.objects.create_user("cinematographer", password="pw")
+        # Thumbnails "downloaded" without the network either
+        use_temporary_thumbnail_dir(self)
+        patcher = mock.patch.object(
+            thumbnails, "fetch", side_effect=lambda url: thumbnails.store(GIF)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def add_item(self, url, title="Reel"):
+        return PortfolioItem.objects.create(
+            user=self.user, title=title, description="", media_url=url
+        )
+
+    def test_each_url_is_fetched_once_in_the_background(self):
+        self.add_item("https://videos.test/reel")
+        self.add_item("https://videos.test/reel", title="Same reel, again")
+        self.add_item("https://elsewhere.test/short")  # No provider: not queued
+        self.assertEqual(MediaMetadata.objects.count(), 1)
+        self.assertEqual(StubProvider.calls, [])  # Saving never fetches
+
+        response = self.client.get(reverse("portfolio:portfolio_list"))
+        self.assertEqual(response.status_code, 302)  # Login required
+        self.client.force_login(self.user)
+        self.assertNotContains(
+            self.client.get(reverse("portfolio:portfolio_list")), "Title of reel"
+        )
+
+        self.assertEqual(media.run_once(), (1, 0))
+        self.assertEqual(StubProvider.calls, ["https://videos.test/reel"])
+        self.assertEqual(media.run_once(), (0, 0))
+
+        # session + user + items + their metadata, however many items
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("portfolio:portfolio_list"))
+        self.assertContains(response, "Title of reel", count=2)
+        self.assertContains(response, "(4:05)", count=2)
+        digest = MediaMetadata.objects.get().thumbnail_sha256
+        self.assertContains(
+            response, reverse("portfolio:thumbnail", args=[digest, 320]), count=2
+        )
+
+    def test_items_from_before_the_queue_can_be_enqueued(self):
+        for url in ["https://videos.test/old", "https://videos.test/old", "https://x.test/a"]:
+            self.add_item(url)
+        self.add_item("https://videos.test/queued")
+        MediaMetadata.objects.exclude(url__endswith="queued").delete()  # As if pre-deploy
+
+        out = StringIO()
+        call_command("media_worker", "--enqueue-existing", "--once", stdout=out)
+        self.assertIn("Queued 1 existing URL(s).", out.getvalue())
+        self.assertEqual(
+            sorted(StubProvider.calls), ["https://videos.test/old", "https://videos.test/queued"]
+        )
+        self.assertEqual(media.enqueue_existing(), 0)  # Nothing left to queue
+
+    def test_transient_errors_are_retried_then_given_up(self):
+        self.add_item("https://videos.test/flaky")
+        StubProvider.errors = [media.FetchError("timed out"), media.FetchError("HTTP 503")]
+
+        with self.assertLogs("portfolio.media", "WARNING"):
+            self.assertEqual(media.run_once(), (0, 1))
+        row = MediaMetadata.objects.get()
+        self.assertEqual((row.status, row.attempts), (MediaMetadata.STATUS_PENDING, 1))
+        self.assertGreater(row.next_attempt_at, timezone.now())
+        self.assertEqual(media.run_once(), (0, 0))  # Backing off
+
+        MediaMetadata.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        with self.assertLogs("portfolio.media", "WARNING"):
+            self.assertEqual(media.run_once(), (0, 1))
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.last_error), (MediaMetadata.STATUS_FAILED, "HTTP 503"))
+
+        # Saving the item again re-queues it
+        self.add_item("https://videos.test/flaky")
+        self.assertEqual(media.run_once(), (1, 0))
+
+    def test_permanent_errors_are_not_retried(self):
+        self.add_item("https://videos.test/private")
+        StubProvider.errors = [media.FetchError("HTTP 404", retry=False)]
+        with self.assertLogs("portfolio.media", "WARNING"):
+            media.run_once()
+        self.assertEqual(MediaMetadata.objects.get().status, MediaMetadata.STATUS_FAILED)
+
+    def test_requests_to_a_provider_are_spaced_out(self):
+        provider = StubProvider()
+        provider.min_interval = 2.0
+        limiter = media.RateLimiter()
+        with mock.patch.object(media.time, "monotonic", return_value=100.0), mock.patch.object(
+            media.time, "sleep"
+        ) as sleep:
+            limiter.wait(provider)
+            limiter.wait(provider)
+            limiter.wait(provider)
+        self.assertEqual([c.args[0] for c in sleep.call_args_list], [2.0, 4.0])
+
+
+class ThumbnailStoreTests(TestCase):
+    def setUp(self):
+        use_temporary_thumbnail_dir(self)
+
+    def test_served_by_digest_with_immutable_caching(self):
+        digest = thumbnails.store(GIF)
+        self.assertEqual(thumbnails.store(GIF), digest)  # Stored once
+        with self.assertRaises(ValueError):
+            thumbnails.store(b"<html>not an image</html>")
+
+        url = reverse("portfolio:thumbnail", args=[digest, 320])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(response["Content-Type"], ["image/gif", "image/jpeg"])  # Resized with Pillow
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(
+            self.client.get(reverse("portfolio:thumbnail", args=["0" * 64, 320])).status_code,
+            404,
+        )
+        self.assertEqual(
+            self.client.get(reverse("portfolio:thumbnail", args=[digest, 321])).status_code,
+            404,  # Not one of the pre-generated sizes
+        )
+
+    def test_least_recently_used_are_evicted(self):
+        digests = [thumbnails.store(GIF + bytes([i])) for i in range(3)]
+        for age, digest in zip([300, 100, 200], digests):
+            then = os.path.getmtime(thumbnails._directory(digest)) - age
+            os.utime(thumbnails._directory(digest), (then, then))
+        MediaMetadata.objects.create(
+            url="https://videos.test/old", provider="stub", thumbnail_sha256=digests[0]
+        )
+        sizes = {
+            digest: sum(f.stat().st_size for f in thumbnails._directory(digest).iterdir())
+            for digest in digests
+        }
+
+        self.assertEqual(thumbnails.evict(max_bytes=sum(sizes.values())), 0)
+        self.assertEqual(thumbnails.evict(max_bytes=sizes[digests[1]] + 1), 2)
+        self.assertEqual(
+            [thumbnails.find(digest, 160) is not None for digest in digests],
+            [False, True, False],  # Kept the most recently used
+        )
+        self.assertEqual(MediaMetadata.objects.get().thumbnail_sha256, "")
@@ -0,0 +1,172 @@
+# portfolio/thumbnails.py
+"""
+Local copies of portfolio media thumbnails, so pages don't hot-link the
+provider's image hosts.
+
+The media worker (portfolio/media.py) downloads each thumbnail once and
+stores it by the SHA-256 of its bytes:
+
+    THUMBNAIL_DIR/ab/abcdef.../original
+    THUMBNAIL_DIR/ab/abcdef.../320.jpg   (one per PORTFOLIO_THUMBNAIL_SIZES)
+
+The same image is only stored once whichever URLs use it. A digest's
+files never change, so portfolio:thumbnail serves them with an ETag and a
+year-long immutable Cache-Control. The resized JPEGs are made with Pillow
+when it is installed; without it every size is served from the original.
+
+Directories are touched when served, and evict removes the least recently
+used ones once the store grows past PORTFOLIO_THUMBNAIL_MAX_BYTES (the
+worker calls it after storing new thumbnails). Their MediaMetadata rows
+lose thumbnail_sha256, so pages fall back to the provider's URL.
+"""
+import hashlib
+import io
+import os
+import re
+import shutil
+import time
+import urllib.request
+from pathlib import Path
+
+from django.conf import settings
+
+from .models import MediaMetadata
+
+try:
+    from PIL import Image
+except ImportError:  # Optional; serve the original at every size
+    Image = None
+
+THUMBNAIL_DIR = Path(
+    getattr(settings, "PORTFOLIO_THUMBNAIL_DIR", settings.BASE_DIR / "thumbnails")
+)
+SIZES = tuple(getattr(settings, "PORTFOLIO_THUMBNAIL_SIZES", (160, 320, 640)))
+MAX_DOWNLOAD_BYTES = 5 * 1024 * 1024
+# Served files have their directory's mtime bumped at most this often
+TOUCH_INTERVAL = 60 * 60
+
+_DIGEST = re.compile(r"[0-9a-f]{64}")
+_CONTENT_TYPES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF8", "image/gif"),
+]
+
+
+def content_type(data):
+    """The image type of data, by its first bytes; None if not one we serve."""
+    for magic, kind in _CONTENT_TYPES:
+        if data.startswith(magic):
+            return kind
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def _directory(digest):
+    return THUMBNAIL_DIR / digest[:2] / digest
+
+
+def _write(path, data):
+    # Write then rename, so a reader never sees a half-written file
+    temporary = path.with_name(path.name + ".tmp")
+    temporary.write_bytes(data)
+    os.replace(temporary, path)
+
+
+# --- Storing ---
+
+
+def store(data):
+    """Store an image and its resized copies. Returns its digest. Raises ValueError if not an image."""
+    if content_type(data) is None:
+        raise ValueError("Not a JPEG, PNG, GIF or WebP image")
+    digest = hashlib.sha256(data).hexdigest()
+    directory = _directory(digest)
+    if (directory / "original").exists():
+        return digest  # Already have it
+    directory.mkdir(parents=True, exist_ok=True)
+    if Image is not None:
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                image = image.convert("RGB")
+                for width in SIZES:
+                    scaled = min(width, image.width)  # Never upscale
+                    height = max(round(image.height * scaled / image.width), 1)
+                    resized = image.resize((scaled, height), Image.LANCZOS)
+                    out = io.BytesIO()
+                    resized.save(out, "JPEG", quality=85, optimize=True)
+                    _write(directory / f"{width}.jpg", out.getvalue())
+        except (OSError, Image.DecompressionBombError) as e:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise ValueError(f"Unreadable image: {e}") from e
+    _write(directory / "original", data)  # Last: it marks the digest complete
+    return digest
+
+
+def fetch(url):
+    """Download an image and store it. Returns its digest. Raises OSError or ValueError."""
+    timeout = getattr(settings, "PORTFOLIO_MEDIA_FETCH_TIMEOUT", 10)
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        data = response.read(MAX_DOWNLOAD_BYTES + 1)
+    if len(data) > MAX_DOWNLOAD_BYTES:
+        raise ValueError(f"Larger than {MAX_DOWNLOAD_BYTES} bytes")
+    return store(data)
+
+
+# --- Serving ---
+
+
+def find(digest, width):
+    """(path, content type) of a stored size, or None. Falls back to the original."""
+    if not _DIGEST.fullmatch(digest) or width not in SIZES:
+        return None
+    directory = _directory(digest)
+    resized = directory / f"{width}.jpg"
+    if resized.exists():
+        return resized, "image/jpeg"
+    original = directory / "original"
+    if not original.exists():
+        return None
+    with open(original, "rb") as f:
+        return original, content_type(f.read(16))
+
+
+def touch(digest):
+    """Mark a digest as recently used, for evict. Cheap: at most one utime per hour."""
+    directory = _directory(digest)
+    try:
+        if time.time() - directory.stat().st_mtime > TOUCH_INTERVAL:
+            os.utime(directory)
+    except FileNotFoundError:  # Evicted meanwhile
+        pass
+
+
+# --- Eviction ---
+
+
+def evict(max_bytes=None):
+    """Remove least recently used images until the store fits its quota. Returns how many."""
+    if max_bytes is None:
+        max_bytes = getattr(settings, "PORTFOLIO_THUMBNAIL_MAX_BYTES", 512 * 1024 * 1024)
+    if not THUMBNAIL_DIR.exists():
+        return 0
+    entries = []  # (last used, size, digest directory)
+    total = 0
+    for directory in THUMBNAIL_DIR.glob("??/*"):
+        size = sum(f.stat().st_size for f in directory.iterdir())
+        entries.append((directory.stat().st_mtime, size, directory))
+        total += size
+    if total <= max_bytes:
+        return 0
+
+    evicted = []
+    for _, size, directory in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(directory, ignore_errors=True)
+        evicted.append(directory.name)
+        total -= size
+    # Pages go back to the provider's URL for these
+    MediaMetadata.objects.filter(thumbnail_sha256__in=evicted).update(thumbnail_sha256="")
+    return len(evicted)
@@ -8,4 +8,5 @@ urlpatterns = [
     path("create/", views.create_portfolio_item, name="create_portfolio_item"),
     path("edit/<int:pk>/", views.edit_portfolio_item, name="edit_portfolio_item"),
     path("delete/<int:pk>/", views.delete_portfolio_item, name="delete_portfolio_item"),
+    path("thumbnails/<slug:digest>/<int:width>/", views.thumbnail, name="thumbnail"),
 ]
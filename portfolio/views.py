@@ -1,13 +1,20 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.conf import settings
+from django.db import transaction
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.views.decorators.http import require_safe
 from .models import PortfolioItem
 from .forms import PortfolioItemForm
-from feed.models import Post
+from . import media, thumbnails
 
 
 @login_required
 def portfolio_list(request):
-    items = PortfolioItem.objects.filter(user=request.user)
+    items = list(PortfolioItem.objects.filter(user=request.user))
+    # Titles/thumbnails fetched in the background (manage.py media_worker);
+    # items whose metadata isn't in yet just link their URL
+    media.attach(items)
     return render(request, "portfolio/portfolio_list.html", {"items": items})
 
 
@@ -18,21 +25,10 @@ def create_portfolio_item(request):
         if form.is_valid():
             item = form.save(commit=False)
             item.user = request.user
-            item.save()
-            
-            try:
-                Post.objects.create(
-                    user=request.user,
-                    post_type='portfolio_add',
-                    content=f"Added a new portfolio item: '{item.title}'"
-                    # If using GenericForeignKey later, you'd link it here:
-                    # content_type=ContentType.objects.get_for_model(portfolio_item),
-                    # object_id=portfolio_item.pk,
-                )
-            except Exception as e:
-                # Optional: Log error if post creation fails, but don't stop the user flow
-                print(f"Error creating feed post for new portfolio item: {e}")
-                
+            # The feed post announcing it is made later from the outbox
+            # event recorded alongside (see record_portfolio_item_created)
+            with transaction.atomic():
+                item.save()
             return redirect("portfolio:portfolio_list")
     else:
         form = PortfolioItemForm()
@@ -59,3 +55,33 @@ def delete_portfolio_item(request, pk):
         item.delete()
         return redirect("portfolio:portfolio_list")
     return render(request, "portfolio/portfolio_confirm_delete.html", {"item": item})
+
+
+@require_safe
+def thumbnail(request, digest, width):
+    """
+    A stored thumbnail (portfolio/thumbnails.py). The URL names the image's
+    SHA-256, so the response never changes: browsers and proxies may keep it
+    for a year without revalidating. Public, like the media it previews.
+    """
+    found = thumbnails.find(digest, width)
+    if found is None:
+        raise Http404("No such thumbnail")
+    path, content_type = found
+
+    etag = f'"{digest}-{width}"'
+    if request.headers.get("If-None-Match") == etag:
+        response = HttpResponseNotModified()
+    else:
+        thumbnails.touch(digest)  # Recently used, as far as eviction goes
+        accel_prefix = getattr(settings, "PORTFOLIO_THUMBNAIL_ACCEL_REDIRECT", None)
+        if accel_prefix:
+            # Let the web server send the file
+            response = HttpResponse(content_type=content_type)
+            relative = path.relative_to(thumbnails.THUMBNAIL_DIR).as_posix()
+            response["X-Accel-Redirect"] = accel_prefix + relative
+        else:
+            response = FileResponse(open(path, "rb"), content_type=content_type)
+    response["ETag"] = etag
+    response["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
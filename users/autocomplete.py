@@ -0,0 +1,214 @@
+# users/autocomplete.py
+"""
+In-memory prefix index behind the "Find People" typeahead.
+
+Usernames, roles and locations are kept in sorted lists and looked up with
+bisect, so a lookup never touches the database. Roles and locations are
+indexed from every word start ("Film Director" is found by "fi" and "di")
+and reference-counted, since many people share them.
+
+The index is built from User/Profile on first use in each process and
+updated by the Profile post_save/post_delete signals in users/models.py.
+Changes made by other processes are picked up through a generation counter
+in the shared cache: a process whose index is behind rebuilds it, at most
+once every REBUILD_INTERVAL seconds, in a background thread while lookups
+keep using the old one.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from .models import Profile
+
+RESULT_LIMIT = getattr(settings, "AUTOCOMPLETE_RESULT_LIMIT", 8)
+REBUILD_INTERVAL = getattr(settings, "AUTOCOMPLETE_REBUILD_INTERVAL", 60)
+GENERATION_KEY = "users:autocomplete:generation"
+
+logger = logging.getLogger(__name__)
+
+
+class _SortedKeys:
+    """Sorted (key, value) pairs with prefix lookup and reference counting."""
+
+    def __init__(self, entries=()):
+        # Sorted once: insort per entry would be quadratic for a full build
+        self._refs = Counter((key.lower(), value) for key, value in entries)
+        self._keys = sorted(self._refs)  # (lowercased key, display value)
+
+    def add(self, key, value):
+        entry = (key.lower(), value)
+        if not self._refs[entry]:
+            insort(self._keys, entry)
+        self._refs[entry] += 1
+
+    def discard(self, key, value):
+        entry = (key.lower(), value)
+        if not self._refs[entry]:
+            return
+        self._refs[entry] -= 1
+        if not self._refs[entry]:
+            del self._refs[entry]
+            del self._keys[bisect_left(self._keys, entry)]
+
+    def prefix(self, prefix, limit):
+        found = []
+        i = bisect_left(self._keys, (prefix,))
+        while i < len(self._keys) and len(found) < limit:
+            key, value = self._keys[i]
+            if not key.startswith(prefix):
+                break
+            if value not in found:
+                found.append(value)
+            i += 1
+        return found
+
+
+def _word_starts(value):
+    """'Film Director' -> ['Film Director', 'Director']"""
+    words = value.split()
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+class PrefixIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built_at = None
+        self._generation = None
+        self._rebuilding = False
+        self._changes = []  # update/remove calls made during a rebuild
+        self._swap(self._load([]))
+
+    @staticmethod
+    def _load(rows):
+        """Fresh index contents from (user_id, username, role, location) rows."""
+        by_user, usernames, roles, locations = {}, [], [], []
+        for user_id, username, role, location in rows:
+            by_user[user_id] = (username, role, location)
+            usernames.append((username, username))
+            roles += [(key, role) for key in _word_starts(role)]
+            locations += [(key, location) for key in _word_starts(location)]
+        return by_user, _SortedKeys(usernames), _SortedKeys(roles), _SortedKeys(locations)
+
+    def _swap(self, contents):
+        self._by_user, self._usernames, self._roles, self._locations = contents
+
+    def _ensure_current(self):
+        generation = cache.get(GENERATION_KEY, 0)
+        if self._built_at is None:
+            self._start_rebuild()
+            self._rebuild(generation)  # Nothing to serve yet: build it now
+            return
+        if (
+            generation == self._generation
+            or self._rebuilding
+            or time.monotonic() - self._built_at < REBUILD_INTERVAL
+            or not self._start_rebuild()
+        ):
+            return
+        # Lookups keep using the current index meanwhile
+        thread = threading.Thread(
+            target=self._rebuild_in_background, args=(generation,), daemon=True
+        )
+        thread.start()
+
+    def _start_rebuild(self):
+        """Claim the rebuild for this thread. False if one is already running."""
+        with self._lock:
+            if self._rebuilding and self._built_at is not None:
+                return False
+            self._rebuilding = True
+            self._changes = []
+            return True
+
+    def _rebuild_in_background(self, generation):
+        try:
+            self._rebuild(generation)
+        except Exception:
+            logger.exception("Rebuilding the autocomplete index failed")
+            with self._lock:
+                self._rebuilding = False
+        finally:
+            connections.close_all()  # This thread's own connections
+
+    def _rebuild(self, generation):
+        rows = Profile.objects.values_list("user_id", "user__username", "role", "location")
+        contents = self._load(rows.iterator(chunk_size=5000))
+        with self._lock:
+            self._swap(contents)
+            # Changes this process made while the rows were being read
+            for change in self._changes:
+                change()
+            self._changes = []
+            self._built_at = time.monotonic()
+            self._generation = generation
+            self._rebuilding = False
+
+    def _add(self, user_id, username, role, location):
+        self._by_user[user_id] = (username, role, location)
+        self._usernames.add(username, username)
+        for key in _word_starts(role):
+            self._roles.add(key, role)
+        for key in _word_starts(location):
+            self._locations.add(key, location)
+
+    def _remove(self, user_id):
+        old = self._by_user.pop(user_id, None)
+        if old is None:
+            return
+        username, role, location = old
+        self._usernames.discard(username, username)
+        for key in _word_starts(role):
+            self._roles.discard(key, role)
+        for key in _word_starts(location):
+            self._locations.discard(key, location)
+
+    def _update(self, user_id, username, role, location):
+        if self._by_user.get(user_id) == (username, role, location):
+            return
+        self._remove(user_id)
+        self._add(user_id, username, role, location)
+
+    def update(self, user_id, username, role, location):
+        with self._lock:
+            self._update(user_id, username, role, location)
+            if self._rebuilding:
+                self._changes.append(
+                    lambda: self._update(user_id, username, role, location)
+                )
+        self._bump_generation()
+
+    def remove(self, user_id):
+        with self._lock:
+            self._remove(user_id)
+            if self._rebuilding:
+                self._changes.append(lambda: self._remove(user_id))
+        self._bump_generation()
+
+    def _bump_generation(self):
+        try:
+            generation = cache.incr(GENERATION_KEY)
+        except ValueError:  # Key not set yet
+            cache.set(GENERATION_KEY, 1, None)
+            generation = 1
+        if self._built_at is not None:
+            # Our own change is already applied; don't rebuild for it
+            self._generation = generation
+
+    def lookup(self, prefix, limit=RESULT_LIMIT):
+        self._ensure_current()
+        prefix = prefix.strip().lower()
+        with self._lock:
+            return {
+                "usernames": self._usernames.prefix(prefix, limit),
+                "roles": self._roles.prefix(prefix, limit),
+                "locations": self._locations.prefix(prefix, limit),
+            }
+
+
+index = PrefixIndex()
@@ -0,0 +1,56 @@
+# Generated by Django 5.1.15 on 2026-10-18 10:44
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Raw SQL because these are PostgreSQL-only (GIN, pg_trgm) and the test
+# suite runs on SQLite, where the in-process search index is used instead.
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS users_profile_search_gin "
+    "ON users_profile USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS auth_user_username_trgm "
+    "ON auth_user USING gin (UPPER(username) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS auth_user_email_trgm "
+    "ON auth_user USING gin (UPPER(email) gin_trgm_ops)",
+    # Fill the vectors for existing profiles; users.search keeps them current
+    "UPDATE users_profile p SET search_vector = "
+    "setweight(to_tsvector('simple', coalesce(p.role, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(p.location, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(p.bio, '')), 'C') || "
+    "setweight(to_tsvector('simple', u.username), 'D') "
+    "FROM auth_user u WHERE u.id = p.user_id",
+]
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS auth_user_email_trgm",
+    "DROP INDEX IF EXISTS auth_user_username_trgm",
+    "DROP INDEX IF EXISTS users_profile_search_gin",
+]
+
+
+def run_on_postgres(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(
+            run_on_postgres(POSTGRES_FORWARD), run_on_postgres(POSTGRES_BACKWARD)
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.contrib.postgres.search import SearchVectorField
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
 
@@ -9,6 +10,12 @@ class Profile(models.Model):
     role = models.CharField(max_length=100, blank=True)
     location = models.CharField(max_length=100, blank=True)
     bio = models.TextField(max_length=500, blank=True)
+    # Weighted full-text document for user search (PostgreSQL only, GIN
+    # indexed by migration 0002). Maintained by index_profile_for_search.
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Part of the cache key of fragments showing the profile (see
+    # moviepeople/fragments.py); also bumped by User saves other than logins
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.user.username
@@ -21,5 +28,40 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
+def save_user_profile(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {"last_login"}:
+        # Logging in: nothing the profile shows or is searched by changed
+        return
     instance.profile.save()
+
+
+# save_user_profile re-saves the profile on User saves (other than logins),
+# so this also picks up username/email changes
+@receiver(post_save, sender=Profile)
+def index_profile_for_search(sender, instance, **kwargs):
+    from . import autocomplete, search
+
+    search.index_profile(instance)
+    autocomplete.index.update(
+        instance.user_id, instance.user.username, instance.role, instance.location
+    )
+
+
+@receiver(post_delete, sender=Profile)
+def unindex_profile_for_search(sender, instance, **kwargs):
+    from . import autocomplete, search
+
+    search.unindex_user(instance.user_id)
+    autocomplete.index.remove(instance.user_id)
+
+
+# Cached template fragments that show a user (their post cards, profile
+# details) are keyed on the User instance; see moviepeople/fragments.py
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_fragments(sender, instance, update_fields=None, **kwargs):
+    from moviepeople import fragments
+
+    if update_fields is not None and set(update_fields) <= {"last_login"}:
+        return  # Logging in changes nothing they show
+    fragments.invalidate(instance)
@@ -0,0 +1,59 @@
+# users/profiles.py
+"""
+Everything a profile page shows about a user, loaded in a fixed number of
+queries however much they have posted or added to their portfolio:
+
+1. the User with its Profile (select_related)
+2. their newest portfolio items, at most PROFILE_PORTFOLIO_LIMIT (a sliced
+   Prefetch: one query for the lot)
+3. their newest posts, at most PROFILE_RECENT_POSTS (another)
+4. the media metadata (titles, thumbnails) of those portfolio items
+
+plus their connection count, from the cached connection graph (see
+connections/graph.py; a query only on a cache miss).
+
+Used by users.views.profile_view; anything else showing a profile (an API,
+say) should load it here too rather than touching the related managers,
+which would query again per relation.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Prefetch
+
+from connections import graph
+from feed.models import Post
+from portfolio import media
+from portfolio.models import PortfolioItem
+
+
+def profile_queryset(portfolio_limit=None, post_limit=None):
+    if portfolio_limit is None:
+        portfolio_limit = getattr(settings, "PROFILE_PORTFOLIO_LIMIT", 6)
+    if post_limit is None:
+        post_limit = getattr(settings, "PROFILE_RECENT_POSTS", 5)
+    return User.objects.select_related("profile").prefetch_related(
+        Prefetch(
+            "portfolio_items",
+            queryset=PortfolioItem.objects.order_by("-created_at", "-id")[
+                :portfolio_limit
+            ],
+            to_attr="portfolio_gallery",
+        ),
+        Prefetch(
+            "posts",
+            queryset=Post.objects.order_by("-timestamp", "-id")[:post_limit],
+            to_attr="recent_posts",
+        ),
+    )
+
+
+def load_profile(portfolio_limit=None, post_limit=None, **lookup):
+    """
+    The user matching `lookup` (e.g. username="ana") with .profile,
+    .portfolio_gallery (each item's .media attached), .recent_posts and
+    .connection_count filled in. Raises User.DoesNotExist.
+    """
+    user = profile_queryset(portfolio_limit, post_limit).get(**lookup)
+    media.attach(user.portfolio_gallery)
+    user.connection_count = len(graph.neighbor_ids(user.id))
+    return user
@@ -0,0 +1,219 @@
+# users/search.py
+"""
+User search for the "Find People" page.
+
+On PostgreSQL this uses the database: each Profile carries a weighted
+tsvector (role A, location B, bio C, username D) behind a GIN index, and
+usernames/emails have trigram GIN indexes so partial matches like "ric"
+for "patricia" don't need a sequential scan. Results are ranked by
+full-text rank plus trigram similarity.
+
+Other databases (SQLite in tests and local development) get a small
+in-process inverted index with the same matching rules instead.
+
+Both are kept current by the Profile post_save signal in users/models.py.
+Saving a User re-saves its profile, so username/email changes go through
+the same path.
+"""
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramSimilarity,
+)
+from django.db import connection
+from django.db.models import F, FloatField, Q, TextField, Value
+
+from .models import Profile
+
+RESULT_LIMIT = 50
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or "").lower())
+
+
+def search_users(username="", role="", location="", exclude_user_id=None, limit=RESULT_LIMIT):
+    """
+    Users matching every given criterion, best matches first.
+
+    username matches anywhere in the username or email; role and location
+    match word prefixes ("dir" finds "Film Director").
+    """
+    if connection.vendor == "postgresql":
+        return _search_postgres(username, role, location, exclude_user_id, limit)
+    return _fallback_index.search(username, role, location, exclude_user_id, limit)
+
+
+def index_profile(profile):
+    """Refresh one user's search entry (called from the Profile post_save signal)."""
+    if connection.vendor == "postgresql":
+        Profile.objects.filter(pk=profile.pk).update(
+            search_vector=_profile_vector(profile)
+        )
+    else:
+        _fallback_index.add(profile)
+
+
+def unindex_user(user_id):
+    """Drop a deleted user's entry (PostgreSQL rows go with the Profile row)."""
+    if connection.vendor != "postgresql":
+        _fallback_index.remove(user_id)
+
+
+def _profile_vector(profile):
+    def text(value):
+        return Value(value or "", output_field=TextField())
+
+    return (
+        SearchVector(text(profile.role), weight="A", config="simple")
+        + SearchVector(text(profile.location), weight="B", config="simple")
+        + SearchVector(text(profile.bio), weight="C", config="simple")
+        + SearchVector(text(profile.user.username), weight="D", config="simple")
+    )
+
+
+# --- PostgreSQL ---
+
+
+def _prefix_terms(text, weight):
+    # "film dir" -> "film:*A & dir:*A": every word must prefix-match a lexeme
+    # carrying the given weight, i.e. coming from that profile field
+    return [f"{token}:*{weight}" for token in tokenize(text)]
+
+
+def _search_postgres(username, role, location, exclude_user_id, limit):
+    users = User.objects.select_related("profile")
+    if exclude_user_id is not None:
+        users = users.exclude(id=exclude_user_id)
+
+    rank = Value(0.0, output_field=FloatField())
+    if username:
+        # icontains compiles to UPPER(col) LIKE UPPER('%x%'), which the
+        # trigram indexes on UPPER(username)/UPPER(email) can serve
+        users = users.filter(
+            Q(username__icontains=username) | Q(email__icontains=username)
+        )
+        rank = rank + TrigramSimilarity("username", username)
+
+    terms = _prefix_terms(role, "A") + _prefix_terms(location, "B")
+    if terms:
+        query = SearchQuery(" & ".join(terms), search_type="raw", config="simple")
+        users = users.filter(profile__search_vector=query)
+        rank = rank + SearchRank(F("profile__search_vector"), query)
+
+    return list(users.annotate(rank=rank).order_by("-rank", "username")[:limit])
+
+
+# --- In-process fallback ---
+
+
+class InvertedIndex:
+    """
+    token -> user IDs, per field, plus a sorted token list for prefix lookups
+    with bisect. Built from the database on first use.
+    """
+
+    FIELDS = ("role", "location")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._postings = {field: defaultdict(set) for field in self.FIELDS}
+        self._sorted_tokens = {field: [] for field in self.FIELDS}
+        self._docs = {}  # user_id -> {"username", "email", "role", "location"}
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            for profile in Profile.objects.select_related("user"):
+                self._add(profile)
+            self._loaded = True
+
+    def add(self, profile):
+        with self._lock:
+            if self._loaded:
+                self._add(profile)
+
+    def _add(self, profile):
+        user_id = profile.user_id
+        self._remove(user_id)
+        doc = {
+            "username": profile.user.username.lower(),
+            "email": profile.user.email.lower(),
+            "role": frozenset(tokenize(profile.role)),
+            "location": frozenset(tokenize(profile.location)),
+        }
+        self._docs[user_id] = doc
+        for field in self.FIELDS:
+            for token in doc[field]:
+                if not self._postings[field][token]:
+                    tokens = self._sorted_tokens[field]
+                    tokens.insert(bisect_left(tokens, token), token)
+                self._postings[field][token].add(user_id)
+
+    def _remove(self, user_id):
+        doc = self._docs.pop(user_id, None)
+        if doc is None:
+            return
+        for field in self.FIELDS:
+            for token in doc[field]:
+                postings = self._postings[field][token]
+                postings.discard(user_id)
+                if not postings:
+                    tokens = self._sorted_tokens[field]
+                    tokens.pop(bisect_left(tokens, token))
+                    del self._postings[field][token]
+
+    def _prefix_match(self, field, prefix):
+        tokens = self._sorted_tokens[field]
+        matched = set()
+        i = bisect_left(tokens, prefix)
+        while i < len(tokens) and tokens[i].startswith(prefix):
+            matched |= self._postings[field][tokens[i]]
+            i += 1
+        return matched
+
+    def remove(self, user_id):
+        with self._lock:
+            self._remove(user_id)
+
+    def search(self, username, role, location, exclude_user_id, limit):
+        if not (username or role or location):
+            return []
+        self._ensure_loaded()
+        with self._lock:
+            candidates = None
+            for field, text in (("role", role), ("location", location)):
+                for token in tokenize(text):
+                    ids = self._prefix_match(field, token)
+                    candidates = ids if candidates is None else candidates & ids
+
+            needle = (username or "").lower()
+            scores = {}
+            for user_id in self._docs if candidates is None else candidates:
+                doc = self._docs[user_id]
+                score = 1.0
+                if needle:
+                    if needle not in doc["username"] and needle not in doc["email"]:
+                        continue
+                    if doc["username"].startswith(needle):
+                        score += 1.0
+                scores[user_id] = score
+        scores.pop(exclude_user_id, None)
+
+        users = User.objects.filter(id__in=scores).select_related("profile")
+        return sorted(users, key=lambda u: (-scores[u.id], u.username))[:limit]
+
+
+_fallback_index = InvertedIndex()
@@ -1,3 +1,205 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_in
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+
+from connections.models import Connection
+from feed.models import Post
+from portfolio.models import PortfolioItem
+
+from . import autocomplete, search
+
+
+class ProfilePageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("gaffer", password="pw")
+        self.friend = User.objects.create_user("grip", password="pw")
+        Connection.objects.create(
+            requester=self.user, receiver=self.friend, status=Connection.STATUS_ACCEPTED
+        )
+        self.client.force_login(self.user)
+
+    def add_work(self, count):
+        for i in range(count):
+            PortfolioItem.objects.create(
+                user=self.user, title=f"Item {i}", description="", media_url="https://example.com/"
+            )
+            Post.objects.create(user=self.user, content=f"Post {i}")
+
+    def test_profile_query_budget_is_fixed(self):
+        url = reverse("users:profile")
+        self.add_work(2)
+        self.client.get(url)  # Warm the cache
+
+        # session + auth user + user/profile + portfolio items + posts + media
+        with self.assertNumQueries(6):
+            self.client.get(url)
+
+        self.add_work(10)
+        with self.assertNumQueries(6):
+            response = self.client.get(url)
+        profile_user = response.context["profile_user"]
+        self.assertEqual(len(profile_user.portfolio_gallery), 6)  # Newest first
+        self.assertEqual(profile_user.portfolio_gallery[0].title, "Item 9")
+        self.assertEqual(len(profile_user.recent_posts), 5)
+        self.assertEqual(profile_user.connection_count, 1)
+        self.assertContains(response, "<strong>Connections:</strong> 1")
+
+    def test_unknown_user(self):
+        url = reverse("users:user_profile", kwargs={"username": "nobody"})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_logging_in_does_not_touch_the_profile(self):
+        profile = self.user.profile
+        before = profile.updated_at
+        user_logged_in.send(sender=User, request=None, user=self.user)  # Saves last_login
+        profile.refresh_from_db()
+        self.assertEqual(profile.updated_at, before)
+
+        self.user.first_name = "Gus"
+        self.user.save()
+        profile.refresh_from_db()
+        self.assertGreater(profile.updated_at, before)
+
+
+class SearchFallbackTests(TestCase):
+    """The in-process index used off PostgreSQL (the matching rules are the same)."""
+
+    def setUp(self):
+        patcher = mock.patch.object(search, "_fallback_index", search.InvertedIndex())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.ana = self.make_user("ana", "ana@example.com", "Film Director", "Los Angeles")
+        self.patricia = self.make_user(
+            "patricia", "pat@studio.test", "Director of Photography", "London"
+        )
+        self.ricardo = self.make_user("ricardo", "rc@example.com", "Editor", "Lisbon")
+
+    def make_user(self, username, email, role, location):
+        user = User.objects.create_user(username, email=email, password="pw")
+        user.profile.role = role
+        user.profile.location = location
+        user.profile.save()
+        return user
+
+    def names(self, **criteria):
+        return [user.username for user in search.search_users(**criteria)]
+
+    def test_role_and_location_match_word_prefixes(self):
+        self.assertEqual(self.names(role="dir"), ["ana", "patricia"])
+        self.assertEqual(self.names(role="film dir"), ["ana"])
+        self.assertEqual(self.names(role="dir", location="l"), ["ana", "patricia"])
+        self.assertEqual(self.names(role="dir", location="lis"), [])
+        self.assertEqual(self.names(role="ector"), [])  # Not mid-word
+        self.assertEqual(self.names(), [])
+
+    def test_username_matches_substrings_of_username_or_email(self):
+        # Usernames starting with the text rank first
+        self.assertEqual(self.names(username="ric"), ["ricardo", "patricia"])
+        self.assertEqual(self.names(username="STUDIO"), ["patricia"])
+        self.assertEqual(
+            self.names(username="ric", exclude_user_id=self.ricardo.id), ["patricia"]
+        )
+        self.assertEqual(self.names(username="a", role="photo"), ["patricia"])
+
+    def test_changes_are_reindexed(self):
+        self.names(role="dir")  # Load the index
+        self.ana.username = "anabel"
+        self.ana.save()
+        self.assertEqual(self.names(username="bel"), ["anabel"])
+        self.ana.profile.role = "Producer"
+        self.ana.profile.save()
+        self.assertEqual(self.names(role="dir"), ["patricia"])
+        self.assertEqual(self.names(role="prod"), ["anabel"])
+
+        self.patricia.delete()
+        self.assertEqual(self.names(role="dir"), [])
+        self.assertEqual(self.names(username="ric"), ["ricardo"])
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        index = autocomplete.PrefixIndex()
+        for patcher in (
+            mock.patch.object(autocomplete, "index", index),
+            mock.patch("users.views.autocomplete_index", index),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.ana = self.make_user("ana", "Film Director", "Los Angeles")
+        self.andy = self.make_user("Andy", "Director", "London")
+
+    def make_user(self, username, role, location):
+        user = User.objects.create_user(username, password="pw")
+        user.profile.role = role
+        user.profile.location = location
+        user.profile.save()
+        return user
+
+    def lookup(self, prefix):
+        return self.client.get(reverse("users:autocomplete"), {"q": prefix}).json()
+
+    def test_prefixes_of_usernames_and_word_starts(self):
+        self.assertEqual(
+            self.lookup("An"),
+            {"usernames": ["ana", "Andy"], "roles": [], "locations": ["Los Angeles"]},
+        )
+        self.assertEqual(self.lookup("dir")["roles"], ["Director", "Film Director"])
+        self.assertEqual(self.lookup("lo")["locations"], ["London", "Los Angeles"])
+        self.assertEqual(self.lookup("ang")["locations"], ["Los Angeles"])
+        self.assertEqual(self.lookup(" "), {"usernames": [], "roles": [], "locations": []})
+
+    def test_revalidation_by_etag(self):
+        url = reverse("users:autocomplete")
+        response = self.client.get(url, {"q": "dir"})
+        self.assertEqual(response["Cache-Control"], "private, max-age=60")
+        etag = response["ETag"]
+        self.assertEqual(
+            self.client.get(url, {"q": "dir"}, HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+        self.make_user("cy", "Art Director", "Lisbon")
+        response = self.client.get(url, {"q": "dir"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Art Director", response.json()["roles"])
+
+    def test_shared_values_are_reference_counted(self):
+        cy = self.make_user("cy", "Director", "Lisbon")
+        self.lookup("dir")  # Built from the database
+        cy.delete()
+        self.assertEqual(self.lookup("dir")["roles"], ["Director", "Film Director"])
+        self.andy.profile.role = "Editor"
+        self.andy.profile.save()
+        self.assertEqual(self.lookup("dir")["roles"], ["Film Director"])
+        self.assertEqual(self.lookup("ed")["roles"], ["Editor"])
+        self.andy.username = "andrea"
+        self.andy.save()
+        self.assertEqual(self.lookup("and")["usernames"], ["andrea"])
+
+    def test_other_processes_catch_up_by_generation(self):
+        other = autocomplete.PrefixIndex()  # Another process's copy
+        self.assertEqual(other.lookup("dir")["roles"], ["Director", "Film Director"])
+        self.make_user("cy", "Art Director", "Lisbon")  # Bumps the shared generation
+
+        # Not rebuilt more often than REBUILD_INTERVAL...
+        self.assertEqual(other.lookup("art")["roles"], [])
+        with mock.patch.object(autocomplete, "REBUILD_INTERVAL", 0), mock.patch.object(
+            autocomplete.threading, "Thread"
+        ) as thread:
+            # ...and then in the background, the old index answering meanwhile
+            with self.assertNumQueries(0):
+                self.assertEqual(other.lookup("art")["roles"], [])
+                other.lookup("art")  # Already rebuilding: no second thread
+            self.assertEqual(thread.call_count, 1)
 
-# Create your tests here.
+            # A change made here while the rows are being read is kept
+            other.update(self.ana.id, "anabel", "Film Director", "Los Angeles")
+            target, args = thread.call_args.kwargs["target"], thread.call_args.kwargs["args"]
+            with mock.patch.object(autocomplete.connections, "close_all"):
+                target(*args)
+        self.assertEqual(other.lookup("art")["roles"], ["Art Director"])
+        self.assertEqual(other.lookup("ana")["usernames"], ["anabel"])
@@ -11,4 +11,5 @@ urlpatterns = [
     path("profile/", views.profile_view, name="profile"),
     path("profile/<str:username>/", views.profile_view, name="user_profile"),
     path("search/", views.search_users, name="search_users"),
+    path("autocomplete/", views.autocomplete, name="autocomplete"),
 ]
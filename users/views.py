@@ -1,4 +1,4 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib import messages
@@ -6,9 +6,12 @@ from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from .forms import ProfileForm
 from django.contrib.auth.models import User
-from django.db.models import Q
 from django.shortcuts import render
 from .forms import UserSearchForm
+from . import profiles, search
+from .autocomplete import index as autocomplete_index
+from django.http import Http404, JsonResponse
+from django.utils.cache import get_conditional_response, set_response_etag
 
 
 def signup(request):
@@ -54,33 +57,45 @@ def logout_view(request):
     return redirect("users:login")
 
 from connections.models import Connection
+from connections import graph
 
 @login_required # profile_view should require login
 def profile_view(request, username=None):
-    if username:
-        # View another user's profile
-        profile_user = get_object_or_404(User, username=username)
-    else:
-        # View own profile
-        profile_user = request.user
+    # The user with their profile, portfolio gallery, recent posts and
+    # connection count, in a fixed number of queries (see users/profiles.py)
+    try:
+        if username:
+            # View another user's profile
+            profile_user = profiles.load_profile(username=username)
+        else:
+            # View own profile
+            profile_user = profiles.load_profile(pk=request.user.pk)
+    except User.DoesNotExist:
+        raise Http404("No such user")
 
     # --- Start: Connection Status Logic ---
     connection_status = None
     pending_connection_id = None # To store the ID needed for accept/reject actions
+    separation = None # Degree (1st/2nd/3rd) and mutual connection count
 
     # Only determine status if viewing someone else's profile
     if request.user.is_authenticated and profile_user != request.user:
-        # Check for an existing connection record between the two users
-        connection = Connection.objects.filter(
-            (Q(requester=request.user, receiver=profile_user)) |
-            (Q(requester=profile_user, receiver=request.user))
-        ).first() # Get the first matching record, if any
-
-        if connection:
-            if connection.status == Connection.STATUS_ACCEPTED:
-                connection_status = 'connected'
+        # One cache hit per render in the common case (see connections/graph.py).
+        # Degree 1 means connected, so only non-connected viewers need to
+        # look for a request record.
+        separation = graph.separation(request.user.id, profile_user.id)
+        if separation["degree"] == 1:
+            connection_status = 'connected'
+        else:
+            connection = Connection.objects.between(
+                request.user, profile_user
+            ).first() # The pair's record in either direction, if any
+
+            if connection is None:
+                # No connection record exists
+                connection_status = 'none'
             elif connection.status == Connection.STATUS_PENDING:
-                if connection.requester == request.user:
+                if connection.requester_id == request.user.id:
                     connection_status = 'pending_sent' # Request was sent BY the logged-in user
                 else:
                     connection_status = 'pending_received' # Request was received BY the logged-in user
@@ -93,15 +108,13 @@ def profile_view(request, username=None):
                 #     connection_status = 'rejected_by_receiver'
                 # else:
                 #     connection_status = 'rejected_by_requester'
-        else:
-            # No connection record exists
-            connection_status = 'none'
     # --- End: Connection Status Logic ---
 
     context = {
         "profile_user": profile_user,
         "connection_status": connection_status,
         "pending_connection_id": pending_connection_id,
+        "separation": separation,
         # Add any other context variables your template needs
     }
 
@@ -121,31 +134,36 @@ def edit_profile(request):
 
 
 def search_users(request):
-    User  # Get the currently active user model
     form = UserSearchForm(request.GET or None)
     users = []
 
     if form.is_valid() and any(form.cleaned_data.values()):
-        username_query = form.cleaned_data.get("username", "")
-        role = form.cleaned_data.get("role", "")
-        location = form.cleaned_data.get("location", "")
+        # Indexed and ranked, see users/search.py
+        users = search.search_users(
+            username=form.cleaned_data.get("username", ""),
+            role=form.cleaned_data.get("role", ""),
+            location=form.cleaned_data.get("location", ""),
+            exclude_user_id=request.user.id,  # Don't list the searcher
+        )
 
-        # Start with all users except the current user
-        users_query = User.objects.exclude(id=request.user.id)
-
-        # Apply filters
-        if username_query:
-            users_query = users_query.filter(
-                Q(username__icontains=username_query)
-                | Q(email__icontains=username_query)
-            )
-
-        if role:
-            users_query = users_query.filter(profile__role__icontains=role)
-
-        if location:
-            users_query = users_query.filter(profile__location__icontains=location)
+    return render(request, "users/search_results.html", {"form": form, "users": users})
 
-        users = users_query.distinct()
 
-    return render(request, "users/search_results.html", {"form": form, "users": users})
+def autocomplete(request):
+    """
+    Typeahead for the search form: ?q=<prefix> returns matching usernames,
+    roles and locations as JSON, served from the in-memory prefix index in
+    users/autocomplete.py (no database queries once it is built).
+    """
+    prefix = request.GET.get("q", "")
+    results = {"usernames": [], "roles": [], "locations": []}
+    if prefix.strip():
+        results = autocomplete_index.lookup(prefix)
+
+    response = JsonResponse(results)
+    # Let the browser reuse answers for a minute, then revalidate by ETag
+    response["Cache-Control"] = "private, max-age=60"
+    set_response_etag(response)
+    return get_conditional_response(
+        request, etag=response["ETag"], response=response
+    )